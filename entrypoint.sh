@@ -1,9 +1,24 @@
 #!/bin/sh
+# Usage: entrypoint.sh [serve|migrate|dev|<command>...]
+#   serve    serve the app with gunicorn, configured by src/gunicorn.conf.py (default)
+#   migrate  apply the database migrations and exit, run it once per release before serve
+#   dev      apply the migrations and start the django development server
+#   anything else is executed as is, e.g. `python manage.py seed_db`
+set -e
 
-python manage.py collectstatic --noinput
-
-python manage.py makemigrations
-python manage.py migrate
-
-# APP_PORT variable must be present in env
-python manage.py runserver 0.0.0.0:${APP_PORT}
+case "${1:-serve}" in
+    serve)
+        exec gunicorn btw_app.wsgi:application
+        ;;
+    migrate)
+        exec python manage.py migrate --noinput
+        ;;
+    dev)
+        python manage.py migrate --noinput
+        # APP_PORT variable must be present in env
+        exec python manage.py runserver 0.0.0.0:${APP_PORT}
+        ;;
+    *)
+        exec "$@"
+        ;;
+esac
@@ -0,0 +1,7 @@
+"""
+Benchmark scripts, run from ``src/`` as ``python -m benchmarks.<name>``.
+
+Every script works on its own SQLite database in the temporary directory (see
+``benchmarks.harness``), seeded on the first run with ``seed_db``, so the
+development database is never touched. See ``docs/benchmarks.md``.
+"""
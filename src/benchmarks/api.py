@@ -0,0 +1,60 @@
+"""
+Requests per second of every JSON API endpoint.
+
+    python -m benchmarks.api --products 10000 --comments 200000
+
+Each product endpoint is measured with all fields and with a sparse fieldset,
+next to the HTML page showing the same data.
+"""
+
+from . import harness
+
+
+def main():
+    parser = harness.parser(__doc__, products=10_000, comments=200_000)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and run.")
+    args = parser.parse_args()
+    harness.setup("catalog", fresh=args.fresh)
+    harness.ensure_catalog(args.products, args.comments)
+
+    from django.db.models import F
+    from django.test import Client
+    from django.urls import reverse
+
+    from products import api
+    from products.models import Product
+
+    client = Client()
+    product = Product.objects.exclude(category=None).order_by(F("rating_count").desc()).first()
+    ids = ",".join(map(str, Product.objects.order_by("?").values_list("pk", flat=True)[: api.MAX_IDS]))
+    sparse = "id,name,price"
+    endpoints = [
+        ("HTML listing", reverse("products"), {}),
+        ("list", reverse("api_products"), {}),
+        ("list ?fields", reverse("api_products"), {"fields": sparse}),
+        ("list ?limit=100", reverse("api_products"), {"limit": 100}),
+        (f"batch {api.MAX_IDS} ?ids", reverse("api_products"), {"ids": ids}),
+        (f"batch {api.MAX_IDS} ?ids&fields", reverse("api_products"), {"ids": ids, "fields": sparse}),
+        ("HTML detail", reverse("product_detail", args=[product.category.slug, product.pk]), {}),
+        ("detail", reverse("api_product_detail", args=[product.pk]), {}),
+        ("detail ?fields", reverse("api_product_detail", args=[product.pk]), {"fields": sparse}),
+        ("reviews", reverse("api_product_reviews", args=[product.pk]), {}),
+    ]
+
+    rows = []
+    for name, url, params in endpoints:
+
+        def run():
+            for _ in range(args.requests):
+                response = client.get(url, params)
+                assert response.status_code == 200, (url, response.status_code)
+
+        size = len(client.get(url, params).content)
+        seconds = harness.measure(run, args.repeat)
+        rows.append([name, f"{args.requests / seconds:,.0f}", f"{seconds / args.requests * 1000:.2f}", size])
+    print(f"JSON encoder: {'orjson' if api.orjson else 'json'}")
+    harness.table(["endpoint", "requests/s", "ms/request", "bytes"], rows)
+
+
+if __name__ == "__main__":
+    main()
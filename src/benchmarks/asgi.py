@@ -0,0 +1,117 @@
+"""
+Serve the catalog pages through the WSGI handler with the sync views, and
+through the ASGI handler with the sync and with the async views.
+
+    python -m benchmarks.asgi --products 10000 --comments 200000 --concurrency 1 10
+
+Requests are driven in-process with Django's test clients, so the numbers show
+the cost of the handler, the middleware and the views without any network or
+server overhead; concurrent WSGI requests use one thread each, like a threaded
+WSGI worker. Each mode runs in its own process, ``ASYNC_VIEWS`` is read when
+the settings are loaded.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import harness
+
+MODES = {
+    # name -> ASYNC_VIEWS
+    "WSGI, sync views": "false",
+    "ASGI, sync views": "false",
+    "ASGI, async views": "true",
+}
+
+
+def urls():
+    from django.db.models import F
+    from django.urls import reverse
+
+    from products.models import Product
+
+    product = Product.objects.exclude(category=None).order_by(F("rating_count").desc()).first()
+    return {
+        "listing": reverse("products"),
+        "detail": reverse("product_detail", args=[product.category.slug, product.pk]),
+        "reviews": reverse("product_reviews", args=[product.category.slug, product.pk]) + "?format=json",
+    }
+
+
+def run_wsgi(url, requests, concurrency):
+    from django.test import Client
+
+    def worker(count):
+        client = Client()
+        for _ in range(count):
+            assert client.get(url).status_code == 200
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, [requests // concurrency] * concurrency))
+
+
+def run_asgi(url, requests, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        for _ in range(requests // concurrency):
+            responses = await asyncio.gather(*(client.get(url) for _ in range(concurrency)))
+            assert all(response.status_code == 200 for response in responses)
+
+    asyncio.run(main())
+
+
+def measure_mode(mode, args):
+    """Runs in the child process: print the requests per second of every page and concurrency as JSON."""
+    harness.setup("catalog")
+    run = run_wsgi if mode.startswith("WSGI") else run_asgi
+    results = {}
+    for page, url in urls().items():
+        run(url, 20, 1)
+        for concurrency in args.concurrency:
+            requests = args.requests - args.requests % concurrency
+
+            def timed(url=url, requests=requests, concurrency=concurrency):
+                run(url, requests, concurrency)
+
+            results[f"{page} x{concurrency}"] = requests / harness.measure(timed, args.repeat)
+    print(json.dumps(results))
+
+
+def main():
+    parser = harness.parser(__doc__, products=10_000, comments=200_000)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per page and run.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10], help="Requests in flight at once.")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return measure_mode(args.mode, args)
+
+    harness.setup("catalog", fresh=args.fresh)
+    harness.ensure_catalog(args.products, args.comments)
+
+    columns, rows = None, []
+    for mode, async_views in MODES.items():
+        start = time.perf_counter()
+        command = [sys.executable, "-m", "benchmarks.asgi", "--mode", mode, "--requests", str(args.requests)]
+        command += ["--repeat", str(args.repeat), "--concurrency", *map(str, args.concurrency)]
+        output = subprocess.run(
+            command, env={**os.environ, "ASYNC_VIEWS": async_views}, capture_output=True, text=True, check=True
+        ).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        columns = columns or list(results)
+        rows.append([mode, *(f"{results[column]:,.0f}" for column in columns)])
+        print(f"{mode}: {time.perf_counter() - start:.0f}s", file=sys.stderr)
+    print("requests/s per page and concurrency")
+    harness.table(["mode", *columns], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Serve the partner feed against scraping the HTML product listing.
+
+    python -m benchmarks.feed --products 100000
+
+Reports products per second of the JSON lines and CSV feeds and of the listing
+pages (following their cursors), and the peak memory of the feed for growing
+catalog sizes: it stays flat because rows are streamed.
+"""
+
+from . import harness
+
+
+def consume(client, url):
+    response = client.get(url)
+    return sum(len(block) for block in response.streaming_content)
+
+
+def crawl_listing(client, pages):
+    """Fetch the first ``pages`` listing pages like a scraper does and return the number of products seen."""
+    seen, params = 0, {}
+    for _ in range(pages):
+        response = client.get("/", params)
+        page = response.context["page"]
+        seen += len(page.object_list)
+        if not page.next_cursor:
+            break
+        params = {"cursor": page.next_cursor}
+    return seen
+
+
+def main():
+    parser = harness.parser(__doc__, products=100_000)
+    parser.add_argument("--pages", type=int, default=20, help="Listing pages fetched per run.")
+    args = parser.parse_args()
+    harness.setup("catalog", fresh=args.fresh)
+    harness.ensure_catalog(args.products, args.comments)
+
+    from django.test import Client
+
+    from products import feeds
+    from products.models import Product
+
+    client = Client()
+    total = Product.objects.count()
+    rows = []
+    for fmt in feeds.ENCODERS:
+        url = f"/feed/products.{fmt}"
+        size = consume(client, url)
+        seconds = harness.measure(lambda: consume(client, url), args.repeat)
+        rows.append(
+            [f"feed ({fmt})", total, f"{seconds:.2f}", f"{total / seconds:,.0f}", f"{size / seconds / 1e6:.1f}"]
+        )
+
+    products = crawl_listing(client, args.pages)
+    seconds = harness.measure(lambda: crawl_listing(client, args.pages), args.repeat)
+    rows.append([f"listing ({args.pages} pages)", products, f"{seconds:.2f}", f"{products / seconds:,.0f}", ""])
+    harness.table(["source", "products", "seconds", "products/s", "MB/s"], rows)
+
+    print()
+    pks = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+    rows = []
+    for count in sorted({min(1000, total), min(10_000, total), total}):
+        products = Product.objects.filter(pk__lte=pks[count - 1])
+        peak = harness.peak_memory(lambda: sum(map(len, feeds.stream(products, "jsonl"))))
+        rows.append([count, f"{peak / 1e6:.2f}"])
+    harness.table(["feed products", "peak MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Shared setup of the benchmark scripts: a throwaway database, seeding, timing and reporting."""
+
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCHMARK_DIR = Path(tempfile.gettempdir()) / "btw-benchmarks"
+
+
+def parser(description, products=10_000, comments=0):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--products", type=int, default=products, help="Products in the benchmark catalog.")
+    parser.add_argument("--comments", type=int, default=comments, help="Comments in the benchmark catalog.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the median is reported.")
+    parser.add_argument("--fresh", action="store_true", help="Delete and seed the benchmark database again.")
+    return parser
+
+
+def setup(name, fresh=False):
+    """
+    Configure Django with ``benchmarks.settings`` on the database
+    ``BENCHMARK_DIR/<name>.sqlite3`` and migrate it. Server processes started
+    afterwards inherit the configuration through the environment.
+    """
+    BENCHMARK_DIR.mkdir(exist_ok=True)
+    database = BENCHMARK_DIR / f"{name}.sqlite3"
+    if fresh:
+        database.unlink(missing_ok=True)
+    os.environ["BENCHMARK_DATABASE"] = str(database)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+
+    import django
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    # lets the test client record the template context
+    setup_test_environment()
+    call_command("migrate", verbosity=0)
+
+
+def ensure_catalog(products, comments=0):
+    """Seed the benchmark database up to ``products`` products and ``comments`` comments."""
+    from django.core.management import call_command
+
+    from products.models import Comment, Product
+
+    missing = max(products - Product.objects.count(), 0)
+    missing_comments = max(comments - Comment.objects.count(), 0)
+    if missing or missing_comments:
+        print(f"Seeding {missing} products and {missing_comments} comments...")
+        call_command("seed_db", products=missing, comments=missing_comments, stdout=io.StringIO())
+
+
+def measure(func, repeat=5):
+    """Run ``func`` ``repeat`` times and return the median wall time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def peak_memory(func):
+    """Run ``func`` once and return the peak of the memory it allocated, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def table(headers, rows):
+    """Print ``rows`` as a plain text table, ready to paste into the docs."""
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[i]) for row in [headers, *rows]) for i in range(len(headers))]
+    for row in [headers, ["-" * width for width in widths], *rows]:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
@@ -0,0 +1,145 @@
+"""
+Overhead of the request metrics (``btw_app.metrics``) per request.
+
+    python -m benchmarks.metrics --requests 20000
+
+The overhead is a few microseconds, far below the noise of timing whole
+requests, so its parts are timed one by one, each the fastest of ``--repeat``
+interleaved runs with and without the metrics:
+
+- a request to an empty view, directly and through
+  :class:`~btw_app.metrics.MetricsMiddleware`: the middleware, the recorder
+  and adding the request to the counters and histograms
+- an SQL query, with and without a recorder, on an ``execute`` that does
+  nothing: the cost of the execute wrapper
+- rendering a small template, with and without a recorder
+
+They add up to the overhead of a catalog request at its query budget. The
+metrics are flushed to files by a thread, like in a gunicorn worker. The
+catalog pages are then loaded with the test client with and without the
+middleware, for comparison with the cost of a whole request; their difference
+is within the noise.
+"""
+
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+from . import harness
+
+# the budget of the product list and search views, each rendering one page template
+QUERIES_PER_REQUEST = 6
+BUDGET = 50e-6
+
+
+def fastest(variants, calls, repeat):
+    """Seconds per call of each function in ``variants``, the fastest of ``repeat`` interleaved runs."""
+    timings = [[] for _ in variants]
+    for _ in range(repeat):
+        # interleaved, so a slow moment of a shared machine hits all variants alike
+        for func, variant_timings in zip(variants, timings):
+            start = time.perf_counter()
+            for _ in range(calls):
+                func()
+            variant_timings.append((time.perf_counter() - start) / calls)
+    return [min(variant_timings) for variant_timings in timings]
+
+
+def request_overhead(calls, repeat):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    from btw_app.metrics import MetricsMiddleware
+
+    def view(request):
+        return HttpResponse("")
+
+    request = RequestFactory().get("/")
+    request.resolver_match = resolve("/")
+    middleware = MetricsMiddleware(view)
+    return fastest([lambda: view(request), lambda: middleware(request)], calls, repeat)
+
+
+def query_overhead(calls, repeat):
+    from django.db import DEFAULT_DB_ALIAS, connections
+
+    from btw_app.instrumentation import _record, record_queries
+
+    def execute(sql, params, many, context):
+        return None
+
+    # the connection itself, as Django passes it to the execute wrappers
+    context = {"connection": connections[DEFAULT_DB_ALIAS]}
+    timings = []
+    for recording in (nullcontext, record_queries):
+        with recording():
+            timings += fastest([lambda: _record(execute, "SELECT 1", (), False, context)], calls, repeat)
+    return timings
+
+
+def template_overhead(calls, repeat):
+    from django.template import engines
+
+    from btw_app.instrumentation import record_queries
+
+    template = engines["django"].from_string("<li>{{ name }}</li>")
+    timings = []
+    for recording in (nullcontext, record_queries):
+        with recording():
+            timings += fastest([lambda: template.render({"name": "Rattle"})], calls, repeat)
+    return timings
+
+
+def page_timings(url, requests, repeat):
+    from django.test import Client, override_settings
+
+    clients = []
+    for enabled in (False, True):
+        # the middleware chain of a client is built on its first request
+        with override_settings(METRICS=enabled):
+            client = Client()
+            assert client.get(url).status_code == 200
+        clients.append(client)
+    return fastest([lambda client=client: client.get(url) for client in clients], requests, repeat)
+
+
+def main():
+    parser = harness.parser(__doc__, products=1000)
+    parser.add_argument("--requests", type=int, default=20_000, help="Calls per run of each part.")
+    args = parser.parse_args()
+    # the flushing thread writes here, as in a gunicorn worker
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="btw-metrics-")
+    harness.setup("metrics", fresh=args.fresh)
+    harness.ensure_catalog(args.products)
+
+    from django.urls import reverse
+
+    parts = {
+        "request (empty view)": (1, request_overhead(args.requests, args.repeat)),
+        "SQL query": (QUERIES_PER_REQUEST, query_overhead(args.requests, args.repeat)),
+        "template render": (1, template_overhead(args.requests, args.repeat)),
+    }
+    rows = []
+    total = 0
+    for name, (count, (without, with_metrics)) in parts.items():
+        overhead = max(with_metrics - without, 0)
+        total += count * overhead
+        rows.append([name, f"{without * 1e6:.2f} µs", f"{with_metrics * 1e6:.2f} µs", f"{overhead * 1e6:.2f} µs"])
+    harness.table(["part", "without metrics", "with metrics", "overhead"], rows)
+    print(
+        f"\nOverhead of a request with {QUERIES_PER_REQUEST} queries and a template: {total * 1e6:.1f} µs "
+        f"({'within' if total < BUDGET else 'over'} the budget of {BUDGET * 1e6:.0f} µs).\n"
+    )
+
+    rows = []
+    for name, url in (("product list", reverse("products")), ("search", reverse("search") + "?q=bottle")):
+        requests = max(args.requests // 200, 20)
+        without, with_metrics = page_timings(url, requests, args.repeat)
+        rows.append([name, f"{without * 1e3:.2f} ms", f"{with_metrics * 1e3:.2f} ms"])
+    harness.table(["page", "without metrics", "with metrics"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Offload of the primary database to a read replica, with read-your-writes after a comment.
+
+    python -m benchmarks.replicas --visitors 200
+
+Copies the benchmark database into a second SQLite file that serves as the
+replica (``DATABASE_REPLICA_URLS``), then replays browsing visitors with the
+test client: each loads the listing and a few product pages, every fourth one
+also posts a comment and follows the redirect back to the product page, about
+5% of all requests. Every query is counted on the database it ran on, once
+with every read pinned to the primary and once with ``btw_app.routers``.
+
+The copy does not replicate, so a comment only shows on the page after the
+redirect when that page is read from the primary: the benchmark checks that
+every visitor sees their own comment.
+"""
+
+import os
+import random
+import sqlite3
+import time
+from collections import Counter
+from contextlib import ExitStack, nullcontext
+
+from . import harness
+
+PAGES_PER_VISITOR = 4
+COMMENTING_VISITOR_EVERY = 4
+
+
+def replay(paths, visitors, seed=0):
+    """Replay the visitors, return the number of requests and how many comments were seen after their redirect."""
+    from django.test import Client
+
+    rng = random.Random(seed)
+    requests = seen = 0
+    for visitor in range(visitors):
+        client = Client()
+        client.get("/")
+        for path in rng.sample(paths, PAGES_PER_VISITOR):
+            assert client.get(path).status_code == 200
+        requests += 1 + PAGES_PER_VISITOR
+        if visitor % COMMENTING_VISITOR_EVERY == 0:
+            text = f"benchmark comment {visitor}-{rng.random()}"
+            response = client.post(
+                path,
+                {"rating": 5, "text": text, "guest_name": "Benchmark", "guest_email": "benchmark@example.com"},
+                follow=True,
+            )
+            requests += 2
+            seen += text in response.content.decode()
+    return requests, seen
+
+
+def count_queries(aliases, func):
+    """Run ``func`` and count the queries it ran per database alias."""
+    from django.db import connections
+
+    counts = Counter()
+
+    def counter(alias):
+        def wrapper(execute, sql, params, many, context):
+            counts[alias] += 1
+            return execute(sql, params, many, context)
+
+        return wrapper
+
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(counter(alias)))
+        start = time.perf_counter()
+        result = func()
+    return counts, time.perf_counter() - start, result
+
+
+def main():
+    parser = harness.parser(__doc__, products=10_000, comments=20_000)
+    parser.add_argument("--visitors", type=int, default=200, help="Visitors replayed per configuration.")
+    args = parser.parse_args()
+    replica = harness.BENCHMARK_DIR / "replicas-replica.sqlite3"
+    # read by the settings, before harness.setup() loads them
+    os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{replica}"
+    harness.setup("replicas", fresh=args.fresh)
+
+    from django.db import connections
+
+    from btw_app.routers import pin_to_primary
+    from products.models import Product
+
+    # the replica is copied from the seeded primary below
+    with pin_to_primary():
+        harness.ensure_catalog(args.products, args.comments)
+        products = Product.objects.exclude(category=None).select_related("category").order_by("pk")[:1000]
+        paths = [f"/category/{product.category.slug}/{product.pk}/" for product in products]
+    connections.close_all()
+
+    rows = []
+    for name, context in (("primary only", pin_to_primary), ("primary + replica", nullcontext)):
+        # a fresh copy for every run, like a replica that caught up
+        with sqlite3.connect(os.environ["BENCHMARK_DATABASE"]) as source, sqlite3.connect(replica) as target:
+            source.backup(target)
+        connections.close_all()
+        with context():
+            counts, elapsed, (requests, seen) = count_queries(
+                ["default", "replica1"], lambda: replay(paths, args.visitors)
+            )
+        commented = len(range(0, args.visitors, COMMENTING_VISITOR_EVERY))
+        rows.append(
+            [
+                name,
+                requests,
+                counts["default"],
+                counts["replica1"],
+                f"{counts['default'] / requests:.1f}",
+                f"{seen}/{commented}",
+                f"{requests / elapsed:.0f}",
+            ]
+        )
+    harness.table(
+        [
+            "configuration",
+            "requests",
+            "primary queries",
+            "replica queries",
+            "primary/request",
+            "own comment seen",
+            "req/s",
+        ],
+        rows,
+    )
+    reduction = 1 - rows[1][2] / rows[0][2]
+    print(f"Queries on the primary reduced by {reduction:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Start the app like the container does and load it with concurrent keep-alive clients.
+
+    python -m benchmarks.server --duration 10 --clients 8
+
+Compares the development server the old entrypoint ran (after ``makemigrations``
+and ``migrate`` on every start) with gunicorn configured by ``gunicorn.conf.py``,
+with and without ``preload_app``. Reports the time from launching the command
+until the first page is served, and requests per second and latency of the
+product listing and a product page. ``collectstatic`` is left out, the image
+runs it at build time now.
+"""
+
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from . import harness
+
+SERVERS = {
+    "runserver (old entrypoint)": (
+        "{python} manage.py makemigrations && {python} manage.py migrate && "
+        "exec {python} manage.py runserver 127.0.0.1:{port}",
+        {},
+    ),
+    "gunicorn": ("exec gunicorn btw_app.wsgi:application --bind 127.0.0.1:{port} --access-logfile /dev/null", {}),
+    "gunicorn, no preload": (
+        "exec gunicorn btw_app.wsgi:application --bind 127.0.0.1:{port} --access-logfile /dev/null",
+        {"GUNICORN_PRELOAD": "false"},
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(port, process, timeout=60):
+    """Return the seconds until ``/`` answers, measured from now."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with {process.returncode}.")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError("The server did not start in time.")
+
+
+def load(port, path, clients, duration):
+    """Request ``path`` from ``clients`` threads for ``duration`` seconds; return requests/s and the latencies."""
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        own = []
+        while (start := time.perf_counter()) < deadline:
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # a worker restarting after max_requests drops its connections, clients reconnect
+                connection.close()
+                continue
+            assert response.status == 200, response.status
+            if response.getheader("Connection") == "close":
+                connection.close()
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) / duration, latencies
+
+
+def percentile(values, fraction):
+    return sorted(values)[int(fraction * (len(values) - 1))]
+
+
+def main():
+    parser = harness.parser(__doc__, products=10_000, comments=200_000)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per page.")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent keep-alive connections.")
+    args = parser.parse_args()
+    harness.setup("catalog", fresh=args.fresh)
+    harness.ensure_catalog(args.products, args.comments)
+
+    from products.models import Product
+
+    product = Product.objects.exclude(category=None).select_related("category").order_by("pk").first()
+    pages = {"listing": "/", "detail": f"/category/{product.category.slug}/{product.pk}/"}
+
+    rows = []
+    for name, (command, env) in SERVERS.items():
+        port = free_port()
+        command = command.format(python=sys.executable, port=port)
+        startups = []
+        for _ in range(args.repeat):
+            process = subprocess.Popen(
+                command,
+                shell=True,
+                env={**os.environ, **env},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            try:
+                startups.append(wait_until_serving(port, process))
+                if len(startups) < args.repeat:
+                    continue
+                row = [name, f"{statistics.median(startups):.2f}"]
+                for path in pages.values():
+                    load(port, path, args.clients, 1)
+                    rate, latencies = load(port, path, args.clients, args.duration)
+                    row += [f"{rate:,.0f}", f"{percentile(latencies, 0.95) * 1000:.0f}"]
+                rows.append(row)
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients")
+    columns = [f"{page} {metric}" for page in pages for metric in ("req/s", "p95 ms")]
+    harness.table(["server", "startup s", *columns], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""Settings of the benchmarks: the project settings on the benchmark database, with the page cache disabled."""
+
+import os
+
+from btw_app.settings import *  # noqa: F401,F403
+from btw_app.settings import DATABASES
+
+# a DATABASE_URL of another database is used as it is, benchmarks.postgres runs on PostgreSQL
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DATABASE"]
+# every request is rendered, DEBUG would also record every query
+CATALOG_CACHE_TIMEOUT = 0
+DEBUG = False
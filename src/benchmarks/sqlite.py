@@ -0,0 +1,124 @@
+"""
+Concurrent reads and comment writes on SQLite, with and without the connection pragmas.
+
+    python -m benchmarks.sqlite --duration 10 --readers 4 --writers 2
+
+Every reader and writer is its own process, like the workers of gunicorn.
+Readers load product pages, writers post guest comments on them (a comment and
+the rating aggregates of its product are written in one transaction). Compares
+the SQLite defaults the project used before (rollback journal, full sync),
+the pragmas of ``btw_app.config.sqlite_options`` with deferred transactions,
+and the same with ``BEGIN IMMEDIATE`` for writers, the default of the settings.
+Writes that failed with "database is locked" are counted as errors.
+"""
+
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+from . import harness
+
+CONFIGURATIONS = {
+    "rollback journal (before)": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_TEMP_STORE": "DEFAULT",
+        "SQLITE_TRANSACTION_MODE": "",
+    },
+    "WAL + pragmas, deferred": {"SQLITE_TRANSACTION_MODE": ""},
+    "WAL + pragmas, immediate": {"SQLITE_TRANSACTION_MODE": "IMMEDIATE"},
+}
+PRODUCTS = 1000
+GUEST = {"guest_name": "Benchmark", "guest_email": "benchmark@example.com"}
+
+
+def worker(role, configuration, paths, duration, barrier, results):
+    os.environ.update(configuration)
+    import django
+    from django.db import OperationalError
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    client = Client()
+    done, errors, latencies = 0, 0, []
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while (start := time.perf_counter()) < deadline:
+        path = random.choice(paths)
+        try:
+            if role == "reader":
+                response = client.get(path)
+                assert response.status_code == 200, response.status_code
+            else:
+                response = client.post(path, {"rating": random.randint(1, 5), "text": "benchmark", **GUEST})
+                assert response.status_code == 302, response.status_code
+        except OperationalError:
+            errors += 1
+            continue
+        done += 1
+        latencies.append(time.perf_counter() - start)
+    results.put((role, done, errors, latencies))
+
+
+def run(configuration, paths, args):
+    # leaving WAL needs the database to itself, switch before the workers connect
+    with sqlite3.connect(os.environ["BENCHMARK_DATABASE"]) as connection:
+        connection.execute(f"PRAGMA journal_mode={configuration.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+    # spawned processes read the settings with the configuration in their environment
+    context = multiprocessing.get_context("spawn")
+    roles = ["reader"] * args.readers + ["writer"] * args.writers
+    barrier, results = context.Barrier(len(roles)), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(role, configuration, paths, args.duration, barrier, results))
+        for role in roles
+    ]
+    for process in processes:
+        process.start()
+    # a worker that crashed never reports, wait for the others only as long as the run takes
+    reports = [results.get(timeout=args.duration + 60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    row = []
+    for role in ("reader", "writer"):
+        own = [report for report in reports if report[0] == role]
+        latencies = [latency for report in own for latency in report[3]]
+        row += [
+            f"{sum(report[1] for report in own) / args.duration:.0f}",
+            f"{statistics.quantiles(latencies, n=20)[-1] * 1000:.0f}" if len(latencies) > 1 else "-",
+        ]
+    row.append(sum(report[2] for report in reports))
+    return row
+
+
+def main():
+    parser = harness.parser(__doc__, products=10_000, comments=20_000)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per configuration.")
+    parser.add_argument("--readers", type=int, default=4, help="Reading processes.")
+    parser.add_argument("--writers", type=int, default=2, help="Writing processes.")
+    args = parser.parse_args()
+    harness.setup("sqlite", fresh=args.fresh)
+    harness.ensure_catalog(args.products, args.comments)
+
+    from django.db import connections
+
+    from products.models import Product
+
+    products = Product.objects.exclude(category=None).select_related("category").order_by("pk")[:PRODUCTS]
+    paths = [f"/category/{product.category.slug}/{product.pk}/" for product in products]
+    connections.close_all()
+
+    print(f"{os.cpu_count()} CPU(s), {args.readers} readers, {args.writers} writers, {args.duration:g} s each")
+    rows = [[name, *run(configuration, paths, args)] for name, configuration in CONFIGURATIONS.items()]
+    harness.table(["configuration", "reads/s", "read p95 ms", "writes/s", "write p95 ms", "locked"], rows)
+
+
+if __name__ == "__main__":
+    main()
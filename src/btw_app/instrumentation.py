@@ -0,0 +1,260 @@
+"""
+Per request instrumentation: query budgets, N+1 detection and ``Server-Timing``.
+
+:class:`QueryBudgetMiddleware` records every SQL query of a request, on every
+database alias and also from async views, and the time spent rendering
+templates (with the :class:`DjangoTemplates` backend). Then it
+
+- checks the query budget declared on the view with :func:`query_budget`
+- looks for the same query running over and over with other parameters, the
+  shape of an N+1 problem (a query per row of a list)
+- adds a ``Server-Timing`` header with the database and template time, which
+  the network panel of the browser shows next to every response
+
+The ``QUERY_BUDGETS`` setting decides what happens to a request over its
+budget: ``raise`` (the default in tests, so the test of the view fails), ``log``
+(the default with ``DEBUG``) or ``off``. ``SERVER_TIMING`` turns the header on.
+Queries a streaming response runs while it is sent are not counted.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+# a query running more often than this per request with the same shape is reported
+DEFAULT_MAX_REPEATS = 5
+
+_recorder = ContextVar("query_recorder", default=None)
+_installed = False
+
+_IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+_SAVEPOINT_RE = re.compile(r"^(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT) ")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    """``sql`` with the length of ``IN (...)`` lists collapsed, queries differing only in their parameters match."""
+    return _IN_LIST_RE.sub("IN (...)", sql)
+
+
+@dataclass
+class QueryRecorder:
+    queries: list = field(default_factory=list)
+    db_time: float = 0.0
+    template_time: float = 0.0
+    # template time includes the queries run while rendering (lazy querysets), subtracted for the header
+    template_db_time: float = 0.0
+    rendering: int = 0
+    # the recorder of an enclosing block, which sees the queries of this one too
+    parent: "QueryRecorder | None" = None
+
+    def add(self, alias, sql, duration, rendering=False):
+        rendering = rendering or self.rendering > 0
+        self.queries.append((alias, sql, duration))
+        self.db_time += duration
+        if rendering:
+            self.template_db_time += duration
+        if self.parent is not None:
+            self.parent.add(alias, sql, duration, rendering)
+
+    def add_template_time(self, duration):
+        self.template_time += duration
+        if self.parent is not None:
+            self.parent.add_template_time(duration)
+
+    def repeated(self, max_repeats=DEFAULT_MAX_REPEATS):
+        """``[(shape, count)]`` of the query shapes that ran more than ``max_repeats`` times."""
+        shapes = Counter(query_shape(sql) for _, sql, _ in self.queries if not _SAVEPOINT_RE.match(sql))
+        return [(shape, count) for shape, count in shapes.most_common() if count > max_repeats]
+
+    def problems(self, budget):
+        problems = []
+        if budget.max_queries is not None and len(self.queries) > budget.max_queries:
+            problems.append(f"{len(self.queries)} queries, the budget is {budget.max_queries}")
+        for shape, count in self.repeated(budget.max_repeats):
+            problems.append(f"{count} times (possible N+1): {shape}")
+        return problems
+
+    def report(self):
+        return "\n".join(f"  [{alias}] {duration * 1000:.2f} ms  {sql}" for alias, sql, duration in self.queries)
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(context["connection"].alias, sql, time.perf_counter() - start)
+
+
+def _install(connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+def install_recording():
+    """Record the queries of every connection, including the ones opened later and in other threads."""
+    global _installed
+    # called for every recorded block, connecting the signal again is not free
+    if _installed:
+        return
+    connection_created.connect(_install, dispatch_uid="btw_app.instrumentation")
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    _installed = True
+
+
+@contextmanager
+def record_queries():
+    """Record the queries and template time of the block in the :class:`QueryRecorder` it yields."""
+    install_recording()
+    recorder = QueryRecorder(parent=_recorder.get())
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    max_queries: int | None = None
+    max_repeats: int = DEFAULT_MAX_REPEATS
+    # the budget of POST requests, if they write more than the page reads
+    max_post_queries: int | None = None
+
+    def for_method(self, method):
+        if method == "POST" and self.max_post_queries is not None:
+            return replace(self, max_queries=self.max_post_queries)
+        return self
+
+
+DEFAULT_BUDGET = QueryBudget()
+
+
+def query_budget(max_queries=None, max_repeats=DEFAULT_MAX_REPEATS, post=None):
+    """
+    Declare how many queries a request of the decorated view may run in
+    total, and how often one query shape may repeat. ``post`` is the total of
+    POST requests if they have a budget of their own. Checked by
+    :class:`QueryBudgetMiddleware`.
+    """
+
+    def decorator(view):
+        view.query_budget = QueryBudget(max_queries, max_repeats, post)
+        return view
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_recording()
+
+    @staticmethod
+    def enabled():
+        return settings.QUERY_BUDGETS != "off" or settings.SERVER_TIMING
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled():
+            return self.get_response(request)
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not self.enabled():
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", DEFAULT_BUDGET).for_method(request.method)
+
+    def finish(self, request, response, recorder, start):
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = self.server_timing(recorder, time.perf_counter() - start)
+        if settings.QUERY_BUDGETS != "off":
+            problems = recorder.problems(getattr(request, "query_budget", DEFAULT_BUDGET))
+            if problems:
+                message = f"{request.method} {request.path} is over its query budget:\n" + "\n".join(problems)
+                if settings.QUERY_BUDGETS == "raise":
+                    raise QueryBudgetExceeded(f"{message}\nQueries:\n{recorder.report()}")
+                logger.warning(message)
+        return response
+
+    @staticmethod
+    def server_timing(recorder, total):
+        template = recorder.template_time - recorder.template_db_time
+        return (
+            f'db;dur={recorder.db_time * 1000:.1f};desc="{len(recorder.queries)} queries", '
+            f"tpl;dur={template * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        recorder = _recorder.get()
+        if recorder is None:
+            return super().render(context, request)
+        recorder.rendering += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.rendering -= 1
+            # templates rendered by a template (fragments) are part of its time already
+            if not recorder.rendering:
+                recorder.add_template_time(time.perf_counter() - start)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing the templates rendered while queries are recorded."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+class QueryBudgetTestMixin:
+    """Assertions for ``TestCase`` classes on the queries a block of code runs."""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries=None, max_repeats=DEFAULT_MAX_REPEATS):
+        with record_queries() as recorder:
+            yield recorder
+        problems = recorder.problems(QueryBudget(max_queries, max_repeats))
+        if problems:
+            self.fail("Over the query budget:\n" + "\n".join(problems) + f"\nQueries:\n{recorder.report()}")
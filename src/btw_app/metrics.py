@@ -0,0 +1,320 @@
+"""
+Request metrics in the Prometheus text format, served at ``/metrics``.
+
+:class:`MetricsMiddleware` records every request under the name of the URL
+pattern it matched (``unresolved`` for static files and unknown URLs):
+
+- the number of requests by method and status, and their latency (a histogram)
+- the SQL queries and their time, and the time spent rendering templates,
+  taken from the recorder of ``btw_app.instrumentation``
+- the hits and misses of the page cache and the fragment cache
+- the size of the response body (a histogram; streaming responses are left out)
+
+Every process keeps its numbers in memory, and a thread writes them to a file
+of its own in ``METRICS_DIR`` every ``METRICS_FLUSH_SECONDS``. The view adds
+up the files of all processes, so it does not matter which gunicorn worker
+answers the scrape; the numbers of the other workers are at most that many
+seconds old. When a worker exits, gunicorn folds its file into the archive
+(see ``gunicorn.conf.py``), so the totals survive worker restarts. Without
+``METRICS_DIR`` (the development server, the tests) the view reports the
+numbers of its own process.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+from .instrumentation import install_recording, record_queries
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNRESOLVED = "unresolved"
+# anything else a client sends is counted as "other", so no label value is chosen by the client
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+ARCHIVE = "archive.json"
+LOCK = "metrics.lock"
+
+# name -> (type, help, bucket bounds of a histogram)
+METRICS = {
+    "btw_http_requests_total": ("counter", "Requests by view, method and status.", None),
+    "btw_http_request_duration_seconds": ("histogram", "Time to respond to a request, by view.", DURATION_BUCKETS),
+    "btw_http_response_size_bytes": ("histogram", "Size of the response bodies, by view.", SIZE_BUCKETS),
+    "btw_db_queries_total": ("counter", "SQL queries by view.", None),
+    "btw_db_query_duration_seconds_total": ("counter", "Time spent in SQL queries, by view.", None),
+    "btw_template_render_duration_seconds_total": (
+        "counter",
+        "Time spent rendering templates, without their queries, by view.",
+        None,
+    ),
+    "btw_cache_requests_total": ("counter", "Page and fragment cache lookups by view, cache and result.", None),
+}
+
+
+class Registry:
+    """The metrics of this process, keyed by ``(name, labels)`` with ``labels`` a tuple of pairs."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        # a count per bucket, then the count above the last bound, then the sum
+        self.histograms = {}
+        self.changed = False
+        self.flusher_pid = None
+
+    def inc(self, name, labels, amount=1):
+        """Add to a counter, the caller holds the lock."""
+        self.counters[name, labels] += amount
+        self.changed = True
+
+    def observe(self, name, labels, value):
+        """Add an observation to a histogram, the caller holds the lock."""
+        bounds = METRICS[name][2]
+        values = self.histograms.get((name, labels))
+        if values is None:
+            values = self.histograms[name, labels] = [0] * (len(bounds) + 2)
+        values[bisect_left(bounds, value)] += 1
+        values[-1] += value
+        self.changed = True
+
+    def snapshot(self):
+        with self.lock:
+            self.changed = False
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def flush(self, directory):
+        """Write the metrics of this process to its file in ``directory``."""
+        path = Path(directory) / f"{os.getpid()}.json"
+        _write(path, self.snapshot())
+
+    def start_flusher(self):
+        """Flush every ``METRICS_FLUSH_SECONDS`` in a thread of this process, once something changed."""
+        if not settings.METRICS_DIR or self.flusher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name="metrics-flusher", daemon=True).start()
+
+    def _flush_periodically(self):
+        # off the request path, and an idle worker's last requests still get written
+        while self.flusher_pid == os.getpid():
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            directory = settings.METRICS_DIR
+            if self.changed and directory:
+                self.flush(directory)
+
+
+registry = Registry()
+# a forked worker starts from zero with a lock of its own, the numbers of its parent are in the parent's file
+os.register_at_fork(after_in_child=registry.__init__)
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    temporary.write_text(json.dumps(data))
+    # a scrape reads either the old or the new file, never half of one
+    os.replace(temporary, path)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {"counters": [], "histograms": []}
+
+
+def merge(snapshots):
+    """Add up snapshots into ``(counters, histograms)`` dicts keyed by ``(name, labels)``."""
+    counters = defaultdict(int)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, values in snapshot["histograms"]:
+            key = name, tuple(map(tuple, labels))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+
+def _as_snapshot(counters, histograms):
+    return {
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+@contextmanager
+def _locked(directory, shared):
+    import fcntl
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    with open(Path(directory) / LOCK, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def collect(directory):
+    """The metrics of every process that wrote to ``directory``, including the archive."""
+    # a worker folded into the archive must not be counted twice, or not at all
+    with _locked(directory, shared=True):
+        return merge(_read(path) for path in sorted(Path(directory).glob("*.json")))
+
+
+def mark_process_dead(directory, pid):
+    """Fold the file of the exited process ``pid`` into the archive of ``directory``."""
+    path = Path(directory) / f"{pid}.json"
+    if not path.exists():
+        return
+    with _locked(directory, shared=False):
+        archive = Path(directory) / ARCHIVE
+        _write(archive, _as_snapshot(*merge([_read(archive), _read(path)])))
+        path.unlink()
+
+
+def reset_directory(directory):
+    """Remove the files of an earlier server, counters start from zero with every start."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for path in Path(directory).glob("*.json*"):
+        path.unlink(missing_ok=True)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render(counters, histograms):
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text, bounds) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value!r}")
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip([*bounds, "+Inf"], values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-1]!r}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def observe_request(request, response, recorder, duration):
+    """Record a finished request in :data:`registry`."""
+    match = request.resolver_match
+    view = (("view", match.view_name if match is not None else UNRESOLVED),)
+    method = request.method if request.method in METHODS else "other"
+    size = None if response.streaming else len(response.content)
+    page_cache_hit = getattr(request, "page_cache_hit", None)
+    fragments = getattr(request, "_fragment_stats", None)
+    with registry.lock:
+        registry.inc("btw_http_requests_total", (*view, ("method", method), ("status", str(response.status_code))))
+        registry.observe("btw_http_request_duration_seconds", view, duration)
+        if size is not None:
+            registry.observe("btw_http_response_size_bytes", view, size)
+        if recorder.queries:
+            registry.inc("btw_db_queries_total", view, len(recorder.queries))
+            registry.inc("btw_db_query_duration_seconds_total", view, recorder.db_time)
+        if recorder.template_time:
+            registry.inc(
+                "btw_template_render_duration_seconds_total",
+                view,
+                recorder.template_time - recorder.template_db_time,
+            )
+        if page_cache_hit is not None:
+            result = "hit" if page_cache_hit else "miss"
+            registry.inc("btw_cache_requests_total", (*view, ("cache", "page"), ("result", result)))
+        if fragments is not None:
+            if fragments.hits:
+                registry.inc(
+                    "btw_cache_requests_total", (*view, ("cache", "fragment"), ("result", "hit")), fragments.hits
+                )
+            if fragments.misses:
+                registry.inc(
+                    "btw_cache_requests_total", (*view, ("cache", "fragment"), ("result", "miss")), fragments.misses
+                )
+    registry.start_flusher()
+
+
+class MetricsMiddleware:
+    """Record the metrics of every request, first in ``MIDDLEWARE`` so it times all the others."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_recording()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        observe_request(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = await self.get_response(request)
+        observe_request(request, response, recorder, time.perf_counter() - start)
+        return response
+
+
+@never_cache
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized\n", status=401, headers={"WWW-Authenticate": "Bearer"})
+    if settings.METRICS_DIR:
+        # the numbers of this worker are as fresh as the scrape
+        registry.flush(settings.METRICS_DIR)
+        counters, histograms = collect(settings.METRICS_DIR)
+    else:
+        counters, histograms = merge([registry.snapshot()])
+    return HttpResponse(render(counters, histograms), content_type=CONTENT_TYPE)
@@ -0,0 +1,287 @@
+"""
+Timing and profiling of functions and blocks, for views, management commands and tests.
+
+    @profiled
+    def handle(self, *args, **options): ...
+
+    @profiled("catalog.export", sample=10, slow_ms=500, capture="cprofile")
+    def export(...): ...
+
+    with profile_block("feed.rows"):
+        ...
+
+Every timed call becomes a :class:`TimingRecord`. It is kept in a ring buffer
+of the last ``PROFILING_BUFFER_SIZE`` records (:func:`recent`) and logged to
+the ``btw_app.profiling`` logger with the record as ``extra={"timing": {...}}``,
+so a JSON formatter writes its fields. Calls slower than ``slow_ms`` are logged
+as warnings, the others at debug level.
+
+Profiling is off unless ``PROFILING`` is set, or turned on at runtime with
+:func:`enable` (and off with :func:`disable`). Off, a decorated function costs
+a check of one global flag, a block an empty context manager. ``sample=N``
+times one call in N. With ``capture`` the timed calls run under ``cProfile``
+or ``tracemalloc``, which slows them down (combine it with sampling); the
+profile or the allocations are kept on the records of slow calls. One capture
+runs at a time, calls overlapping it in other threads are only timed.
+"""
+
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import asdict, dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+logger = logging.getLogger(__name__)
+
+CAPTURES = {"cprofile", "tracemalloc"}
+# lines of the profile or allocation statistics kept on a record
+CAPTURE_LINES = 20
+
+_enabled = False
+_default_sample = 1
+_default_slow_ms = None
+_records = deque(maxlen=1000)
+_sites = {}
+_capture_lock = threading.Lock()
+
+
+# slots instead of frozen, which is slower to create
+@dataclass(slots=True)
+class TimingRecord:
+    name: str
+    duration_ns: int
+    # wall clock time the call started at, for correlating with other logs
+    started_at: float
+    ok: bool = True
+    error: str = ""
+    slow: bool = False
+    profile: str = ""
+
+    @property
+    def duration_ms(self):
+        return self.duration_ns / 1_000_000
+
+
+def configure():
+    """Apply the ``PROFILING*`` settings, called when the apps are ready."""
+    global _enabled, _default_sample, _default_slow_ms, _records
+    from django.conf import settings
+
+    _default_sample = settings.PROFILING_SAMPLE
+    _default_slow_ms = settings.PROFILING_SLOW_MS
+    if _records.maxlen != settings.PROFILING_BUFFER_SIZE:
+        _records = deque(_records, maxlen=settings.PROFILING_BUFFER_SIZE)
+    _enabled = settings.PROFILING
+
+
+def enable(sample=None, slow_ms=None):
+    """Turn profiling on, optionally with another default sample rate and slow threshold."""
+    global _enabled, _default_sample, _default_slow_ms
+    if sample is not None:
+        _default_sample = sample
+    if slow_ms is not None:
+        _default_slow_ms = slow_ms
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def recent(name=None):
+    """The records in the ring buffer, oldest first, only the ones of ``name`` if given."""
+    return [record for record in list(_records) if name is None or record.name == name]
+
+
+def clear():
+    _records.clear()
+
+
+class _Site:
+    """A decorated function or named block, shared by its calls."""
+
+    __slots__ = ("name", "sample", "slow_ms", "capture", "calls")
+
+    def __init__(self, name, sample, slow_ms, capture):
+        if capture is not None and capture not in CAPTURES:
+            raise ValueError(f"capture must be one of {sorted(CAPTURES)}, not {capture!r}")
+        self.name = name
+        self.sample = sample
+        self.slow_ms = slow_ms
+        self.capture = capture
+        # next() on a count is atomic, the threads of a worker share it without a lock
+        self.calls = itertools.count()
+
+    def sampled(self):
+        sample = self.sample or _default_sample
+        return sample <= 1 or next(self.calls) % sample == 0
+
+
+def _site(name, sample=None, slow_ms=None, capture=None):
+    site = _sites.get(name)
+    if site is None:
+        site = _sites.setdefault(name, _Site(name, sample, slow_ms, capture))
+    return site
+
+
+class _Capture:
+    def __init__(self, kind):
+        self.kind = kind if _capture_lock.acquire(blocking=False) else None
+        if self.kind == "cprofile":
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler (a debugger, coverage) is active
+                self.release()
+        elif self.kind == "tracemalloc":
+            self.started = not tracemalloc.is_tracing()
+            if self.started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.before = tracemalloc.take_snapshot()
+
+    def release(self):
+        self.kind = None
+        _capture_lock.release()
+
+    def finish(self, keep):
+        """Stop capturing, and return the report if ``keep``."""
+        if self.kind is None:
+            return ""
+        report = ""
+        if self.kind == "cprofile":
+            self.profiler.disable()
+            if keep:
+                stream = io.StringIO()
+                pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(CAPTURE_LINES)
+                report = stream.getvalue()
+        else:
+            if keep:
+                peak = tracemalloc.get_traced_memory()[1]
+                # without the allocations of the snapshots themselves
+                ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+                snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+                changes = snapshot.compare_to(self.before.filter_traces(ignore), "lineno")[:CAPTURE_LINES]
+                report = "\n".join([f"peak {peak / 1024:.1f} KiB", *map(str, changes)])
+            if self.started:
+                tracemalloc.stop()
+        self.release()
+        return report
+
+
+class _Call:
+    """Times one call of a site as a context manager."""
+
+    __slots__ = ("site", "capture", "started_at", "start")
+
+    def __init__(self, site):
+        self.site = site
+
+    def __enter__(self):
+        self.capture = _Capture(self.site.capture) if self.site.capture else None
+        self.started_at = time.time()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter_ns() - self.start
+        slow_ms = self.site.slow_ms if self.site.slow_ms is not None else _default_slow_ms
+        slow = slow_ms is not None and duration >= slow_ms * 1_000_000
+        profile = self.capture.finish(keep=slow or slow_ms is None) if self.capture else ""
+        _emit(
+            TimingRecord(
+                name=self.site.name,
+                duration_ns=duration,
+                started_at=self.started_at,
+                ok=exc_type is None,
+                error="" if exc_type is None else f"{exc_type.__name__}: {exc}",
+                slow=slow,
+                profile=profile,
+            )
+        )
+        # exceptions propagate
+        return False
+
+
+def _emit(record):
+    _records.append(record)
+    level = logging.WARNING if record.slow else logging.DEBUG
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(
+        level,
+        "%s %s %.3f ms%s",
+        record.name,
+        "took" if record.ok else f"failed ({record.error}) after",
+        record.duration_ms,
+        "\n" + record.profile if record.profile else "",
+        extra={"timing": {**asdict(record), "duration_ms": record.duration_ms}},
+    )
+
+
+def profiled(func=None, /, *, sample=None, slow_ms=None, capture=None, name=None):
+    """
+    Time the calls of the decorated function or coroutine function while
+    profiling is enabled. Usable bare (``@profiled``), with options, or with the
+    record name as first argument (``@profiled("catalog.export")``); the name
+    defaults to ``module.qualname``.
+    """
+    if isinstance(func, str):
+        return profiled(sample=sample, slow_ms=slow_ms, capture=capture, name=func)
+    if func is None:
+        return lambda func: profiled(func, sample=sample, slow_ms=slow_ms, capture=capture, name=name)
+
+    site = _site(name or f"{func.__module__}.{func.__qualname__}", sample, slow_ms, capture)
+
+    if iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not _enabled or not site.sampled():
+                return await func(*args, **kwargs)
+            with _Call(site):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled or not site.sampled():
+            return func(*args, **kwargs)
+        with _Call(site):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class _Disabled:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_DISABLED = _Disabled()
+
+
+def profile_block(name, *, sample=None, slow_ms=None, capture=None):
+    """Time the ``with`` block as ``name`` while profiling is enabled. The options of the first use of a name apply."""
+    if not _enabled:
+        return _DISABLED
+    site = _site(name, sample, slow_ms, capture)
+    return _Call(site) if site.sampled() else _DISABLED
@@ -0,0 +1,141 @@
+"""
+Read replica routing.
+
+With replicas configured (``DATABASE_REPLICA_URLS``, see docs/database.md)
+:class:`ReplicaRouter` sends the reads of the catalog and the user accounts
+to the replicas by weighted round-robin and everything else to the primary
+(``default``). Reads go to the primary as well
+
+- inside a transaction on the primary, so it reads what it is about to change
+- during a request that writes (any method but GET, HEAD, OPTIONS and TRACE)
+- for a few seconds after such a request, marked by a cookie, so a visitor
+  sees their own comment or login although the replicas lag behind
+
+The last two are handled by :class:`ReplicaPinMiddleware`. The page cache
+(``products.cache``) also renders pages from the primary for a few seconds
+after a write changed them, so other visitors' stale pages are not cached.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import cycle
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# products and the users app, whose accounts are django.contrib.auth models;
+# sessions stay on the primary, a lagging replica would log a visitor out
+ROUTED_APPS = {"products", "auth"}
+PIN_COOKIE = "pin_primary"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE"}
+
+_pinned = ContextVar("pinned_to_primary", default=False)
+
+
+@contextmanager
+def pin_to_primary():
+    """Send every read of the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def weighted_sequence(weights):
+    """
+    One round of smooth weighted round-robin (as in nginx) over ``{alias: weight}``:
+    every alias appears ``weight`` times and as evenly spread as possible.
+    """
+    weights = {alias: weight for alias, weight in weights.items() if weight > 0}
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    sequence = []
+    for _ in range(total):
+        for alias, weight in weights.items():
+            current[alias] += weight
+        chosen = max(current, key=current.get)
+        current[chosen] -= total
+        sequence.append(chosen)
+    return sequence
+
+
+class ReplicaRouter:
+    def __init__(self, replicas=None):
+        self.replicas = settings.DATABASE_REPLICAS if replicas is None else replicas
+        sequence = weighted_sequence(self.replicas)
+        # next() on a cycle is atomic, the threads of a worker share it without a lock
+        self._next_replica = cycle(sequence).__next__ if sequence else None
+
+    def db_for_read(self, model, **hints):
+        if self._next_replica is None or model._meta.app_label not in ROUTED_APPS:
+            return None
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self._next_replica()
+
+    def db_for_write(self, model, **hints):
+        if self._next_replica is None or model._meta.app_label not in ROUTED_APPS:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema through replication
+        if db in self.replicas:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Pin the reads of a request to the primary when it writes, or when the
+    visitor wrote within the last ``DATABASE_REPLICA_PIN_SECONDS``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def pinned(request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    @staticmethod
+    def pin_visitor(request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS or not self.pinned(request):
+            return self.get_response(request)
+        with pin_to_primary():
+            response = self.get_response(request)
+        return self.pin_visitor(request, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS or not self.pinned(request):
+            return await self.get_response(request)
+        with pin_to_primary():
+            response = await self.get_response(request)
+        return self.pin_visitor(request, response)
@@ -11,21 +11,32 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 
-from dotenv import load_dotenv
+from btw_app.config import cache_from_url, database_from_url, sqlite_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 # BASE_DIR is the src/ folder
 BASE_DIR = Path(__file__).resolve().parent.parent
 # The project root folder.
 ROOT_DIR = BASE_DIR.parent
-# Load environment variables from .env file (if one is present)
-load_dotenv()
+# Load environment variables from the .env file next to manage.py and the one in the project
+# root (the README's Quickstart creates that one), if present; the first file wins for a variable.
+# python-dotenv is only imported when there is a file to read.
+for env_file in (BASE_DIR / ".env", ROOT_DIR / ".env"):
+    if env_file.is_file():
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
 
 # The author value that will be used in the footer of the application
 AUTHOR = os.getenv("AUTHOR")
 
+# True while running the test suite via `manage.py test`
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
@@ -38,9 +49,11 @@ host_list = os.getenv("ALLOWED_HOSTS", "localhost, 127.0.0.1, 0.0.0.0")
 
 ALLOWED_HOSTS = [x.strip() for x in host_list.split(",")]
 
-print(f"Allowed Hosts: \t\t{ALLOWED_HOSTS}")
-print(f"Author: \t\t{AUTHOR}")
-print(f"Base Directory: \t{BASE_DIR}")
+# Print a summary of the configuration when the settings are loaded, off by default
+if os.getenv("SHOW_SETTINGS", "false") == "true":
+    print(f"Allowed Hosts: \t\t{ALLOWED_HOSTS}")
+    print(f"Author: \t\t{AUTHOR}")
+    print(f"Base Directory: \t{BASE_DIR}")
 
 
 # Application definition
@@ -57,21 +70,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "btw_app.metrics.MetricsMiddleware",
+    "btw_app.instrumentation.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "btw_app.routers.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "products.middleware.FragmentCacheStatsMiddleware",
 ]
 
 ROOT_URLCONF = "btw_app.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # the Django template backend, timed for the Server-Timing header (btw_app.instrumentation)
+        "BACKEND": "btw_app.instrumentation.DjangoTemplates",
+        "NAME": "django",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -89,16 +108,99 @@ TEMPLATES = [
 WSGI_APPLICATION = "btw_app.wsgi.application"
 
 
+# Query budgets and Server-Timing, see btw_app.instrumentation:
+# raise fails the tests of a view over its budget, log warns about it during development
+
+QUERY_BUDGETS = os.getenv("QUERY_BUDGETS", "raise" if TESTING else "log" if DEBUG else "off")
+SERVER_TIMING = os.getenv("SERVER_TIMING", str(DEBUG)).lower() == "true"
+
+
+# Request metrics served at /metrics, see btw_app.metrics: the gunicorn workers
+# share them through files in METRICS_DIR, set by gunicorn.conf.py
+
+METRICS = os.getenv("METRICS", "true") == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+# when set, scrapes must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+# Timing of the functions decorated with btw_app.profiling.profiled, turned on
+# here or at runtime with profiling.enable(); PROFILING_SAMPLE times 1 call in N
+
+PROFILING = os.getenv("PROFILING", "false") == "true"
+PROFILING_SAMPLE = int(os.getenv("PROFILING_SAMPLE", "1"))
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS")) if os.getenv("PROFILING_SLOW_MS") else None
+PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "1000"))
+
+
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# DATABASE_URL selects the database, SQLite next to manage.py by default (see docs/database.md).
+# SQLite connections set the pragmas below, see btw_app.config.sqlite_options.
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///db.sqlite3")
+
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_from_url(
+        DATABASE_URL,
+        base_dir=BASE_DIR,
+        # seconds a connection is kept open and reused by later requests, 0 closes it after every request
+        conn_max_age=int(os.getenv("DATABASE_CONN_MAX_AGE", "60")),
+        sqlite=sqlite_options(
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            busy_timeout=os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+            # 128 MiB of the database file memory mapped, 20 MB page cache per connection
+            mmap_size=os.getenv("SQLITE_MMAP_SIZE", "134217728"),
+            cache_size=os.getenv("SQLITE_CACHE_SIZE", "-20000"),
+            temp_store=os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+            transaction_mode=os.getenv("SQLITE_TRANSACTION_MODE", ""),
+        ),
+    )
 }
 
+# Read replicas: a comma separated list of database URLs, each a copy of the primary kept current by
+# replication, and their weights for the round-robin over them (1 each by default), see btw_app.routers.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+replica_weights = [int(weight) for weight in os.getenv("DATABASE_REPLICA_WEIGHTS", "").split(",") if weight.strip()]
+DATABASE_REPLICAS = {}
+for number, url in enumerate(DATABASE_REPLICA_URLS):
+    alias = f"replica{number + 1}"
+    DATABASES[alias] = database_from_url(
+        url,
+        base_dir=BASE_DIR,
+        conn_max_age=DATABASES["default"]["CONN_MAX_AGE"],
+        sqlite=DATABASES["default"]["OPTIONS"],
+    )
+    # tests read the replicas from the test database of the primary
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS[alias] = replica_weights[number] if number < len(replica_weights) else 1
+# seconds the reads of a visitor stay on the primary after they wrote, longer than the replication lag
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "10"))
+
+DATABASE_ROUTERS = ["btw_app.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Tests run without a shared cache, so pages cached in one test cannot leak into the next one.
+# Otherwise the default is a file cache, shared by all worker processes: the version counters
+# of products.cache must be the same in every worker, or the others serve stale pages and ETags.
+
+CACHE_URL = os.getenv("CACHE_URL", "dummy://" if TESTING else f"file://{Path(tempfile.gettempdir()) / 'btw-cache'}")
+
+CACHES = {
+    "default": cache_from_url(CACHE_URL),
+}
+
+# Seconds a rendered catalog page (product list/detail) is kept in the cache, 0 disables the page cache
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+
+# Serve the catalog pages with the async views of products.async_views, for ASGI servers (see docs/asgi.md)
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false") == "true"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,142 @@
+"""
+Gunicorn configuration for serving btw_app in production.
+
+Gunicorn loads this file automatically when started from the ``src`` folder:
+
+    gunicorn btw_app.wsgi:application
+
+Every setting can be overridden by its environment variable below or on the
+command line. See docs/wsgi.md.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+def cpu_count():
+    """CPUs this process may use, honouring the CPU set and a cgroup v2 CPU quota (``docker run --cpus``)."""
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+    except (OSError, ValueError):
+        return count
+    if quota == "max":
+        return count
+    return max(1, min(count, -(-int(quota) // int(period))))
+
+
+CPUS = cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('APP_PORT', '8000')}"
+
+# Each worker is a process with a few threads: the processes use all CPUs, the
+# threads keep a worker busy while one of its requests waits on the database.
+workers = int(os.getenv("GUNICORN_WORKERS", CPUS * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+# Import Django once in the master, the workers are forked with it loaded.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true") == "true"
+
+# Restart workers after a number of requests to contain slow memory growth, the
+# jitter keeps them from all restarting at the same moment.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Keep connections from a reverse proxy open between requests (needs a threaded worker).
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Workers touch a heartbeat file every second; on tmpfs that never blocks on disk I/O.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Every worker writes its request metrics to a file here, /metrics adds them up (btw_app.metrics).
+# Set before the settings are loaded, so the app sees it; one directory per port and server.
+METRICS_DIR = os.environ.setdefault(
+    "METRICS_DIR",
+    str(Path(worker_tmp_dir or tempfile.gettempdir()) / f"btw-metrics-{bind.rsplit(':', 1)[-1]}"),
+)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def _build_autocomplete_index(log):
+    # built before the first request instead of during it
+    from django.db import DatabaseError
+
+    from products import autocomplete
+
+    try:
+        autocomplete.get_index()
+    except DatabaseError as error:
+        log.warning("Autocomplete index not built (%s), run the migrations first.", error)
+
+
+def _close_connections():
+    from django.db import connections
+
+    connections.close_all()
+    # a PostgreSQL connection pool keeps connections and threads of its own, neither survives a fork
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+
+def _check_cache(server):
+    # the version counters of the page cache (products.cache) would be per worker
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "btw_app.settings")
+    from django.conf import settings
+
+    if server.cfg.workers > 1 and settings.CACHES["default"]["BACKEND"].endswith(".LocMemCache"):
+        server.log.error(
+            "CACHE_URL=%s is not shared by the %d workers, use a file:// or redis:// cache or a single worker.",
+            settings.CACHE_URL,
+            server.cfg.workers,
+        )
+        sys.exit(1)
+
+
+def on_starting(server):
+    from btw_app import metrics
+
+    _check_cache(server)
+    metrics.reset_directory(METRICS_DIR)
+
+
+def when_ready(server):
+    # with preload_app the index is built once in the master and every forked worker inherits it
+    if server.cfg.preload_app:
+        _build_autocomplete_index(server.log)
+        _close_connections()
+
+
+def post_fork(server, worker):
+    # connections must never be shared between processes, the preloaded app may have opened one
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        _build_autocomplete_index(worker.log)
+
+
+def worker_exit(server, worker):
+    from btw_app import metrics
+
+    # the last second of requests, not written yet
+    metrics.registry.flush(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    from btw_app import metrics
+
+    # keeps the totals of replaced workers without a file for every worker that ever ran
+    metrics.mark_process_dead(METRICS_DIR, worker.pid)
@@ -11,8 +11,9 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("name", "category", "price", "average_rating", "rating_count", "created_at")
+    list_display = ("name", "sku", "category", "price", "avg_rating", "rating_count", "created_at")
     list_select_related = ("category",)
+    search_fields = ("name", "sku")
 
 
 @admin.register(Comment)
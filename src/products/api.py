@@ -0,0 +1,250 @@
+"""
+Read-only JSON API of the catalog.
+
+- ``api/products/``: products, cursor paginated like the listing
+  (``?category=``, ``?sort=``, ``?cursor=``, ``?limit=``), or the products
+  with the given ids in one query with ``?ids=1,2,3``
+- ``api/products/<pk>/``: one product
+- ``api/products/<pk>/reviews/``: its reviews, cursor paginated (``?sort=``, ``?cursor=``)
+
+Product endpoints accept ``?fields=name,price`` to return only some fields,
+and only the columns those fields need are loaded. Responses are encoded by
+hand from plain dicts, with ``orjson`` when it is installed, and cached and
+validated like the HTML catalog pages (see ``products.cache``).
+"""
+
+from functools import lru_cache, wraps
+
+from django.http import HttpResponse
+from django.urls import get_script_prefix, reverse
+from django.views.decorators.http import require_GET
+
+from btw_app.instrumentation import query_budget
+
+from .cache import cache_catalog_page, catalog_etag
+from .models import Comment, Product
+from .pagination import InvalidCursor, paginate
+from .views import (
+    DEFAULT_PRODUCT_SORT,
+    DEFAULT_REVIEW_SORT,
+    PRODUCT_SORTS,
+    REVIEW_SORTS,
+    REVIEWS_PER_PAGE,
+    review_data,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+    import json
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+MAX_IDS = 100
+
+
+def _histogram(product):
+    return {str(stars): getattr(product, f"ratings_{stars}") for stars in range(5, 0, -1)}
+
+
+@lru_cache(maxsize=8)
+def _detail_url_template(script_prefix):
+    # reverse() costs more than serializing the rest of a product, so it runs once per script prefix
+    return reverse("product_detail", args=["SLUG", 0]).replace("/SLUG/0/", "/{}/{}/")
+
+
+def _url(product):
+    if not product.category_id:
+        return None
+    return _detail_url_template(get_script_prefix()).format(product.category.slug, product.pk)
+
+
+# field -> (columns it needs loaded, how to get its value from a product)
+PRODUCT_FIELDS = {
+    "id": (["id"], lambda p: p.pk),
+    "sku": (["sku"], lambda p: p.sku),
+    "name": (["name"], lambda p: p.name),
+    "category": (["category__slug"], lambda p: p.category.slug if p.category_id else None),
+    "price": (["price"], lambda p: str(p.price)),
+    "description": (["description"], lambda p: p.description),
+    "image": (["image"], lambda p: p.image.name or None),
+    "url": (["category__slug"], _url),
+    "avg_rating": (["avg_rating"], lambda p: round(p.avg_rating, 2)),
+    "rating_count": (["rating_count"], lambda p: p.rating_count),
+    "rating_histogram": ([f"ratings_{stars}" for stars in range(1, 6)], _histogram),
+    "created_at": (["created_at"], lambda p: p.created_at.isoformat()),
+    "updated_at": (["updated_at"], lambda p: p.updated_at.isoformat()),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+def api_view(view):
+    """Allow only GET/HEAD and turn an :class:`ApiError` into a JSON error response."""
+
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return json_response({"error": str(error)}, status=error.status)
+
+    return wrapper
+
+
+def requested_fields(request):
+    """The field names in ``?fields=``, all fields without it."""
+    value = request.GET.get("fields")
+    if not value:
+        return list(PRODUCT_FIELDS)
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown or not names:
+        raise ApiError(f"Unknown fields: {', '.join(unknown) or value}. Choose from {', '.join(PRODUCT_FIELDS)}.")
+    return names
+
+
+def product_queryset(fields, *extra_columns):
+    """Products with only the columns of ``fields`` (and ``extra_columns``) loaded."""
+    columns = {"id", *extra_columns}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    products = Product.objects.all()
+    if any("__" in column for column in columns):
+        products = products.select_related("category")
+    return products.only(*columns)
+
+
+def serialize(product, fields):
+    return {name: PRODUCT_FIELDS[name][1](product) for name in fields}
+
+
+def _page_url(request, cursor):
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _parse_ids(value):
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in value.split(",") if pk.strip()))
+    except ValueError as error:
+        raise ApiError("ids must be a comma separated list of numbers.") from error
+    if not ids or len(ids) > MAX_IDS:
+        raise ApiError(f"Pass between 1 and {MAX_IDS} ids.")
+    return ids
+
+
+def _list_versions(request):
+    category = request.GET.get("category")
+    return ["categories", f"category:{category}" if category and not request.GET.get("ids") else "catalog"]
+
+
+@query_budget(3)
+@api_view
+@catalog_etag(_list_versions)
+@cache_catalog_page(_list_versions)
+def product_list(request):
+    """A page of products, or the products in ``?ids=`` in the order they were asked for."""
+    fields = requested_fields(request)
+
+    if ids := request.GET.get("ids"):
+        ids = _parse_ids(ids)
+        products = {product.pk: product for product in product_queryset(fields).filter(pk__in=ids)}
+        return json_response(
+            {
+                "results": [serialize(products[pk], fields) for pk in ids if pk in products],
+                "missing": [pk for pk in ids if pk not in products],
+            }
+        )
+
+    sort = request.GET.get("sort", DEFAULT_PRODUCT_SORT)
+    if sort not in PRODUCT_SORTS:
+        raise ApiError(f"Unknown sort, choose from {', '.join(PRODUCT_SORTS)}.")
+    try:
+        limit = min(max(int(request.GET.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError as error:
+        raise ApiError("limit must be a number.") from error
+
+    ordering = PRODUCT_SORTS[sort]
+    products = product_queryset(fields, *(column.lstrip("-") for column in ordering))
+    if category := request.GET.get("category"):
+        products = products.filter(category__slug=category)
+    try:
+        page = paginate(products, ordering, request.GET.get("cursor"), limit)
+    except InvalidCursor as error:
+        raise ApiError(str(error)) from error
+    return json_response(
+        {
+            "results": [serialize(product, fields) for product in page],
+            "next": _page_url(request, page.next_cursor),
+            "previous": _page_url(request, page.previous_cursor),
+        }
+    )
+
+
+def _detail_versions(request, pk):
+    # the category slug and URL change with a renamed category
+    return [f"product:{pk}", "categories"]
+
+
+@query_budget(3)
+@api_view
+@catalog_etag(_detail_versions)
+@cache_catalog_page(_detail_versions)
+def product_detail(request, pk):
+    fields = requested_fields(request)
+    product = product_queryset(fields).filter(pk=pk).first()
+    if product is None:
+        raise ApiError("Product not found.", status=404)
+    return json_response(serialize(product, fields))
+
+
+def _reviews_versions(request, pk):
+    return [f"product:{pk}"]
+
+
+@query_budget(4)
+@api_view
+@catalog_etag(_reviews_versions)
+@cache_catalog_page(_reviews_versions)
+def product_reviews(request, pk):
+    if not Product.objects.filter(pk=pk).exists():
+        raise ApiError("Product not found.", status=404)
+    sort = request.GET.get("sort", DEFAULT_REVIEW_SORT)
+    if sort not in REVIEW_SORTS:
+        raise ApiError(f"Unknown sort, choose from {', '.join(REVIEW_SORTS)}.")
+    try:
+        page = paginate(
+            Comment.objects.filter(product_id=pk).select_related("user"),
+            REVIEW_SORTS[sort],
+            request.GET.get("cursor"),
+            REVIEWS_PER_PAGE,
+        )
+    except InvalidCursor as error:
+        raise ApiError(str(error)) from error
+    return json_response(
+        {
+            "results": [review_data(comment) for comment in page],
+            "next": _page_url(request, page.next_cursor),
+            "previous": _page_url(request, page.previous_cursor),
+        }
+    )
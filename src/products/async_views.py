@@ -0,0 +1,180 @@
+"""
+Async versions of the catalog read views, for ASGI servers.
+
+They render the same templates as ``products.views`` but query the database
+with the async ORM, and start the independent queries of a page together
+with ``asyncio.gather``. ``products.urls`` routes the catalog pages to them
+when the ``ASYNC_VIEWS`` setting is on.
+
+Django runs async ORM calls in a single shared thread, so the gathered queries
+still execute one after another; what is saved is the thread hop per request
+that a sync view costs under ASGI, and the waiting is done on the event loop
+instead of in a worker thread. Comment submissions (POST) are handed to the
+sync detail view, transactions are not available in async code.
+"""
+
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Subquery
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.http import require_GET
+
+from btw_app.instrumentation import query_budget
+
+from . import feeds, views
+from .cache import cache_catalog_page, catalog_etag
+from .forms import CommentForm
+from .models import Category, Product
+from .pagination import InvalidCursor, apaginate
+from .related import ranking, related_to
+from .views import (
+    DEFAULT_PRODUCT_SORT,
+    DEFAULT_REVIEW_SORT,
+    PRODUCT_SORTS,
+    PRODUCTS_PER_PAGE,
+    REVIEW_SORTS,
+    REVIEWS_PER_PAGE,
+)
+
+
+def load_request(view):
+    """
+    Load the session and the user of the request asynchronously before
+    ``view`` runs, so the cache validators, messages and context processors
+    that read them synchronously do not query the database on the event loop.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # reading the keys fills the session cache
+        await request.session.akeys()
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _product_page(products, ordering, cursor):
+    try:
+        return await apaginate(products, ordering, cursor, PRODUCTS_PER_PAGE)
+    except InvalidCursor:
+        return await apaginate(products, ordering, None, PRODUCTS_PER_PAGE)
+
+
+@query_budget(6)
+@load_request
+@catalog_etag(views._list_versions)
+@cache_catalog_page(views._list_versions)
+async def product_list(request, category_slug=None):
+    products = Product.objects.select_related("category")
+    if category_slug:
+        products = products.filter(category__slug=category_slug)
+
+    sort = request.GET.get("sort", DEFAULT_PRODUCT_SORT)
+    if sort not in PRODUCT_SORTS:
+        sort = DEFAULT_PRODUCT_SORT
+
+    categories, page = await asyncio.gather(
+        _list(Category.objects.all()), _product_page(products, PRODUCT_SORTS[sort], request.GET.get("cursor"))
+    )
+
+    return render(
+        request,
+        "products.html",
+        {
+            "categories": categories,
+            "products": page.object_list,
+            "page": page,
+            "sort": sort,
+            "sort_options": PRODUCT_SORTS.keys(),
+        },
+    )
+
+
+async def _existing_comment(pk, user):
+    if not user.is_authenticated:
+        return None
+    return await Product(pk=pk).comments.filter(user=user).afirst()
+
+
+@catalog_etag(views._detail_versions)
+@cache_catalog_page(views._detail_versions)
+async def _detail_page(request, category_slug, pk):
+    product, ranking_rows, reviews, existing = await asyncio.gather(
+        aget_object_or_404(Product.objects.select_related("category"), pk=pk, category__slug=category_slug),
+        # the ranking of the product's category, in the same round trip as the product
+        _list(ranking(Subquery(Product.objects.filter(pk=pk).values("category_id")[:1]))),
+        apaginate(
+            Product(pk=pk).comments.select_related("user"),
+            REVIEW_SORTS[DEFAULT_REVIEW_SORT],
+            page_size=REVIEWS_PER_PAGE,
+        ),
+        _existing_comment(pk, request.user),
+    )
+    # Pre-fill form for authenticated user with existing comment (if any)
+    form = CommentForm(initial={"rating": existing.rating, "text": existing.text} if existing else {})
+
+    return render(
+        request,
+        "product.html",
+        {
+            "product": product,
+            "comments": reviews.object_list,
+            "next_reviews_url": views._reviews_url(product, DEFAULT_REVIEW_SORT, reviews.next_cursor),
+            "review_sort_options": REVIEW_SORTS.keys(),
+            "related_products": related_to(product.pk, ranking_rows),
+            "form": form,
+        },
+    )
+
+
+@query_budget(6, post=20)
+@load_request
+async def product_detail(request, category_slug, pk):
+    if request.method == "POST":
+        return await sync_to_async(views.product_detail)(request, category_slug, pk)
+    return await _detail_page(request, category_slug, pk)
+
+
+@query_budget(4)
+@load_request
+@catalog_etag(views._reviews_versions)
+@cache_catalog_page(views._reviews_versions)
+async def product_reviews(request, category_slug, pk):
+    """Async version of :func:`products.views.product_reviews`."""
+    sort = request.GET.get("sort", DEFAULT_REVIEW_SORT)
+    if sort not in REVIEW_SORTS:
+        sort = DEFAULT_REVIEW_SORT
+    try:
+        product, page = await asyncio.gather(
+            aget_object_or_404(Product.objects.select_related("category"), pk=pk, category__slug=category_slug),
+            apaginate(
+                Product(pk=pk).comments.select_related("user"),
+                REVIEW_SORTS[sort],
+                request.GET.get("cursor"),
+                REVIEWS_PER_PAGE,
+            ),
+        )
+    except InvalidCursor as err:
+        return JsonResponse({"error": str(err)}, status=400)
+    next_url = views._reviews_url(product, sort, page.next_cursor)
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({"reviews": [views.review_data(c) for c in page], "next": next_url})
+    return render(request, "_reviews.html", {"reviews": page.object_list, "next_url": next_url})
+
+
+@require_GET
+async def product_feed(request, fmt):
+    """Async version of :func:`products.views.product_feed`, streamed from an async iterator."""
+    products = views.feed_products(request)
+    if products is None:
+        return HttpResponseBadRequest("since must be an ISO 8601 timestamp.")
+    return views.feed_response(feeds.astream(products, fmt), fmt)
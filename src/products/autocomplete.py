@@ -0,0 +1,137 @@
+"""
+In-process prefix index for the navbar type-ahead.
+
+Product and category names are kept in a sorted list of normalized keys, so a
+lookup is a ``bisect`` plus a short scan and never touches the database. Each
+name is indexed once per word, which lets "kit" find "kids-kitchen-le-chef".
+
+The index is built on first use in every worker process. Product and category
+writes call :func:`invalidate`, which marks the local copy stale and bumps a
+generation counter in the default cache so other workers sharing that cache
+rebuild as well; without a shared cache they catch up after ``MAX_AGE``.
+"""
+
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from functools import cached_property
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Category, Product
+
+GENERATION_KEY = "products:autocomplete:generation"
+# how often (seconds) the shared generation counter is consulted
+CHECK_INTERVAL = 1.0
+# upper bound (seconds) for how long an index is served without a rebuild
+MAX_AGE = 300.0
+
+_SEPARATORS_RE = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return _SEPARATORS_RE.sub(" ", text.lower()).strip()
+
+
+class PrefixIndex:
+    """Sorted array of ``(key, entry)`` pairs searched with :func:`bisect.bisect_left`."""
+
+    def __init__(self, entries):
+        # entries are (kind, pk, category_slug, label) tuples
+        self.entries = entries
+        pairs = []
+        for position, (_, _, _, label) in enumerate(entries):
+            words = normalize(label).split()
+            for i in range(len(words)):
+                pairs.append((" ".join(words[i:]), position))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+        self.built_at = time.monotonic()
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(results) < limit and self.keys[i].startswith(prefix):
+            position = self.positions[i]
+            if position not in seen:
+                seen.add(position)
+                results.append(self.entries[position])
+            i += 1
+        return results
+
+    @property
+    def age(self):
+        return time.monotonic() - self.built_at
+
+    @cached_property
+    def memory_footprint(self):
+        """Approximate size of the index in bytes, computed once per index."""
+        size = sys.getsizeof(self.keys) + sys.getsizeof(self.positions) + sys.getsizeof(self.entries)
+        size += sum(sys.getsizeof(key) for key in self.keys)
+        for entry in self.entries:
+            size += sys.getsizeof(entry) + sum(sys.getsizeof(field) for field in entry)
+        # small ints are shared singletons, positions beyond that are separate objects
+        size += sum(sys.getsizeof(position) for position in self.positions if position > 256)
+        return size
+
+
+def build_index():
+    entries = [("category", pk, slug, name) for pk, slug, name in Category.objects.values_list("pk", "slug", "name")]
+    entries += [
+        ("product", pk, slug, name)
+        for pk, slug, name in Product.objects.filter(category__isnull=False).values_list("pk", "category__slug", "name")
+    ]
+    return PrefixIndex(entries)
+
+
+class _State:
+    index = None
+    generation = None
+    checked_at = 0.0
+    stale = True
+    lock = threading.Lock()
+
+
+def get_index():
+    now = time.monotonic()
+    state = _State
+    if state.index is not None and not state.stale and now - state.checked_at < CHECK_INTERVAL:
+        return state.index
+
+    generation = cache.get(GENERATION_KEY, 0)
+    state.checked_at = now
+    if state.index is None or state.stale or generation != state.generation or state.index.age > MAX_AGE:
+        # only one thread rebuilds, the others keep answering from the previous index
+        if state.lock.acquire(blocking=state.index is None):
+            try:
+                # cleared before building so an invalidation during the build is not lost
+                state.stale = False
+                state.index, state.generation = build_index(), generation
+            except Exception:
+                state.stale = True
+                raise
+            finally:
+                state.lock.release()
+    return state.index
+
+
+def invalidate():
+    _State.stale = True
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def suggestion_url(entry):
+    kind, pk, slug, _ = entry
+    if kind == "category":
+        return reverse("products_by_category", args=[slug])
+    return reverse("product_detail", args=[slug, pk])
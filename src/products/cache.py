@@ -0,0 +1,219 @@
+"""
+Response caching for the catalog pages.
+
+Cached pages are stored under keys that contain the current value of every
+version counter the page depends on:
+
+- ``catalog``: anything shown on the unfiltered product list
+- ``categories``: the category navigation
+- ``category:<slug>``: the products (and their ratings) of one category
+- ``product:<pk>``: one product and its reviews
+
+Writes bump the affected counters (see ``products.signals``), which makes the
+old entries unreachable; they then simply expire. Nothing is ever deleted and
+the cache is never flushed as a whole.
+
+With read replicas (``btw_app.routers``) a page rendered from a lagging
+replica right after a write would be cached under the new versions, stale
+until ``CATALOG_CACHE_TIMEOUT``. So a bump also marks the counter as recently
+bumped for ``DATABASE_REPLICA_PIN_SECONDS``, and pages depending on a marked
+counter are rendered from the primary on a cache miss.
+
+The same counters double as HTTP validators: :func:`catalog_etag` derives an
+ETag from them, so revalidation requests are answered with ``304 Not
+Modified`` from a single cache lookup, without touching the database or the
+templates. With more than one worker process this needs a cache shared by all
+workers (file, the default, or Redis); otherwise a write bumps the counters of
+one worker only and the others keep serving stale pages and ETags, so
+``gunicorn.conf.py`` refuses to start several workers on a memory cache.
+
+Whether a page came from the cache is noted in ``request.page_cache_hit``
+for the metrics (``btw_app.metrics``); it is not set for pages that are not
+cached at all.
+
+Pages that show flash messages are never cached. Pages that contain a CSRF
+token are not cached for logged-in users; for anonymous visitors they are
+cached per CSRF cookie, because the embedded token is only valid together with
+the cookie it was derived from.
+"""
+
+import hashlib
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from btw_app.routers import pin_to_primary
+
+PAGE_PREFIX = "products:page:"
+VERSION_PREFIX = "products:version:"
+# set for DATABASE_REPLICA_PIN_SECONDS when a counter is bumped
+BUMPED_PREFIX = "products:bumped:"
+# stored in place of a page that has to be looked up per CSRF cookie
+CSRF_VARIANT = "csrf-variant"
+
+
+def _initial_version():
+    # counters that were evicted restart at an unused value, so old page keys never become valid again
+    return time.time_ns()
+
+
+def get_versions(names):
+    keys = [VERSION_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    for key, value in missing.items():
+        if not cache.add(key, value, timeout=None):
+            missing[key] = cache.get(key, value)
+    found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_versions(*names):
+    if settings.DATABASE_REPLICAS and settings.DATABASE_REPLICA_PIN_SECONDS:
+        # marked first, so a page rendered for the new versions always sees the mark
+        cache.set_many(
+            dict.fromkeys((BUMPED_PREFIX + name for name in names), 1), settings.DATABASE_REPLICA_PIN_SECONDS
+        )
+    for name in names:
+        key = VERSION_PREFIX + name
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def _request_versions(request, names):
+    # the ETag and the page cache of one request look up the same counters
+    memo = request.__dict__.setdefault("_catalog_versions", {})
+    key = tuple(names)
+    if key not in memo:
+        memo[key] = get_versions(names)
+    return memo[key]
+
+
+def _auth_state(request):
+    user = getattr(request, "user", None)
+    return f"user:{user.pk}" if user is not None and user.is_authenticated else "anonymous"
+
+
+def page_key(request, versions):
+    parts = [request.method, request.get_full_path(), _auth_state(request), *map(str, versions)]
+    return PAGE_PREFIX + hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _csrf_variant_key(key, request):
+    secret = request.META.get("CSRF_COOKIE")
+    return f"{key}:{hashlib.sha256(secret.encode()).hexdigest()}" if secret else None
+
+
+def _cached_response(request, key):
+    response = cache.get(key)
+    if response == CSRF_VARIANT:
+        variant_key = _csrf_variant_key(key, request)
+        response = cache.get(variant_key) if variant_key else None
+    return response
+
+
+def _store_response(request, key, response, timeout):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return
+    if hasattr(response, "render"):
+        response.render()
+
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        # the page embeds a CSRF token, only reusable for the cookie it came with
+        if request.user.is_authenticated or settings.CSRF_COOKIE_NAME not in request.COOKIES:
+            return
+        cache.set(key, CSRF_VARIANT, timeout)
+        cache.set(_csrf_variant_key(key, request), response, timeout)
+    else:
+        cache.set(key, response, timeout)
+
+
+def _page_cache_key(request, versions, args, kwargs):
+    """The cache key of the page and its counter names, or ``(None, None)`` if it must not be cached."""
+    if not settings.CATALOG_CACHE_TIMEOUT or request.method not in ("GET", "HEAD"):
+        return None, None
+    if len(messages.get_messages(request)):
+        return None, None
+    names = versions(request, *args, **kwargs)
+    return page_key(request, _request_versions(request, names)), names
+
+
+def _miss_reads(names):
+    """Where a cache miss of a page depending on ``names`` reads from, see the module docstring."""
+    if settings.DATABASE_REPLICAS and cache.get_many([BUMPED_PREFIX + name for name in names]):
+        return pin_to_primary()
+    return nullcontext()
+
+
+def cache_catalog_page(versions):
+    """
+    Cache the decorated view's GET responses for ``CATALOG_CACHE_TIMEOUT``
+    seconds. ``versions`` is called with the view arguments and returns the
+    names of the version counters the page depends on. Async views are
+    supported; the cache is read and written the same way, on the event loop.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, names = _page_cache_key(request, versions, args, kwargs)
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                response = _cached_response(request, key)
+                request.page_cache_hit = response is not None
+                if response is None:
+                    with _miss_reads(names):
+                        response = await view(request, *args, **kwargs)
+                    _store_response(request, key, response, settings.CATALOG_CACHE_TIMEOUT)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, names = _page_cache_key(request, versions, args, kwargs)
+            if key is None:
+                return view(request, *args, **kwargs)
+            response = _cached_response(request, key)
+            request.page_cache_hit = response is not None
+            if response is None:
+                with _miss_reads(names):
+                    response = view(request, *args, **kwargs)
+                _store_response(request, key, response, settings.CATALOG_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def catalog_etag(versions):
+    """
+    Answer conditional GETs of the decorated view with an ETag built from the
+    version counters returned by ``versions`` (called like the view). Pages
+    with pending flash messages get no ETag, so they are always rendered.
+    """
+
+    def etag(request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            return None
+        parts = [
+            request.get_full_path(),
+            _auth_state(request),
+            # pages may embed a CSRF token derived from the cookie
+            request.META.get("CSRF_COOKIE", ""),
+            *map(str, _request_versions(request, versions(request, *args, **kwargs))),
+        ]
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:32]
+
+    return condition(etag_func=etag)
@@ -0,0 +1,181 @@
+"""
+Streaming import and export of the product catalog as CSV or JSON lines.
+
+Files hold one product per row with the columns in ``FIELDS``. Products are
+matched by ``sku`` and categories by slug. Rows are read, compared and written
+one batch at a time, so files of any size are handled in constant memory.
+
+``bulk_create()`` bypasses the model signals, so :func:`import_rows` brings the
+search index, the related products and the page cache up to date itself.
+"""
+
+import csv
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from . import autocomplete, related
+from .cache import bump_versions
+from .forms import CatalogRowForm
+from .models import Category, Product
+from .search import get_search_engine
+
+FIELDS = ["sku", "name", "category", "price", "description", "image"]
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+# columns an import overwrites (``category`` is compared and written as ``category_id``)
+UPDATE_FIELDS = ["name", "category_id", "price", "description", "image"]
+# rejected rows an ImportReport keeps the message of
+ERRORS_SIZE = 20
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    for suffix, detected in FORMATS.items():
+        if str(path).endswith(suffix):
+            return detected
+    raise ValueError(f"Cannot tell the format of {path!r}, pass it explicitly.")
+
+
+def read_rows(file, fmt):
+    """Yield ``(line_number, row)`` for every row of ``file``; a JSON line that is not an object yields ``None``."""
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def write_rows(file, fmt, rows):
+    if fmt == "csv":
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def export_rows(products, chunk_size=2000):
+    """Rows of the products in ``products``, fetched ``chunk_size`` at a time."""
+    columns = products.values_list("sku", "name", "category__slug", "price", "description", "image")
+    for values in columns.iterator(chunk_size=chunk_size):
+        yield {name: "" if value is None else str(value) for name, value in zip(FIELDS, values)}
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    # ``(line number, message)`` of the first ``ERRORS_SIZE`` rejected rows
+    errors: list = field(default_factory=list)
+
+    def reject(self, number, message):
+        self.rejected += 1
+        if len(self.errors) < ERRORS_SIZE:
+            self.errors.append((number, message))
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _clean_batch(batch, categories, report):
+    """Validate a batch of rows and return their values by SKU; a later row for a SKU replaces an earlier one."""
+    cleaned = {}
+    for number, row in batch:
+        if row is None:
+            report.reject(number, "not a JSON object")
+            continue
+        form = CatalogRowForm(row)
+        if not form.is_valid():
+            messages = "; ".join(f"{name}: {' '.join(errors)}" for name, errors in form.errors.items())
+            report.reject(number, messages)
+            continue
+        data = form.cleaned_data
+        if data["category"] not in categories:
+            report.reject(number, f"category: unknown slug {data['category']!r}")
+            continue
+        cleaned[data["sku"]] = {
+            "name": data["name"],
+            "category_id": categories[data["category"]],
+            "price": data["price"],
+            "description": data["description"],
+            "image": data["image"],
+        }
+    return cleaned
+
+
+def import_rows(rows, batch_size=1000, write=True, on_change=None):
+    """
+    Upsert the products in ``rows`` (as yielded by :func:`read_rows`) and
+    return an :class:`ImportReport`. Nothing is written if ``write`` is false.
+
+    ``on_change(sku, changes)`` is called for every product that is created
+    (``changes`` is ``None``) or changed (a list of ``(field, old, new)``).
+    """
+    categories = dict(Category.objects.values_list("slug", "pk"))
+    slugs = {pk: slug for slug, pk in categories.items()}
+    engine = get_search_engine()
+    report = ImportReport()
+    touched_categories = set()
+
+    for batch in _batched(rows, batch_size):
+        cleaned = _clean_batch(batch, categories, report)
+        stored_rows = Product.objects.filter(sku__in=cleaned).values("sku", "image_hash", *UPDATE_FIELDS)
+        stored_by_sku = {stored["sku"]: stored for stored in stored_rows}
+
+        pending = []
+        for sku, values in cleaned.items():
+            stored = stored_by_sku.get(sku)
+            if stored is None:
+                report.created += 1
+                image_hash = ""
+                if on_change:
+                    on_change(sku, None)
+            else:
+                changes = [
+                    (name, stored[name] or "", values[name])
+                    for name in UPDATE_FIELDS
+                    if (stored[name] or "") != values[name]
+                ]
+                if not changes:
+                    report.unchanged += 1
+                    continue
+                report.updated += 1
+                touched_categories.add(stored["category_id"])
+                # derivatives of a replaced image are generated by generate_images, the original is shown until then
+                image_hash = "" if stored["image"] != values["image"] else stored["image_hash"]
+                if on_change:
+                    on_change(sku, [(name.removesuffix("_id"), old, new) for name, old, new in changes])
+            touched_categories.add(values["category_id"])
+            pending.append(Product(sku=sku, image_hash=image_hash, **values))
+
+        if write and pending:
+            Product.objects.bulk_create(
+                pending,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=[*UPDATE_FIELDS, "image_hash", "updated_at"],
+            )
+            for product in pending:
+                engine.index(product)
+
+    if write and touched_categories:
+        related.rebuild(touched_categories)
+        autocomplete.invalidate()
+        # detail pages depend on their category's version as well
+        bump_versions("catalog", *(f"category:{slugs[pk]}" for pk in touched_categories if pk in slugs))
+    return report
@@ -0,0 +1,142 @@
+"""
+Product feeds for partners, streamed as JSON lines or CSV.
+
+A feed holds one row per product with its price and rating aggregates. Rows are
+read with a server-side chunked ``iterator()`` and encoded one at a time, so a
+feed of any size is served in constant memory. ``?since=`` limits a feed to the
+products changed at or after a timestamp; partners pass the largest
+``updated_at`` of their last pull to fetch only what changed (a product updated
+at exactly that moment is sent again). A new, changed or deleted rating
+counts as a change of its product.
+"""
+
+import csv
+import json
+
+from django.urls import reverse
+
+FEED_FIELDS = [
+    "id",
+    "sku",
+    "name",
+    "category",
+    "price",
+    "description",
+    "image",
+    "url",
+    "avg_rating",
+    "rating_count",
+    "updated_at",
+]
+FEED_CHUNK_SIZE = 2000
+# lines are joined into blocks of about this many characters, one write per line would dominate the serving time
+BLOCK_SIZE = 64 * 1024
+# backed by the (updated_at, id) index on Product
+FEED_ORDERING = ("updated_at", "id")
+CONTENT_TYPES = {"jsonl": "application/x-ndjson; charset=utf-8", "csv": "text/csv; charset=utf-8"}
+
+
+def _columns(products, named=False):
+    return products.order_by(*FEED_ORDERING).values_list(
+        "id",
+        "sku",
+        "name",
+        "category__slug",
+        "price",
+        "description",
+        "image",
+        "avg_rating",
+        "rating_count",
+        "updated_at",
+        named=named,
+    )
+
+
+def _url_pattern():
+    # resolved once, reverse() per row would cost more than encoding it
+    return reverse("product_detail", args=["category", 0]).removesuffix("category/0/")
+
+
+def _row(url_pattern, values):
+    pk, sku, name, slug, price, description, image, avg_rating, rating_count, updated_at = values
+    return {
+        "id": pk,
+        "sku": sku or "",
+        "name": name,
+        "category": slug or "",
+        "price": str(price),
+        "description": description or "",
+        "image": image or "",
+        "url": f"{url_pattern}{slug}/{pk}/" if slug else "",
+        "avg_rating": round(avg_rating, 2),
+        "rating_count": rating_count,
+        "updated_at": updated_at.isoformat(),
+    }
+
+
+def feed_rows(products, chunk_size=FEED_CHUNK_SIZE):
+    """Yield one feed row (a dict with the keys in ``FEED_FIELDS``) per product."""
+    url_pattern = _url_pattern()
+    for values in _columns(products).iterator(chunk_size=chunk_size):
+        yield _row(url_pattern, values)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    """A file-like object for ``csv.writer`` that hands the encoded line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header=True):
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(FEED_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[name] for name in FEED_FIELDS])
+
+
+ENCODERS = {"jsonl": jsonl_lines, "csv": csv_lines}
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    block, length = [], 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(block)
+            block, length = [], 0
+    if block:
+        yield "".join(block)
+
+
+def stream(products, fmt, chunk_size=FEED_CHUNK_SIZE):
+    """The encoded feed of ``products`` in ``fmt`` ("jsonl" or "csv"), as blocks of text."""
+    return blocks(ENCODERS[fmt](feed_rows(products, chunk_size)))
+
+
+async def astream(products, fmt, chunk_size=FEED_CHUNK_SIZE):
+    """
+    Async version of :func:`stream` for ASGI servers: rows are fetched with
+    ``aiterator()`` and every fetched chunk is encoded into one block.
+    """
+    url_pattern = _url_pattern()
+    chunk, first = [], True
+    # plain values_list() runs its query as soon as it is iterated, which aiterator() does on the event loop
+    async for values in _columns(products, named=True).aiterator(chunk_size=chunk_size):
+        chunk.append(_row(url_pattern, values))
+        if len(chunk) == chunk_size:
+            yield _encode(fmt, chunk, header=first)
+            chunk, first = [], False
+    if chunk or first:
+        yield _encode(fmt, chunk, header=first)
+
+
+def _encode(fmt, rows, header):
+    return "".join(csv_lines(rows, header) if fmt == "csv" else jsonl_lines(rows))
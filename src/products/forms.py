@@ -20,3 +20,22 @@ class CommentForm(forms.ModelForm):
         if not user and not data.get("guest_email"):
             self.add_error("guest_email", "Required for guest.")
         return data
+
+
+class CatalogRowForm(forms.Form):
+    """One row of a catalog import, see products.catalog."""
+
+    sku = forms.CharField(max_length=64)
+    name = forms.CharField(max_length=80)
+    category = forms.SlugField()
+    price = forms.DecimalField(min_value=0, max_digits=6, decimal_places=2)
+    description = forms.CharField(max_length=250, required=False)
+    image = forms.CharField(max_length=100, required=False)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(max_length=100, required=False)
+    category = forms.SlugField(required=False)
+    min_price = forms.DecimalField(min_value=0, max_digits=6, decimal_places=2, required=False)
+    max_price = forms.DecimalField(min_value=0, max_digits=6, decimal_places=2, required=False)
+    page = forms.IntegerField(min_value=1, max_value=50, required=False)
@@ -0,0 +1,77 @@
+"""
+Cached HTML fragments of the catalog templates.
+
+Product cards look the same on every page that lists the product, so their
+rendered markup is cached under a key made of everything the card shows that
+can change: the product's ``updated_at`` (bumped by every ``save()`` and by
+the rating updates of ``products.ratings``), its category slug and its image
+hash (stored by ``products.images`` without touching ``updated_at``). Stale
+entries are never invalidated, they just stop being asked for and expire.
+
+How many fragments of a request came from the cache is recorded on the request
+and reported in the ``X-Fragment-Cache`` response header by
+:class:`products.middleware.FragmentCacheStatsMiddleware`.
+"""
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+FRAGMENT_PREFIX = "products:fragment:"
+# bump after changing a fragment template, so no old markup is served from a shared cache
+FRAGMENT_VERSION = 2
+# keys change whenever the content does, so entries can live long
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+STATS_HEADER = "X-Fragment-Cache"
+
+
+class FragmentStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self):
+        return f"hits={self.hits} misses={self.misses} rate={self.hit_rate:.2f}"
+
+
+def get_stats(request):
+    return request.__dict__.setdefault("_fragment_stats", FragmentStats())
+
+
+def fragment_key(name, product):
+    slug = product.category.slug if product.category_id else ""
+    parts = [
+        name,
+        product.pk,
+        product.updated_at.timestamp(),
+        slug,
+        product.image_hash,
+    ]
+    return f"{FRAGMENT_PREFIX}{FRAGMENT_VERSION}:" + ":".join(map(str, parts))
+
+
+def render_fragments(name, template_name, products, request=None):
+    """
+    Render ``template_name`` once per product (as ``product``) and return the
+    concatenated markup, taking whatever is cached from a single ``get_many``.
+    """
+    products = list(products)
+    keys = [fragment_key(name, product) for product in products]
+    found = cache.get_many(keys)
+    missing = {}
+    for key, product in zip(keys, products):
+        if key not in found:
+            found[key] = missing[key] = get_template(template_name).render({"product": product})
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+
+    if request is not None:
+        stats = get_stats(request)
+        stats.hits += len(keys) - len(missing)
+        stats.misses += len(missing)
+    return mark_safe("".join(found[key] for key in keys))
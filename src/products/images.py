@@ -0,0 +1,180 @@
+"""
+Resized derivatives of ``Product.image``.
+
+Every product image is rendered once per preset (the sizes the templates
+display it at), at 1x and 2x density, as WebP and JPEG. Derivatives are stored
+in the default storage under a directory named after the content hash of the
+source image, so their URLs never change for the same content and can be cached
+forever, and a replaced image never shows a stale thumbnail.
+
+``Product.image_hash`` records the hash the derivatives of a product were made
+from; templates build the derivative URLs from it without touching the storage
+and fall back to the original image while it is empty. Derivatives are
+generated when a product is saved with a new image (see ``products.signals``)
+and in bulk with ``manage.py generate_images``.
+
+The functions that read and encode images do not touch the database, so they
+can run in worker processes.
+"""
+
+import hashlib
+import io
+from typing import NamedTuple
+
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import Product
+
+DERIVATIVE_DIR = "imgs/derivatives"
+
+
+class Preset(NamedTuple):
+    width: int
+    height: int
+    # the ``sizes`` attribute: how wide the image is displayed
+    sizes: str
+
+
+PRESETS = {
+    "card": Preset(300, 230, "300px"),
+    "related": Preset(320, 180, "(min-width: 992px) 15vw, (min-width: 576px) 30vw, 45vw"),
+    "detail": Preset(400, 400, "400px"),
+}
+DENSITIES = (1, 2)
+# format -> (Pillow format, MIME type, save options), in the order browsers should pick them
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 6}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def derivative_name(image_hash, preset, density, fmt):
+    width, height, _ = PRESETS[preset]
+    return f"{DERIVATIVE_DIR}/{image_hash}/{preset}-{width * density}x{height * density}.{fmt}"
+
+
+def derivative_names(image_hash):
+    return [
+        derivative_name(image_hash, preset, density, fmt)
+        for preset in PRESETS
+        for density in DENSITIES
+        for fmt in FORMATS
+    ]
+
+
+def read_source(name):
+    """
+    Return the bytes of the image ``name``: an upload in the default storage
+    or, for the seeded catalog, a file in the static directories.
+    """
+    if default_storage.exists(name):
+        with default_storage.open(name) as file:
+            return file.read()
+    path = finders.find(name)
+    if path is None:
+        raise FileNotFoundError(name)
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def render_derivatives(data, image_hash):
+    """Encode every derivative of the image ``data``, returned as a ``{name: bytes}`` dict."""
+    # Pillow is imported on first use, most processes never encode an image
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha channel, flatten transparent images onto white
+            source = source.convert("RGBA")
+            background = Image.new("RGB", source.size, "white")
+            background.paste(source, mask=source.getchannel("A"))
+            source = background
+        else:
+            source = source.convert("RGB")
+
+        derivatives = {}
+        for preset, (width, height, _) in PRESETS.items():
+            for density in DENSITIES:
+                resized = ImageOps.fit(source, (width * density, height * density), Image.Resampling.LANCZOS)
+                for fmt, (pil_format, _, options) in FORMATS.items():
+                    buffer = io.BytesIO()
+                    resized.save(buffer, pil_format, **options)
+                    derivatives[derivative_name(image_hash, preset, density, fmt)] = buffer.getvalue()
+    return derivatives
+
+
+def store_derivatives(derivatives, overwrite=False):
+    """
+    Store the ``{name: bytes}`` derivatives. Names are content addressed, so an
+    existing file already has the right content, unless the presets or the
+    encoder changed: ``overwrite`` replaces existing files then.
+    """
+    for name, data in derivatives.items():
+        if default_storage.exists(name):
+            if not overwrite:
+                continue
+            # save() would pick another name instead of replacing the file
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+
+
+def derivatives_exist(image_hash):
+    return all(default_storage.exists(name) for name in derivative_names(image_hash))
+
+
+class Processed(NamedTuple):
+    image_hash: str
+    # None when nothing had to be generated
+    derivatives: dict | None
+    source_bytes: int
+
+
+def process_image(name, known_hash=""):
+    """
+    Read the image ``name`` and encode its derivatives, unless it still has the
+    hash ``known_hash`` and its derivatives are stored already.
+    """
+    data = read_source(name)
+    image_hash = content_hash(data)
+    if image_hash == known_hash and derivatives_exist(image_hash):
+        return Processed(image_hash, None, len(data))
+    return Processed(image_hash, render_derivatives(data, image_hash), len(data))
+
+
+def generate(product):
+    """Generate and store the derivatives of ``product.image`` and record its hash on the product."""
+    image_hash, derivatives, _ = process_image(product.image.name, product.image_hash)
+    if derivatives is not None:
+        store_derivatives(derivatives)
+    if image_hash != product.image_hash:
+        # update() so the derivatives do not trigger another save and its signals
+        Product.objects.filter(pk=product.pk).update(image_hash=image_hash)
+        product.image_hash = image_hash
+    return image_hash
+
+
+def picture_sources(product, preset):
+    """
+    The ``srcset`` of every format of ``preset`` as a list of
+    ``(mime_type, srcset)``, or an empty list if there are no derivatives yet.
+    """
+    if not product.image_hash:
+        return []
+    width = PRESETS[preset].width
+    return [
+        (
+            mime_type,
+            ", ".join(
+                f"{default_storage.url(derivative_name(product.image_hash, preset, density, fmt))} {width * density}w"
+                for density in DENSITIES
+            ),
+        )
+        for fmt, (_, mime_type, _) in FORMATS.items()
+    ]
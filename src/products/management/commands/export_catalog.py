@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from btw_app.profiling import profiled
+from products import catalog
+from products.models import Product
+
+
+class _Unterminated:
+    """Lets the csv/json writers use the command's stdout without it appending newlines."""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def write(self, text):
+        self.wrapper.write(text, ending="")
+
+
+class Command(BaseCommand):
+    help = "Writes the product catalog to a CSV or JSON lines file that import_catalog can read"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file, '-' (the default) writes to stdout.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--category", action="append", default=[], help="Category slug, may be repeated.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched from the database at a time.")
+
+    @profiled
+    def handle(self, *args, path="-", format=None, category=(), chunk_size=2000, **kwargs):
+        if path == "-" and not format:
+            format = "csv"
+        try:
+            fmt = catalog.detect_format(path, format)
+        except ValueError as error:
+            raise CommandError(error)
+
+        products = Product.objects.order_by("pk")
+        if category:
+            products = products.filter(category__slug__in=category)
+        rows = catalog.export_rows(products, chunk_size=chunk_size)
+
+        if path == "-":
+            catalog.write_rows(_Unterminated(self.stdout), fmt, rows)
+            return
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            catalog.write_rows(file, fmt, rows)
+        self.stderr.write(self.style.SUCCESS(f"Exported the catalog to {path}."))
@@ -0,0 +1,143 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from btw_app.profiling import profiled
+from products import images
+from products.cache import bump_versions
+from products.models import Product
+
+
+def _process_chunk(jobs, overwrite=False):
+    """
+    Process ``(pk, name, known_hash)`` jobs in a worker process and return one
+    ``(pk, image_hash, generated, bytes_saved, error)`` tuple per job. Workers
+    store the derivatives themselves, replacing existing files if
+    ``overwrite``; only the database is left to the parent.
+    """
+    results = []
+    for pk, name, known_hash in jobs:
+        try:
+            image_hash, derivatives, source_bytes = images.process_image(name, known_hash)
+        except Exception as error:  # reported by the parent, one broken image must not stop the run
+            results.append((pk, known_hash, False, 0, f"{type(error).__name__}: {error}"))
+            continue
+        if derivatives is None:
+            results.append((pk, image_hash, False, 0, None))
+            continue
+        images.store_derivatives(derivatives, overwrite=overwrite)
+        # a browser loads at most the largest derivative instead of the original
+        saved = max(source_bytes - max(map(len, derivatives.values())), 0)
+        results.append((pk, image_hash, True, saved, None))
+    return results
+
+
+class Progress:
+    """Primary keys of the products done by an interrupted run, appended to a file after every chunk."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self):
+        if not self.path.exists():
+            return set()
+        return {int(pk) for line in self.path.read_text().splitlines() for pk in line.split()}
+
+    def record(self, pks):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as file:
+            file.write(" ".join(map(str, pks)) + "\n")
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class Command(BaseCommand):
+    help = "Generates the resized WebP/JPEG derivatives of every product image in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Worker processes (defaults to the CPU count)."
+        )
+        parser.add_argument("--chunk-size", type=int, default=8, help="Images handed to a worker at a time.")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate images whose hash did not change and replace their stored derivatives, "
+            "e.g. after changing the encoder options of a preset.",
+        )
+        parser.add_argument(
+            "--progress-file",
+            default=Path(settings.MEDIA_ROOT) / images.DERIVATIVE_DIR / ".generate_images.progress",
+            help="Where finished products are recorded, so an interrupted run resumes where it stopped.",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore the progress of an interrupted run.")
+
+    @staticmethod
+    def invalidate_pages(pks):
+        # bulk_update() bypasses the signals, so the cached pages showing these images are invalidated here
+        if pks:
+            rows = Product.objects.filter(pk__in=pks).values_list("pk", "category__slug")
+            bump_versions("catalog", *(name for pk, slug in rows for name in (f"product:{pk}", f"category:{slug}")))
+
+    @profiled
+    def handle(self, *args, workers=None, chunk_size=8, force=False, progress_file=None, restart=False, **kwargs):
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        progress = Progress(progress_file)
+        if restart:
+            progress.clear()
+        done = progress.load()
+        if done:
+            self.stdout.write(f"Resuming, {len(done)} image(s) were finished by an earlier run.")
+
+        products = Product.objects.exclude(Q(image="") | Q(image=None)).exclude(pk__in=done).order_by("pk")
+        jobs = [
+            (pk, name, "" if force else known) for pk, name, known in products.values_list("pk", "image", "image_hash")
+        ]
+        chunks = [jobs[i : i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+        start = time.perf_counter()
+        generated, skipped, failed, processed = [], 0, 0, 0
+        bytes_saved = 0
+        with ProcessPoolExecutor(max_workers=workers or 1, initializer=django.setup) as pool:
+            for future in as_completed([pool.submit(_process_chunk, chunk, force) for chunk in chunks]):
+                results = future.result()
+                changed, finished = [], []
+                for pk, image_hash, is_new, saved, error in results:
+                    if error:
+                        failed += 1
+                        self.stderr.write(self.style.WARNING(f"Product {pk}: {error}"))
+                        continue
+                    finished.append(pk)
+                    if is_new:
+                        generated.append(pk)
+                        changed.append(Product(pk=pk, image_hash=image_hash))
+                        bytes_saved += saved
+                    else:
+                        skipped += 1
+                Product.objects.bulk_update(changed, ["image_hash"])
+                self.invalidate_pages([product.pk for product in changed])
+                # failed images are not recorded, a resumed run retries them
+                progress.record(finished)
+
+                processed += len(results)
+                self.stdout.write(f"[{processed}/{len(jobs)}] {processed / (time.perf_counter() - start):.1f} images/s")
+
+        if not failed:
+            progress.clear()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated derivatives for {len(generated)} image(s), {skipped} unchanged, {failed} failed "
+                f"in {elapsed:.2f}s ({processed / elapsed if elapsed else 0:.1f} images/s), "
+                f"{bytes_saved / 1_000_000:.1f} MB saved per view compared to the originals."
+            )
+        )
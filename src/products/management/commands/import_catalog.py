@@ -0,0 +1,74 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from btw_app.profiling import profiled
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = "Creates or updates products (matched by SKU) from a CSV or JSON lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' reads from stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows compared and written at a time.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+        parser.add_argument("--diff", action="store_true", help="List every change, implies --dry-run.")
+        parser.add_argument(
+            "--partial", action="store_true", help="Import the valid rows even if others are rejected, and succeed."
+        )
+
+    @profiled
+    def handle(self, *args, path, format=None, batch_size=1000, dry_run=False, diff=False, partial=False, **kwargs):
+        try:
+            fmt = catalog.detect_format(path, format)
+        except ValueError as error:
+            raise CommandError(error)
+        write = not (dry_run or diff)
+
+        start = time.perf_counter()
+        file = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            with transaction.atomic():
+                report = catalog.import_rows(
+                    catalog.read_rows(file, fmt),
+                    batch_size=batch_size,
+                    write=write,
+                    on_change=self.print_change if diff else None,
+                )
+                if report.rejected and not partial:
+                    # a file is imported completely or not at all, so it can be fixed and imported again
+                    transaction.set_rollback(True)
+                    write = False
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        elapsed = time.perf_counter() - start
+
+        for number, message in report.errors:
+            self.stderr.write(self.style.WARNING(f"Line {number}: {message}"))
+        if report.rejected > len(report.errors):
+            self.stderr.write(self.style.WARNING(f"... and {report.rejected - len(report.errors)} more."))
+
+        verb = "Imported" if write else "Would import"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report.created} new and {report.updated} changed product(s), "
+                f"{report.unchanged} unchanged, {report.rejected} rejected in {elapsed:.2f}s."
+            )
+        )
+        if report.rejected and not partial:
+            raise CommandError(
+                f"{report.rejected} row(s) were rejected and nothing was imported, "
+                "fix them or import the valid rows with --partial."
+            )
+
+    def print_change(self, sku, changes):
+        if changes is None:
+            self.stdout.write(f"+ {sku}")
+            return
+        for name, old, new in changes:
+            self.stdout.write(f"~ {sku} {name}: {old} -> {new}")
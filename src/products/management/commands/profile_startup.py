@@ -0,0 +1,152 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: times loading the settings, django.setup() with
+# every AppConfig.ready() and the first request, and prints them as JSON.
+CHILD = r"""
+import json, sys, time
+
+started = time.perf_counter()
+from django.apps import config
+
+ready_ms = {}
+create = config.AppConfig.create.__func__
+
+
+def timed_create(cls, entry):
+    app_config = create(cls, entry)
+    ready = app_config.ready
+
+    def timed_ready():
+        start = time.perf_counter()
+        ready()
+        ready_ms[app_config.label] = (time.perf_counter() - start) * 1000
+
+    app_config.ready = timed_ready
+    return app_config
+
+
+config.AppConfig.create = classmethod(timed_create)
+
+import django
+from django.conf import settings
+
+settings.INSTALLED_APPS
+settings_done = time.perf_counter()
+django.setup()
+setup_done = time.perf_counter()
+result = {
+    "settings_ms": (settings_done - started) * 1000,
+    "setup_ms": (setup_done - settings_done) * 1000,
+    "ready_ms": ready_ms,
+}
+if sys.argv[1]:
+    from django.test import Client
+
+    host = next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+    response = Client(raise_request_exception=False).get(sys.argv[1], HTTP_HOST=host)
+    result["status"] = response.status_code
+    result["request_ms"] = (time.perf_counter() - setup_done) * 1000
+result["total_ms"] = (time.perf_counter() - started) * 1000
+print(json.dumps(result))
+"""
+
+
+def parse_importtime(output):
+    """``(module, self_us, cumulative_us)`` of every line ``python -X importtime`` wrote."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the cold start of the app in fresh interpreters, from process start to the first served "
+        "request, and lists the slowest imports and AppConfig.ready() hooks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="/", help="Path of the first request, '' to stop after django.setup().")
+        parser.add_argument("--repeat", type=int, default=5, help="Cold starts to measure, the median is reported.")
+        parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list.")
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            help="Fail if the median cold start takes longer, to catch startup regressions in CI.",
+        )
+
+    def run_child(self, url, *python_options):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE),
+        }
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, *python_options, "-c", CHILD, url],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if process.returncode:
+            raise CommandError(f"The app failed to start:\n{process.stderr}")
+        return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr, elapsed
+
+    def handle(self, *args, url="/", repeat=5, top=15, budget_ms=None, **kwargs):
+        if repeat < 1:
+            raise CommandError("--repeat must be at least 1.")
+        runs = [self.run_child(url) for _ in range(repeat)]
+        results = [result for result, _, _ in runs]
+        cold_start = statistics.median(elapsed for _, _, elapsed in runs)
+
+        def median(key):
+            return statistics.median(result[key] for result in results)
+
+        self.stdout.write(f"Cold start, median of {repeat} run(s):")
+        self.stdout.write(f"  interpreter start  {cold_start - median('total_ms'):8.1f} ms")
+        self.stdout.write(f"  settings           {median('settings_ms'):8.1f} ms")
+        self.stdout.write(f"  django.setup()     {median('setup_ms'):8.1f} ms")
+        if url:
+            self.stdout.write(
+                f"  first request      {median('request_ms'):8.1f} ms  ({url} -> {results[-1]['status']})"
+            )
+        self.stdout.write(f"  total              {cold_start:8.1f} ms")
+
+        self.stdout.write("\nAppConfig.ready():")
+        ready = {
+            label: statistics.median(result["ready_ms"][label] for result in results)
+            for label in results[0]["ready_ms"]
+        }
+        for label, ms in sorted(ready.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {label:<20} {ms:8.1f} ms")
+
+        # a separate run, -X importtime slows the imports down
+        _, output, _ = self.run_child("", "-X", "importtime")
+        imports = parse_importtime(output)
+        packages = {}
+        for module, self_us, _ in imports:
+            package = module.partition(".")[0]
+            packages[package] = packages.get(package, 0) + self_us
+        self.stdout.write(f"\nImport time by package ({len(imports)} modules):")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {package}")
+        self.stdout.write("\nSlowest imports (cumulative / self):")
+        for module, self_us, cumulative_us in sorted(imports, key=lambda row: -row[2])[:top]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms {self_us / 1000:8.1f} ms  {module}")
+
+        if budget_ms is not None:
+            if cold_start > budget_ms:
+                raise CommandError(f"The cold start took {cold_start:.0f} ms, over the budget of {budget_ms:.0f} ms.")
+            self.stdout.write(self.style.SUCCESS(f"\nWithin the budget of {budget_ms:.0f} ms."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from btw_app.profiling import profiled
+from products.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuilds (or with --verify only checks) the rating aggregates and histograms stored on each product"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Report mismatches without writing them.")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows fetched per chunk and written per update."
+        )
+
+    @profiled
+    def handle(self, *args, verify=False, batch_size=1000, **kwargs):
+        with transaction.atomic():
+            report = recompute_ratings(batch_size=batch_size, write=not verify)
+
+        for pk, stored, expected in report.sample:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Product {pk}: stored sum/count/avg {stored[0]}/{stored[1]}/{stored[2]:.2f}, "
+                    f"expected {expected[0]}/{expected[1]}/{expected[2]:.2f}"
+                )
+            )
+        if report.stale > len(report.sample):
+            self.stdout.write(self.style.WARNING(f"... and {report.stale - len(report.sample)} more."))
+
+        if verify and report.stale:
+            raise CommandError(f"{report.stale} product(s) have stale rating aggregates.")
+        if verify:
+            self.stdout.write(self.style.SUCCESS("All product rating aggregates are up to date."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates, {report.stale} product(s) corrected."))
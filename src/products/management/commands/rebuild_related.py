@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from btw_app.profiling import profiled
+from products import related
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the related products ranking of every category (or of the given categories)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--category", action="append", default=[], help="Category slug, may be repeated.")
+
+    @profiled
+    def handle(self, *args, category=(), **kwargs):
+        category_ids = None
+        if category:
+            category_ids = list(Category.objects.filter(slug__in=category).values_list("pk", flat=True))
+        start = time.perf_counter()
+        with transaction.atomic():
+            written = related.rebuild(category_ids)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related products, {written} row(s) changed in {elapsed:.2f}s."))
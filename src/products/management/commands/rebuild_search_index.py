@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from btw_app.profiling import profiled
+from products.search import get_search_engine
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product full text search index from the product table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Database alias to rebuild the index on.")
+
+    @profiled
+    def handle(self, *args, database="default", **kwargs):
+        engine = get_search_engine(database)
+        start = time.perf_counter()
+        with transaction.atomic(using=database):
+            indexed = engine.rebuild()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} products with {type(engine).__name__} in {elapsed:.2f}s.")
+        )
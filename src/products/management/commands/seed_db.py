@@ -1,6 +1,19 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from itertools import accumulate, islice
 
-from products.models import Category, Product
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from products import autocomplete, related
+from products.cache import bump_versions
+from products.models import Category, Comment, Product
+from products.ratings import STARS, recompute_ratings
+from products.search import get_search_engine
 
 categories_list = [("boys", "", "boys"), ("girls", "", "girls"), ("toys", "", "toys"), ("outdoor", "", "outdoor")]
 products = [
@@ -112,65 +125,241 @@ products = [
 ]
 
 
+# generated products are named "<color>-<noun>-<number>" and reuse the images of the fixed catalog
+COLORS = ["blue", "rosa", "green", "yellow", "white", "red", "mint", "grey"]
+NOUNS = ["rattle", "jumpsuit", "pacifier", "kitchen", "dolphin", "ball", "sun-hat", "bottle", "horse", "sword"]
+# share of the products of each quality tier and the cumulative 1-5 star weights of its ratings
+RATING_TIERS = [
+    (0.3, list(accumulate([2, 3, 8, 27, 60]))),
+    (0.4, list(accumulate([4, 6, 15, 40, 35]))),
+    (0.2, list(accumulate([15, 15, 25, 25, 20]))),
+    (0.1, list(accumulate([35, 25, 20, 12, 8]))),
+]
+# popularity of the n-th most commented product is proportional to 1 / n ** POPULARITY_SKEW
+POPULARITY_SKEW = 1.1
+# share of comments written by registered users, the others are guest comments
+USER_COMMENT_SHARE = 0.7
+USERNAME_PREFIX = "seed-user-"
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
 class Command(BaseCommand):
-    help = "Seeds the database with initial category and product data"
+    help = (
+        "Seeds the database with the initial categories and products, "
+        "and optionally with generated users, products and comments for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=0, help="Generated products to add to the catalog.")
+        parser.add_argument("--comments", type=int, default=0, help="Generated comments spread over all products.")
+        parser.add_argument("--users", type=int, default=0, help="Generated users writing the comments.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed generates the same data.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT and transaction.")
+
+    def handle(self, *args, products=0, comments=0, users=0, seed=0, batch_size=5000, **kwargs):
+        if min(products, comments, users) < 0 or batch_size < 1:
+            raise CommandError("Counts must not be negative and --batch-size must be at least 1.")
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        start = time.perf_counter()
 
-    def handle(self, *args, **kwargs):
-        # TODO: create and add categories and product data
         self.stdout.write(self.style.SUCCESS("Beginning to seed the database..."))
+        categories = self.seed_categories()
+        self.seed_catalog(categories)
+        if users:
+            self.generate_users(users)
+        if products:
+            self.generate_products(products, categories)
+        if comments:
+            self.generate_comments(comments)
+        self.rebuild_derived_data()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeding finished in {time.perf_counter() - start:.1f}s."))
+
+    def report(self, what, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"{count} {what} created in {elapsed:.2f}s ({rate:,.0f} rows/s)."))
 
-        created_categories = 0
-
-        # Create categories
-        try:
-            for category in categories_list:
-                # Check if category already exists
-                if Category.objects.filter(name=category[0]).exists():
-                    self.stdout.write(
-                        self.style.WARNING(f"Category '{category[0]}' already exists. Skipping creation.")
-                    )
-                    continue
-                # Create a new category
-                category = Category.objects.create(name=category[0], description=category[1], slug=category[2])
-                created_categories += 1
-                self.stdout.write(self.style.SUCCESS(f"Created category: {category.name}"))
-        except Exception as err:
-            self.stdout.write(self.style.ERROR(f"Error creating category: {err}"))
-
-        self.stdout.write(self.style.SUCCESS(f"{created_categories} Categories created successfully."))
-
-        # Create products
-        created_products = 0
-
-        try:
-            for product in products:
-                # Get the category object, if non-existent abort seeding
-                category = Category.objects.filter(name=product["category"]).first()
-                if not category:
-                    self.stdout.write(
-                        self.style.ERROR(f"Category '{product['category']}' does not exist. Skipping product creation.")
-                    )
-                    continue
-
-                # Check if product already exists
-                if Product.objects.filter(name=product["name"]).exists():
-                    self.stdout.write(
-                        self.style.WARNING(f"Product '{product['name']}' already exists. Skipping creation.")
-                    )
-                    continue
-
-                # Create a new product
-                new_product = Product.objects.create(
-                    category=category,
-                    description=product["description"],
-                    name=product["name"],
-                    price=product["price"],
-                    image=product["image"],
+    def insert(self, model, objects):
+        """bulk_create ``objects`` in batches of one transaction each and return the number of rows."""
+        count = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def insert_rows(self, model, field_names, rows, ignore_conflicts=False):
+        """
+        INSERT generated rows, tuples of the values of ``field_names``, with one
+        ``executemany()`` and transaction per batch and return the number of rows
+        inserted, without the ones skipped by ``ignore_conflicts``.
+        The other fields get their defaults. bulk_create() spends most of its time
+        preparing every single value, which caps it at a few thousand rows per second.
+        """
+        ops = connection.ops
+        given = [model._meta.get_field(name) for name in field_names]
+        defaults = [field for field in model._meta.concrete_fields if field not in given and not field.primary_key]
+        now = timezone.now()
+        constants = tuple(
+            field.get_db_prep_save(
+                (
+                    now
+                    if getattr(field, "auto_now_add", False) or getattr(field, "auto_now", False)
+                    else field.get_default()
+                ),
+                connection,
+            )
+            for field in defaults
+        )
+        fields = given + defaults
+        on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+        sql = " ".join(
+            [
+                ops.insert_statement(on_conflict=on_conflict),
+                ops.quote_name(model._meta.db_table),
+                f"({', '.join(ops.quote_name(field.column) for field in fields)})",
+                f"VALUES ({', '.join(['%s'] * len(fields))})",
+                ops.on_conflict_suffix_sql(fields, on_conflict, None, None),
+            ]
+        )
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, [row + constants for row in batch])
+                # the rows changed by all statements, -1 if the driver cannot tell
+                count += cursor.rowcount if cursor.rowcount >= 0 else len(batch)
+        return count
+
+    def seed_categories(self):
+        """Create the missing fixed categories and return all categories by name."""
+        existing = dict(Category.objects.values_list("name", "pk"))
+        missing = [
+            Category(name=name, description=description, slug=slug)
+            for name, description, slug in categories_list
+            if name not in existing
+        ]
+        for name, _, _ in categories_list:
+            if name in existing:
+                self.stdout.write(self.style.WARNING(f"Category '{name}' already exists. Skipping creation."))
+        self.insert(Category, missing)
+        self.stdout.write(self.style.SUCCESS(f"{len(missing)} Categories created successfully."))
+        return dict(Category.objects.values_list("name", "pk"))
+
+    def seed_catalog(self, categories):
+        existing = set(Product.objects.filter(name__in=[p["name"] for p in products]).values_list("name", flat=True))
+        missing = []
+        for product in products:
+            if product["name"] in existing:
+                self.stdout.write(self.style.WARNING(f"Product '{product['name']}' already exists. Skipping creation."))
+                continue
+            fields = {key: value for key, value in product.items() if key != "category"}
+            # seeded product names are unique, they double as SKUs so an exported catalog can be imported again
+            missing.append(Product(category_id=categories[product["category"]], sku=product["name"], **fields))
+        self.insert(Product, missing)
+        self.stdout.write(self.style.SUCCESS(f"{len(missing)} Products created successfully."))
+
+    def generate_users(self, count):
+        User = get_user_model()
+        started = time.perf_counter()
+        existing = set(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list("username", flat=True))
+        # generated users cannot log in, hashing a password per row would dominate the run time
+        password = make_password(None)
+        rows = (
+            (username, password)
+            for username in (f"{USERNAME_PREFIX}{i:07d}" for i in range(count))
+            if username not in existing
+        )
+        self.report("users", self.insert_rows(User, ["username", "password"], rows), started)
+
+    def generate_products(self, count, categories):
+        started = time.perf_counter()
+        existing = set(Product.objects.values_list("name", flat=True))
+        category_ids = list(categories.values())
+        images = [product["image"] for product in products]
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                name = f"{rng.choice(COLORS)}-{rng.choice(NOUNS)}-{i:07d}"
+                category_id, price, image = (
+                    rng.choice(category_ids),
+                    f"{rng.uniform(0.99, 199.99):.2f}",
+                    rng.choice(images),
                 )
-                created_products += 1
-                self.stdout.write(self.style.SUCCESS(f"Created product: {new_product.name}"))
+                if name not in existing:
+                    yield name, name, category_id, price, image, ""
+
+        fields = ["name", "sku", "category", "price", "image", "description"]
+        self.report("products", self.insert_rows(Product, fields, rows()), started)
+
+    def generate_comments(self, count):
+        started = time.perf_counter()
+        rng = self.rng
+        product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        if not product_ids:
+            raise CommandError("There are no products to comment on.")
+        user_ids = list(
+            get_user_model()
+            .objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by("username")
+            .values_list("pk", flat=True)
+        )
+
+        # every product gets a popularity (Zipf-like, in random order) and a rating tier
+        ranks = list(range(1, len(product_ids) + 1))
+        rng.shuffle(ranks)
+        popularity = [1 / rank**POPULARITY_SKEW for rank in ranks]
+        total = sum(popularity)
+        comment_counts = [int(count * weight / total) for weight in popularity]
+        for index in rng.choices(range(len(product_ids)), weights=popularity, k=count - sum(comment_counts)):
+            comment_counts[index] += 1
+        tier_shares = list(accumulate(share for share, _ in RATING_TIERS))
+        tiers = [
+            RATING_TIERS[i][1] for i in rng.choices(range(len(RATING_TIERS)), cum_weights=tier_shares, k=len(ranks))
+        ]
+
+        def rows():
+            # generated product by product, so the inserts append to the (product, ...) indexes
+            # instead of touching random pages of them
+            number = 0
+            for index, (product_id, comment_count, tier) in enumerate(zip(product_ids, comment_counts, tiers)):
+                # the registered users of a product are consecutive (modulo the user count) from a per-product
+                # offset, so no user rates a product twice
+                offset, users = index * 7919, 0
+                for rating in rng.choices(STARS, cum_weights=tier, k=comment_count):
+                    number += 1
+                    if users < len(user_ids) and rng.random() < USER_COMMENT_SHARE:
+                        users += 1
+                        yield product_id, rating, user_ids[(offset + users) % len(user_ids)], "", ""
+                    else:
+                        yield product_id, rating, None, f"Guest {number}", f"guest{number}@example.com"
 
-            self.stdout.write(self.style.SUCCESS(f"{created_products} Products created successfully."))
+        fields = ["product", "rating", "user", "guest_name", "guest_email"]
+        # a re-run with the same seed produces the same user/product pairs, those are skipped
+        self.report("comments", self.insert_rows(Comment, fields, rows(), ignore_conflicts=True), started)
 
-        except Exception as err:
-            self.stdout.write(self.style.ERROR(f"Error creating products: {err}"))
+    def rebuild_derived_data(self):
+        """bulk_create() skips the signals, so everything they maintain is rebuilt in one pass each."""
+        started = time.perf_counter()
+        with transaction.atomic():
+            recompute_ratings(batch_size=self.batch_size)
+            indexed = get_search_engine().rebuild()
+            related.rebuild()
+        autocomplete.invalidate()
+        bump_versions(
+            "catalog", "categories", *(f"category:{slug}" for slug in Category.objects.values_list("slug", flat=True))
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt ratings, search index ({indexed} products) and related products "
+                f"in {time.perf_counter() - started:.2f}s."
+            )
+        )
+        self.stdout.write("Run 'manage.py generate_images' to create the resized product images.")
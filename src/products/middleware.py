@@ -0,0 +1,30 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .fragments import STATS_HEADER
+
+
+class FragmentCacheStatsMiddleware:
+    """Report the fragment cache hits and misses of a request in a response header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_header(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_header(request, await self.get_response(request))
+
+    @staticmethod
+    def add_header(request, response):
+        stats = getattr(request, "_fragment_stats", None)
+        if stats is not None:
+            response[STATS_HEADER] = str(stats)
+        return response
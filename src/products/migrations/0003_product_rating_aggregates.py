@@ -0,0 +1,56 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:52
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Comment = apps.get_model("products", "Comment")
+    Product = apps.get_model("products", "Product")
+    rows = Comment.objects.order_by().values("product_id").annotate(total=Sum("rating"), count=Count("pk"))
+    updated = [
+        Product(
+            pk=row["product_id"],
+            rating_sum=row["total"],
+            rating_count=row["count"],
+            avg_rating=row["total"] / row["count"],
+        )
+        for row in rows
+    ]
+    Product.objects.bulk_update(updated, ["rating_sum", "rating_count", "avg_rating"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_product_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="avg_rating",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["avg_rating", "rating_count", "id"], name="product_rating_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "avg_rating", "rating_count", "id"], name="product_cat_rating_id_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    Comment = apps.get_model("products", "Comment")
+    Product = apps.get_model("products", "Product")
+    histograms = {}
+    for row in Comment.objects.order_by().values("product_id", "rating").annotate(count=Count("pk")):
+        histograms.setdefault(row["product_id"], {})[f"ratings_{row['rating']}"] = row["count"]
+    fields = [f"ratings_{stars}" for stars in range(1, 6)]
+    updated = [Product(pk=pk, **{field: counts.get(field, 0) for field in fields}) for pk, counts in histograms.items()]
+    Product.objects.bulk_update(updated, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="ratings_1",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="ratings_2",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="ratings_3",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="ratings_4",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="ratings_5",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_product_rating_histogram"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["product", "rating", "created_at"], name="comment_product_rating_idx"),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_related_products(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    RelatedProduct = apps.get_model("products", "RelatedProduct")
+    rows = []
+    for category_id in Product.objects.exclude(category=None).values_list("category_id", flat=True).distinct():
+        products = Product.objects.filter(category_id=category_id)
+        top = list(products.order_by("-avg_rating", "-rating_count", "name", "id").values_list("pk", flat=True)[:9])
+        for pk in products.values_list("pk", flat=True):
+            ranked = [other for other in top if other != pk][:8]
+            rows += [RelatedProduct(product_id=pk, related_id=other, rank=rank) for rank, other in enumerate(ranked)]
+    RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedProduct",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="related_rows", to="products.product"
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="products.product"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["product", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("product", "rank"), name="related_product_rank_unique")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_related_products, migrations.RunPython.noop),
+    ]
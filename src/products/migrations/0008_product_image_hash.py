@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_related_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
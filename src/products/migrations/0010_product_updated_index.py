@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_product_sku"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["updated_at", "id"], name="product_updated_id_idx"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+INDEX_NAME = "product_search_document_idx"
+# the expression of products.search.PG_DOCUMENT
+DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, COALESCE(description, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        # SQLite searches its FTS5 table (migration 0006), other databases the portable fallback engine
+        return
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON products_product USING gin (({DOCUMENT}))")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_product_updated_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,53 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_ranking(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    RelatedRanking = apps.get_model("products", "RelatedRanking")
+    rows = []
+    for category_id in Product.objects.exclude(category=None).values_list("category_id", flat=True).distinct():
+        top = Product.objects.filter(category_id=category_id).order_by("-avg_rating", "-rating_count", "name", "id")
+        rows += [
+            RelatedRanking(category_id=category_id, product_id=pk, rank=rank)
+            for rank, pk in enumerate(top.values_list("pk", flat=True)[:9])
+        ]
+    RelatedRanking.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    """One ranking per category replaces the related rows of every product."""
+
+    dependencies = [
+        ("products", "0011_product_postgres_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedRanking",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="ranking", to="products.category"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="products.product"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["category", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("category", "rank"), name="related_ranking_rank_unique")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_ranking, migrations.RunPython.noop),
+        migrations.DeleteModel(name="RelatedProduct"),
+    ]
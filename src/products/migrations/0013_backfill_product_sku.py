@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def backfill_sku(apps, schema_editor):
+    """Give every product without a SKU one, so an exported catalog can be imported again."""
+    Product = apps.get_model("products", "Product")
+    taken = set(Product.objects.exclude(sku=None).values_list("sku", flat=True))
+    products = []
+    for product in Product.objects.filter(sku=None).only("pk").iterator(chunk_size=2000):
+        sku = f"BTW-{product.pk:06d}"
+        while sku in taken:
+            sku += "-1"
+        taken.add(sku)
+        product.sku = sku
+        products.append(product)
+    Product.objects.bulk_update(products, ["sku"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_related_ranking"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sku, migrations.RunPython.noop),
+    ]
@@ -22,31 +22,92 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
 
+def default_sku(pk):
+    """SKU of a product created without one (migration 0013 gave existing products the same)."""
+    return f"BTW-{pk:06d}"
+
+
 class Product(models.Model):
 
     category = models.ForeignKey(Category, null=True, on_delete=models.DO_NOTHING)
     description = models.TextField(max_length=250, null=True, blank=True)
     image = models.ImageField(upload_to="imgs/products/", null=True, blank=True)
+    # content hash of the image the resized derivatives were generated from (see products.images)
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
     name = models.CharField(max_length=80, blank=False, null=False)
+    # stock keeping unit, the key products are matched by when importing the catalog
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     price = models.DecimalField(max_digits=6, decimal_places=2, validators=[MinValueValidator(Decimal("0.00"))])
 
+    # Rating aggregates, maintained on every comment write (see products.ratings)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(default=0, editable=False)
+    # Number of ratings per star value (1-5)
+    ratings_1 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_2 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_3 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_4 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_5 = models.PositiveIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # NEW helper properties
     @property
-    def average_rating(self):
-        from django.db.models import Avg
-
-        return self.comments.aggregate(a=Avg("rating"))["a"] or 0
-
-    @property
-    def rating_count(self):
-        return self.comments.count()
+    def rating_histogram(self):
+        """Star distribution as a list of ``(stars, count, percent)``, from 5 stars down to 1."""
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f"ratings_{stars}")
+            histogram.append((stars, count, round(100 * count / self.rating_count) if self.rating_count else 0))
+        return histogram
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.sku:
+            # the catalog import matches products by SKU, an exported product without one could not be imported
+            sku = default_sku(self.pk)
+            while Product.objects.filter(sku=sku).exists():
+                sku += "-1"
+            Product.objects.filter(pk=self.pk).update(sku=sku)
+            self.sku = sku
 
     def __str__(self) -> str:
         return self.name
 
+    class Meta:
+        # composite indexes backing the keyset pagination sorts of the catalog
+        indexes = [
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["category", "name", "id"], name="product_cat_name_id_idx"),
+            models.Index(fields=["category", "price", "id"], name="product_cat_price_id_idx"),
+            models.Index(fields=["category", "created_at", "id"], name="product_cat_created_id_idx"),
+            models.Index(fields=["avg_rating", "rating_count", "id"], name="product_rating_id_idx"),
+            models.Index(fields=["category", "avg_rating", "rating_count", "id"], name="product_cat_rating_id_idx"),
+            # incremental pulls of the partner feed (products.feeds)
+            models.Index(fields=["updated_at", "id"], name="product_updated_id_idx"),
+        ]
+
+
+class RelatedRanking(models.Model):
+    """
+    The best rated products of a category, ranked. They are the related
+    products of every product of the category, maintained by products.related.
+    """
+
+    category = models.ForeignKey(Category, related_name="ranking", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_id} (#{self.rank})"
+
+    class Meta:
+        ordering = ["category", "rank"]
+        constraints = [models.UniqueConstraint(fields=["category", "rank"], name="related_ranking_rank_unique")]
+
 
 # NEW model
 class Comment(models.Model):
@@ -67,7 +128,18 @@ class Comment(models.Model):
                 fields=["product", "user"], name="unique_user_product_comment", condition=models.Q(user__isnull=False)
             ),
         ]
-        indexes = [models.Index(fields=["product", "created_at"])]
+        indexes = [
+            models.Index(fields=["product", "created_at"]),
+            models.Index(fields=["product", "rating", "created_at"], name="comment_product_rating_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what is stored so a later save only applies the difference to the product aggregates
+        if "rating" in instance.__dict__ and "product_id" in instance.__dict__:
+            instance._stored_rating = (instance.product_id, instance.rating)
+        return instance
 
     def __str__(self):
         who = self.user.username if self.user else (self.guest_name or "Guest")
@@ -0,0 +1,193 @@
+"""
+Keyset (cursor) pagination for catalog querysets.
+
+Instead of ``OFFSET``/``LIMIT`` the page boundary is expressed as a ``WHERE``
+clause on the sort key of the last row that was shown, so the database can
+seek straight into the matching index and the cost of a page does not depend
+on how deep the cursor is. The ordering must end on a unique column (usually
+``id``) so that every row has a distinct position.
+
+Cursors are opaque, url-safe tokens that encode the direction and the sort key
+values of the boundary row.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded or does not match the ordering."""
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _split(field):
+    return (field[1:], True) if field.startswith("-") else (field, False)
+
+
+def _to_json(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps({"d": direction, "v": [_to_json(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _model_field(model, path):
+    field = None
+    for part in path.split(LOOKUP_SEP):
+        field = model._meta.get_field(part)
+        model = field.related_model
+    return field
+
+
+def _from_json(model, ordering, values):
+    """Convert the cursor ``values`` to the types of the ordering fields of ``model``."""
+    converted = []
+    for field, value in zip(ordering, values):
+        field = _model_field(model, _split(field)[0])
+        try:
+            # the rows of a page are never NULL in a sort column, and a NULL cannot be compared with
+            if value is None:
+                raise ValueError("NULL cursor value")
+            value = field.to_python(value)
+            # e.g. an id out of the range of the column
+            field.run_validators(value)
+        except (ValidationError, ValueError, TypeError) as err:
+            raise InvalidCursor("Cursor does not match the requested ordering.") from err
+        converted.append(value)
+    return converted
+
+
+def decode_cursor(token, ordering, model=None):
+    """
+    Return the direction and the sort key values of a cursor ``token``. With a
+    ``model`` the values are converted to the types of its ordering fields;
+    raises :class:`InvalidCursor` if the token is malformed or any value is not
+    valid for its field.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = payload["d"], payload["v"]
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError) as err:
+        raise InvalidCursor("Malformed cursor.") from err
+    if direction not in ("n", "p") or not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("Cursor does not match the requested ordering.")
+    if model is not None:
+        values = _from_json(model, ordering, values)
+    return direction, values
+
+
+def _seek_filter(ordering, values, reverse=False):
+    """
+    Build ``(a > x) OR (a = x AND b > y) OR ...`` for the given ordering,
+    flipping the comparison per column for descending fields.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name, descending = _split(field)
+        lookup = "lt" if descending != reverse else "gt"
+        condition |= Q(**equal, **{f"{name}{LOOKUP_SEP}{lookup}": value})
+        equal[name] = value
+    return condition
+
+
+def _row_values(obj, ordering):
+    values = []
+    for field in ordering:
+        value = obj
+        for part in _split(field)[0].split(LOOKUP_SEP):
+            value = getattr(value, part)
+        values.append(value)
+    return values
+
+
+def _page_query(queryset, ordering, cursor, page_size):
+    direction, values = decode_cursor(cursor, ordering, queryset.model) if cursor else ("n", None)
+    backwards = direction == "p"
+
+    if backwards:
+        queryset = queryset.order_by(*(name if desc else f"-{name}" for name, desc in map(_split, ordering)))
+    else:
+        queryset = queryset.order_by(*ordering)
+    if values is not None:
+        queryset = queryset.filter(_seek_filter(ordering, values, reverse=backwards))
+    return queryset[: page_size + 1], values is not None, backwards
+
+
+def _page(rows, ordering, page_size, from_cursor, backwards):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    page = KeysetPage(rows)
+    if rows:
+        first, last = _row_values(rows[0], ordering), _row_values(rows[-1], ordering)
+        # the side we came from always has rows, the other one only if we fetched an extra row
+        if backwards:
+            page.previous_cursor = encode_cursor("p", first) if has_more else None
+            page.next_cursor = encode_cursor("n", last)
+        else:
+            page.next_cursor = encode_cursor("n", last) if has_more else None
+            page.previous_cursor = encode_cursor("p", first) if from_cursor else None
+    return page
+
+
+def paginate(queryset, ordering, cursor=None, page_size=24):
+    """
+    Return a :class:`KeysetPage` of ``queryset`` sorted by ``ordering``.
+
+    ``ordering`` is a sequence of ``order_by`` expressions whose last entry is
+    a unique column. ``cursor`` is a token previously returned as
+    ``next_cursor`` or ``previous_cursor``; raises :class:`InvalidCursor` if it
+    cannot be used.
+    """
+    ordering = list(ordering)
+    queryset, from_cursor, backwards = _page_query(queryset, ordering, cursor, page_size)
+    return _page(list(queryset), ordering, page_size, from_cursor, backwards)
+
+
+async def apaginate(queryset, ordering, cursor=None, page_size=24):
+    """Async version of :func:`paginate`."""
+    ordering = list(ordering)
+    queryset, from_cursor, backwards = _page_query(queryset, ordering, cursor, page_size)
+    return _page([row async for row in queryset], ordering, page_size, from_cursor, backwards)
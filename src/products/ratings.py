@@ -0,0 +1,148 @@
+"""
+Maintenance of the rating aggregates that are stored on ``Product``.
+
+Every comment write applies its difference to the product row with a single
+``UPDATE ... SET rating_sum = rating_sum + x`` statement, so concurrent writers
+never lose updates and readers can sort and filter on the stored columns
+without joining ``Comment``.
+"""
+
+from dataclasses import dataclass, field
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connections
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+from django.utils import timezone
+
+from .models import Comment, Product
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f"ratings_{stars}" for stars in STARS]
+AGGREGATE_FIELDS = ["rating_sum", "rating_count", "avg_rating", *HISTOGRAM_FIELDS]
+# mismatches kept on a RatingsReport to show
+SAMPLE_SIZE = 20
+
+
+def average(rating_sum, rating_count):
+    return rating_sum / rating_count if rating_count else 0.0
+
+
+def update_product_ratings(product_id, added=None, removed=None):
+    """
+    Add the rating ``added`` to and/or take the rating ``removed`` away from
+    the aggregates of product ``product_id``. Either argument may be ``None``.
+    """
+    if added == removed:
+        return
+
+    sum_delta = (added or 0) - (removed or 0)
+    count_delta = (added is not None) - (removed is not None)
+    new_sum = F("rating_sum") + sum_delta
+    new_count = F("rating_count") + count_delta
+    changes = {
+        "rating_sum": new_sum,
+        "rating_count": new_count,
+        # the right hand side sees the old column values, so recompute the mean from the new totals
+        "avg_rating": Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, 0), Value(0.0)),
+        # update() skips auto_now, and the feed's ?since= must see the new rating
+        "updated_at": Now(),
+    }
+    if added is not None:
+        changes[f"ratings_{added}"] = F(f"ratings_{added}") + 1
+    if removed is not None:
+        changes[f"ratings_{removed}"] = F(f"ratings_{removed}") - 1
+    Product.objects.filter(pk=product_id).update(**changes)
+
+
+def _aggregates(histogram):
+    rating_sum = sum(stars * count for stars, count in zip(STARS, histogram))
+    rating_count = sum(histogram)
+    return (rating_sum, rating_count, average(rating_sum, rating_count), *histogram)
+
+
+def _matches(stored, expected):
+    # everything but the float average (at index 2) must match exactly
+    return stored[:2] == list(expected[:2]) and stored[3:] == list(expected[3:]) and abs(stored[2] - expected[2]) < 1e-9
+
+
+def _stream_histograms(batch_size):
+    """
+    Yield ``(product_id, histogram)`` for every product that has comments, in
+    product order, from a single pass over the ``(product, created_at)`` index.
+    """
+    rows = Comment.objects.order_by("product_id", "created_at").values_list("product_id", "rating")
+    for product_id, group in groupby(rows.iterator(chunk_size=batch_size), key=itemgetter(0)):
+        histogram = [0] * len(STARS)
+        for _, rating in group:
+            histogram[rating - 1] += 1
+        yield product_id, histogram
+
+
+@dataclass
+class RatingsReport:
+    # products whose stored aggregates did not match their comments
+    stale: int = 0
+    # ``(product_id, stored, expected)`` of the first ``SAMPLE_SIZE`` of them
+    sample: list = field(default_factory=list)
+
+
+def _stored_pages(batch_size):
+    """Yield the stored aggregates of all products in product order, ``batch_size`` rows at a time."""
+    rows = Product.objects.order_by("pk").values_list("pk", *AGGREGATE_FIELDS)
+    last = None
+    while page := list((rows if last is None else rows.filter(pk__gt=last))[:batch_size]):
+        yield page
+        last = page[-1][0]
+
+
+def recompute_ratings(batch_size=1000, write=True):
+    """
+    Recompute the aggregates and histograms of all products from ``Comment``
+    and return a :class:`RatingsReport` of the products that did not match.
+    Mismatching rows are corrected unless ``write`` is false.
+
+    Products and comments are both read in product order and merged, and the
+    corrections of a page of products are written before the next page is
+    read, so memory use stays flat no matter how many products and comments
+    there are, or how many of them are stale.
+    """
+    histograms = _stream_histograms(batch_size)
+    next_histogram = next(histograms, None)
+    empty = [0] * len(STARS)
+
+    report = RatingsReport()
+    for page in _stored_pages(batch_size):
+        mismatches = []
+        for pk, *stored in page:
+            # skip comments of products that disappeared while streaming
+            while next_histogram is not None and next_histogram[0] < pk:
+                next_histogram = next(histograms, None)
+            histogram = empty
+            if next_histogram is not None and next_histogram[0] == pk:
+                histogram = next_histogram[1]
+
+            expected = _aggregates(histogram)
+            if not _matches(stored, expected):
+                mismatches.append((pk, tuple(stored), expected))
+
+        report.stale += len(mismatches)
+        report.sample += mismatches[: SAMPLE_SIZE - len(report.sample)]
+        # the page is read completely, SQLite does not define what an open cursor sees of rows changed under it
+        if write and mismatches:
+            _write_aggregates(mismatches)
+    return report
+
+
+def _write_aggregates(mismatches):
+    # one prepared UPDATE per row; bulk_update() builds a CASE per column that gets slow with many rows
+    connection = connections[Product.objects.db]
+    quote = connection.ops.quote_name
+    # corrected products show up in the feed's ?since= like any other change
+    fields = [*AGGREGATE_FIELDS, "updated_at"]
+    assignments = ", ".join(f"{quote(Product._meta.get_field(name).column)} = %s" for name in fields)
+    now = Product._meta.get_field("updated_at").get_db_prep_save(timezone.now(), connection)
+    sql = f"UPDATE {quote(Product._meta.db_table)} SET {assignments} WHERE {quote(Product._meta.pk.column)} = %s"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(*expected, now, pk) for pk, _, expected in mismatches])
@@ -0,0 +1,70 @@
+"""
+Precomputed "related products" of every product.
+
+The related products of a product are the best rated other products of its
+category. Every product of a category shares the same ranking with itself left
+out, so only the category's top ``RELATED_LIMIT + 1`` products are stored, as
+``RelatedRanking`` rows. The detail page reads them from the ``(category,
+rank)`` index and drops the product itself, instead of sorting the whole
+category on every view.
+
+A write costs the same however large the category is: syncing a category
+reads its top products and its stored ranking and writes the ranks that
+changed. Rows are kept current by the signal handlers in ``products.signals``
+and can be rebuilt with ``manage.py rebuild_related``.
+"""
+
+from .models import Product, RelatedRanking
+
+RELATED_LIMIT = 8
+RANKING = ("-avg_rating", "-rating_count", "name", "id")
+
+
+def ranking(category):
+    """The ranking rows of ``category`` (a category id or a subquery returning one), with their products."""
+    return RelatedRanking.objects.filter(category_id=category).select_related("product__category")
+
+
+def related_to(product_id, rows):
+    """The related products of ``product_id`` from the ranking ``rows`` of its category."""
+    return [row.product for row in rows if row.product_id != product_id][:RELATED_LIMIT]
+
+
+def expected_ranking(category_id):
+    """Map rank to product id for the top products of the category."""
+    top = Product.objects.filter(category_id=category_id).order_by(*RANKING).values_list("pk", flat=True)
+    return dict(enumerate(top[: RELATED_LIMIT + 1]))
+
+
+def sync_category(category_id):
+    """
+    Bring the ranking of ``category_id`` up to date and return the number of
+    rows written or deleted. Unchanged rows are left alone.
+    """
+    if category_id is None:
+        # products without a category have no detail page
+        return 0
+    expected = expected_ranking(category_id)
+    stored_rows = RelatedRanking.objects.filter(category_id=category_id)
+    stored = dict(stored_rows.values_list("rank", "product_id"))
+    changed = [
+        RelatedRanking(category_id=category_id, rank=rank, product_id=pk)
+        for rank, pk in expected.items()
+        if stored.get(rank) != pk
+    ]
+    deleted = 0
+    if any(rank not in expected for rank in stored):
+        deleted = stored_rows.filter(rank__gte=len(expected)).delete()[0]
+    RelatedRanking.objects.bulk_create(
+        changed, update_conflicts=True, unique_fields=["category", "rank"], update_fields=["product"]
+    )
+    return len(changed) + deleted
+
+
+def rebuild(category_ids=None):
+    if category_ids is None:
+        category_ids = list(Product.objects.exclude(category=None).values_list("category_id", flat=True).distinct())
+        # categories that lost all their products
+        stale = RelatedRanking.objects.exclude(category_id__in=category_ids).delete()[0]
+        return stale + sum(sync_category(category_id) for category_id in category_ids)
+    return sum(sync_category(category_id) for category_id in category_ids)
@@ -0,0 +1,222 @@
+"""
+Product full text search.
+
+On SQLite the catalog is indexed in an FTS5 virtual table (created by
+migration ``0006_product_search_index``) which gives ranked (bm25) matches and
+cheap prefix queries for type-ahead. Other databases, or SQLite builds without
+FTS5, fall back to :class:`BasicSearchEngine`, which works everywhere but has to
+scan the product table. On PostgreSQL the products are matched against a GIN
+expression index (migration ``0011_product_postgres_search_index``) and ranked
+with ``ts_rank``.
+
+The index is kept current by the ``Product`` signal handlers in
+``products.signals`` and can be rebuilt with ``manage.py rebuild_search_index``.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Product
+
+FTS_TABLE = "products_product_fts"
+# bm25 weights of the indexed columns: a hit in the name counts ten times as much as one in the description
+FTS_WEIGHTS = (10.0, 1.0)
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def query_terms(query):
+    return _TERM_RE.findall(query.lower())
+
+
+class BasicSearchEngine:
+    """Portable ``icontains`` search, ranking name hits before description hits."""
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def search(self, query, category_id=None, min_price=None, max_price=None, limit=20, offset=0, prefix=True):
+        # icontains always matches prefixes, so ``prefix`` only exists for signature compatibility
+        terms = query_terms(query)
+        if not terms:
+            return []
+        products = Product.objects.using(self.using).select_related("category")
+        for term in terms:
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        products = self._filter(products, category_id, min_price, max_price)
+        products = products.annotate(
+            rank=Case(
+                When(name__istartswith=terms[0], then=Value(0)),
+                When(name__icontains=terms[0], then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        )
+        return list(products.order_by("rank", "name", "pk")[offset : offset + limit])
+
+    @staticmethod
+    def _filter(products, category_id, min_price, max_price):
+        if category_id is not None:
+            products = products.filter(category_id=category_id)
+        if min_price is not None:
+            products = products.filter(price__gte=min_price)
+        if max_price is not None:
+            products = products.filter(price__lte=max_price)
+        return products
+
+    # queries go straight to the product table, so there is no index to maintain
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        return Product.objects.using(self.using).count()
+
+
+class SQLiteFTSEngine(BasicSearchEngine):
+    """Ranked search on the SQLite FTS5 index."""
+
+    @staticmethod
+    def match_expression(terms, prefix=True):
+        # every term is quoted so user input cannot inject FTS query syntax
+        quoted = [f'"{term}"' for term in terms]
+        if prefix:
+            quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def search(self, query, category_id=None, min_price=None, max_price=None, limit=20, offset=0, prefix=True):
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        sql = [
+            f"SELECT p.id FROM {FTS_TABLE} f JOIN {Product._meta.db_table} p ON p.id = f.rowid",
+            f"WHERE {FTS_TABLE} MATCH %s",
+        ]
+        params = [self.match_expression(terms, prefix)]
+        for clause, value in (
+            ("p.category_id = %s", category_id),
+            ("p.price >= %s", min_price),
+            ("p.price <= %s", max_price),
+        ):
+            if value is not None:
+                sql.append(f"AND {clause}")
+                params.append(value)
+        sql.append(f"ORDER BY bm25({FTS_TABLE}, {', '.join(map(str, FTS_WEIGHTS))}), p.id LIMIT %s OFFSET %s")
+        params += [limit, offset]
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(" ".join(sql), params)
+            ids = [row[0] for row in cursor.fetchall()]
+        products = Product.objects.using(self.using).select_related("category").in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def index(self, product):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description or ""],
+            )
+
+    def remove(self, product_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, COALESCE(description, '') FROM {Product._meta.db_table}"
+            )
+            # merge the b-trees written by the bulk insert into one
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+
+# must be the expression of the GIN index of migration 0011 word for word, or PostgreSQL cannot use the index
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, COALESCE(description, '')), 'B')"
+)
+
+
+class PostgresSearchEngine(BasicSearchEngine):
+    """Ranked search on the full text expression index of PostgreSQL."""
+
+    @staticmethod
+    def tsquery(terms, prefix=True):
+        # terms are plain words (\w+), quoting them keeps tsquery operators out of user input
+        quoted = [f"'{term}'" for term in terms]
+        if prefix:
+            quoted[-1] += ":*"
+        return " & ".join(quoted)
+
+    def search(self, query, category_id=None, min_price=None, max_price=None, limit=20, offset=0, prefix=True):
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        sql = [
+            f"SELECT p.id FROM {Product._meta.db_table} p, to_tsquery('simple'::regconfig, %s) q",
+            f"WHERE ({PG_DOCUMENT}) @@ q",
+        ]
+        params = [self.tsquery(terms, prefix)]
+        for clause, value in (
+            ("p.category_id = %s", category_id),
+            ("p.price >= %s", min_price),
+            ("p.price <= %s", max_price),
+        ):
+            if value is not None:
+                sql.append(f"AND {clause}")
+                params.append(value)
+        sql.append(f"ORDER BY ts_rank({PG_DOCUMENT}, q) DESC, p.id LIMIT %s OFFSET %s")
+        params += [limit, offset]
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(" ".join(sql), params)
+            ids = [row[0] for row in cursor.fetchall()]
+        products = Product.objects.using(self.using).select_related("category").in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+# the engine of every database alias, picked on first use; see reset_search_engines()
+_engines = {}
+
+
+def _create_engine(using):
+    connection = connections[using]
+    if connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+        return SQLiteFTSEngine(using)
+    if connection.vendor == "postgresql":
+        return PostgresSearchEngine(using)
+    return BasicSearchEngine(using)
+
+
+def get_search_engine(using="default"):
+    engine = _engines.get(using)
+    if engine is None:
+        engine = _engines[using] = _create_engine(using)
+    return engine
+
+
+def reset_search_engines(using=None, fallback_only=False):
+    """
+    Forget the engine of ``using`` (of every alias by default), so the next
+    :func:`get_search_engine` picks it again. The engine depends on the vendor
+    of the database and on the FTS table, which change when the databases are
+    reconfigured or migrated (see ``products.signals``). With ``fallback_only``
+    only a :class:`BasicSearchEngine` of SQLite is forgotten: the FTS table may
+    have been created since.
+    """
+    for alias in [using] if using is not None else list(_engines):
+        engine = _engines.get(alias)
+        if fallback_only and not (type(engine) is BasicSearchEngine and connections[alias].vendor == "sqlite"):
+            continue
+        _engines.pop(alias, None)
@@ -0,0 +1,160 @@
+import logging
+
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, images, related
+from .cache import bump_versions
+from .models import Category, Comment, Product
+from .ratings import update_product_ratings
+from .search import get_search_engine, reset_search_engines
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_stored_rating(sender, instance, raw, **kwargs):
+    # instances loaded from the database already know their stored rating (see Comment.from_db)
+    if raw or instance.pk is None or hasattr(instance, "_stored_rating"):
+        return
+    instance._stored_rating = Comment.objects.filter(pk=instance.pk).values_list("product_id", "rating").first()
+
+
+@receiver(post_save, sender=Comment)
+def apply_comment_rating(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    stored = None if created else getattr(instance, "_stored_rating", None)
+    instance._moved_from_product_id = None
+    if stored and stored[0] != instance.product_id:
+        update_product_ratings(stored[0], removed=stored[1])
+        instance._moved_from_product_id = stored[0]
+        stored = None
+    update_product_ratings(instance.product_id, added=instance.rating, removed=stored[1] if stored else None)
+    instance._stored_rating = (instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=Comment)
+def revert_comment_rating(sender, instance, **kwargs):
+    update_product_ratings(instance.product_id, removed=instance.rating)
+
+
+@receiver(pre_save, sender=Product)
+def remember_stored_product(sender, instance, raw, **kwargs):
+    if not raw and instance.pk is not None:
+        stored = Product.objects.filter(pk=instance.pk).values_list("category_id", "category__slug", "image").first()
+        instance._stored_category_id, instance._stored_category_slug, instance._stored_image = stored or (None,) * 3
+
+
+@receiver(post_save, sender=Product)
+def generate_image_derivatives(sender, instance, raw, **kwargs):
+    # runs before the page invalidation below, so re-rendered pages already use the derivatives
+    if raw or not instance.image:
+        return
+    if instance.image_hash and instance.image.name == getattr(instance, "_stored_image", None):
+        return
+    try:
+        images.generate(instance)
+    except OSError:  # includes Pillow's UnidentifiedImageError
+        # pages fall back to the original image, generate_images can be re-run later
+        logger.exception("Could not generate the image derivatives of product %s", instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, **kwargs):
+    get_search_engine(using).index(instance)
+    autocomplete.invalidate()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    get_search_engine(using).remove(instance.pk)
+    autocomplete.invalidate()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_suggestions(sender, **kwargs):
+    autocomplete.invalidate()
+
+
+def _category_slug(category_id):
+    if category_id is None:
+        return None
+    return Category.objects.filter(pk=category_id).values_list("slug", flat=True).first()
+
+
+def _bump_product_pages(product_id, *category_slugs):
+    bump_versions("catalog", f"product:{product_id}", *(f"category:{slug}" for slug in set(category_slugs) if slug))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, raw=False, **kwargs):
+    # ratings appear on the product, its category listing and the related products of its siblings
+    product_ids = {instance.product_id, getattr(instance, "_moved_from_product_id", None)} - {None}
+    for product_id, category_slug in Product.objects.filter(pk__in=product_ids).values_list("pk", "category__slug"):
+        _bump_product_pages(product_id, category_slug)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs):
+    _bump_product_pages(
+        instance.pk, _category_slug(instance.category_id), getattr(instance, "_stored_category_slug", None)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_related_for_comment(sender, instance, raw=False, origin=None, **kwargs):
+    # a rating change can move the product within its category's ranking
+    if raw:
+        return
+    if getattr(origin, "model", type(origin)) is Product:
+        # the comments of deleted products go first, refresh_related_for_product syncs once they are gone
+        return
+    product_ids = {instance.product_id, getattr(instance, "_moved_from_product_id", None)} - {None}
+    for category_id in set(Product.objects.filter(pk__in=product_ids).values_list("category_id", flat=True)):
+        related.sync_category(category_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_related_for_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for category_id in {instance.category_id, getattr(instance, "_stored_category_id", instance.category_id)}:
+        related.sync_category(category_id)
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_slug(sender, instance, raw, **kwargs):
+    if not raw and instance.pk is not None:
+        instance._stored_slug = Category.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, "_stored_slug", None)} - {None}
+    bump_versions("categories", "catalog", *(f"category:{slug}" for slug in slugs))
+
+
+@receiver(setting_changed)
+def reset_search_engines_on_databases_change(sender, setting, **kwargs):
+    if setting == "DATABASES":
+        reset_search_engines()
+
+
+@receiver(post_migrate)
+def reset_search_engines_after_migrate(sender, using, **kwargs):
+    reset_search_engines(using)
+
+
+@receiver(connection_created)
+def reset_fallback_search_engine(sender, connection, **kwargs):
+    # a fallback picked before the migrations ran (e.g. in the gunicorn master) must not stay forever
+    reset_search_engines(connection.alias, fallback_only=True)
@@ -0,0 +1,71 @@
+from functools import lru_cache
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.safestring import mark_safe
+
+from products.fragments import render_fragments
+from products.images import PRESETS, derivative_name, picture_sources
+
+register = template.Library()
+
+FILLED_STAR = '<span class="text-warning">&#9733;</span>'
+EMPTY_STAR = '<span class="text-secondary">&#9734;</span>'
+
+
+@lru_cache(maxsize=None)
+def _stars(filled):
+    return mark_safe("\n".join([FILLED_STAR] * filled + [EMPTY_STAR] * (5 - filled)))
+
+
+@register.simple_tag
+def star_rating(value):
+    """
+    Usage: {% star_rating product.avg_rating %}
+    Five stars, the first ``int(value)`` of them filled.
+    """
+    return _stars(min(max(int(value or 0), 0), 5))
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products):
+    """
+    Usage: {% product_cards products %}
+    """
+    return render_fragments("card", "_product_card.html", products, context.get("request"))
+
+
+@register.simple_tag(takes_context=True)
+def related_product_cards(context, products):
+    """
+    Usage: {% related_product_cards related_products %}
+    """
+    return render_fragments("related", "_related_card.html", products, context.get("request"))
+
+
+@register.inclusion_tag("_picture.html")
+def product_picture(product, preset, css_class="", style="", lazy=True):
+    """
+    Usage: {% product_picture product "card" css_class="card-img-top" %}
+    A <picture> with the resized derivatives of the product image, the original
+    image while there are none, or a placeholder.
+    """
+    width, height, sizes = PRESETS[preset]
+    sources = picture_sources(product, preset)
+    context = {
+        "product": product,
+        "width": width,
+        "height": height,
+        "sizes": sizes,
+        "css_class": css_class,
+        "style": style,
+        "lazy": lazy,
+    }
+    if sources:
+        # the last format (JPEG) goes on the <img> for browsers that understand none of the others
+        context.update(
+            sources=sources[:-1],
+            srcset=sources[-1][1],
+            src=default_storage.url(derivative_name(product.image_hash, preset, 1, "jpeg")),
+        )
+    return context
@@ -0,0 +1,9 @@
+"""The project URLs with the catalog pages served by products.async_views, as with ASYNC_VIEWS on."""
+
+from django.urls import include, path
+
+from btw_app.urls import urlpatterns as project_urlpatterns
+from products import async_views
+from products.urls import catalog_patterns
+
+urlpatterns = [path("", include(catalog_patterns(async_views))), *project_urlpatterns]
@@ -0,0 +1,75 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.api import PRODUCT_FIELDS
+from products.models import Category, Comment, Product
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.products = [
+            Product.objects.create(name=f"Toy {i}", price=f"{i}.50", category=cls.toys) for i in range(1, 6)
+        ]
+        cls.hat = Product.objects.create(name="Sun hat", price="4.99", category=cls.outdoor)
+        for rating in (5, 3):
+            Comment.objects.create(product=cls.hat, guest_name="G", guest_email="g@example.com", rating=rating)
+
+    def get(self, name, *args, status=200, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return json.loads(response.content)
+
+    def test_list_follows_cursors(self):
+        data = self.get("api_products", category="toys", limit=2)
+        self.assertEqual([p["name"] for p in data["results"]], ["Toy 1", "Toy 2"])
+        self.assertIsNone(data["previous"])
+        names = []
+        while data["next"]:
+            data = json.loads(self.client.get(data["next"]).content)
+            names += [p["name"] for p in data["results"]]
+        self.assertEqual(names, ["Toy 3", "Toy 4", "Toy 5"])
+
+    def test_sparse_fieldsets_load_only_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get("api_products", fields="name,price", sort="price", limit=1)
+        self.assertEqual(data["results"], [{"name": "Toy 1", "price": "1.50"}])
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("products_category", sql)
+
+        data = self.get("api_product_detail", self.hat.pk)
+        self.assertEqual(list(data), list(PRODUCT_FIELDS))
+        self.assertEqual(data["url"], reverse("product_detail", args=["outdoor", self.hat.pk]))
+        self.assertEqual((data["avg_rating"], data["rating_histogram"]["5"]), (4.0, 1))
+
+        data = self.get("api_products", fields="name,colour", status=400)
+        self.assertIn("Unknown fields: colour", data["error"])
+
+    def test_batch_get_in_one_query(self):
+        ids = [self.hat.pk, self.products[0].pk, 9999]
+        with self.assertNumQueries(1):
+            data = self.get("api_products", ids=",".join(map(str, ids)), fields="id,category")
+        self.assertEqual(
+            data["results"], [{"id": self.hat.pk, "category": "outdoor"}, {"id": ids[1], "category": "toys"}]
+        )
+        self.assertEqual(data["missing"], [9999])
+        self.get("api_products", ids="1,x", status=400)
+
+    def test_detail_and_reviews(self):
+        self.get("api_product_detail", 9999, status=404)
+        data = self.get("api_product_reviews", self.hat.pk, sort="highest")
+        self.assertEqual([r["rating"] for r in data["results"]], [5, 3])
+        self.get("api_product_reviews", self.hat.pk, cursor="garbage", status=400)
+        self.get("api_product_reviews", 9999, status=404)
+
+    def test_read_only(self):
+        response = self.client.post(reverse("api_products"))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,91 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Category, Comment, Product
+from products.pagination import encode_cursor
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF="products.tests.async_urls")
+class AsyncCatalogViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.products = [Product.objects.create(name=f"Toy {i:02}", price="9.99", category=cls.toys) for i in range(30)]
+        cls.rattle = cls.products[0]
+        cls.user = User.objects.create_user(username="tester", password="pass1234")
+        Comment.objects.create(product=cls.rattle, user=cls.user, rating=4, text="Loud")
+        Comment.objects.create(product=cls.rattle, guest_name="G", guest_email="g@example.com", rating=2)
+        cls.detail_url = reverse("product_detail", args=["toys", cls.rattle.pk])
+
+    async def test_list_matches_sync_view(self):
+        response = await self.async_client.get(reverse("products_by_category", args=["toys"]))
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page"]
+        self.assertEqual([p.name for p in page], [f"Toy {i:02}" for i in range(24)])
+        self.assertEqual([c.slug for c in response.context["categories"]], ["toys"])
+        self.assertIn("X-Fragment-Cache", response)
+
+        response = await self.async_client.get(reverse("products"), {"cursor": page.next_cursor})
+        self.assertEqual(len(response.context["products"]), 6)
+        # an invalid cursor shows the first page, like the sync view
+        response = await self.async_client.get(reverse("products"), {"cursor": "garbage"})
+        self.assertEqual(response.context["products"][0].name, "Toy 00")
+
+    async def test_detail(self):
+        response = await self.async_client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["product"], self.rattle)
+        self.assertEqual(len(response.context["related_products"]), 8)
+        self.assertEqual([c.rating for c in response.context["comments"]], [2, 4])
+        self.assertEqual(response.context["form"].initial, {})
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.detail_url)
+        self.assertEqual(response.context["form"].initial, {"rating": 4, "text": "Loud"})
+
+        response = await self.async_client.get(reverse("product_detail", args=["other", self.rattle.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_comment_post_uses_sync_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(self.detail_url, {"rating": 5, "text": "Great"})
+        self.assertRedirects(response, self.detail_url, fetch_redirect_response=False)
+        comment = await Comment.objects.aget(product=self.rattle, user=self.user)
+        self.assertEqual(comment.rating, 5)
+
+    async def test_reviews(self):
+        url = reverse("product_reviews", args=["toys", self.rattle.pk])
+        response = await self.async_client.get(url, {"format": "json", "sort": "highest"})
+        self.assertEqual([r["rating"] for r in json.loads(response.content)["reviews"]], [4, 2])
+        response = await self.async_client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(url, {"cursor": encode_cursor("n", ["x", 1])})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_feed_is_streamed_asynchronously(self):
+        response = await self.async_client.get(reverse("product_feed_csv"))
+        self.assertTrue(response.is_async)
+        body = "".join([block.decode() async for block in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 31)
+        response = await self.async_client.get(reverse("product_feed_jsonl"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "async-tests"}},
+        CATALOG_CACHE_TIMEOUT=60,
+    )
+    async def test_pages_are_cached_and_validated(self):
+        cache.clear()
+        url = reverse("products")
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertIsNone(getattr(second, "context", None))
+        response = await self.async_client.get(url, headers={"if-none-match": first["ETag"]})
+        self.assertEqual(response.status_code, 304)
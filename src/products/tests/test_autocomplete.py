@@ -0,0 +1,48 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from products import autocomplete
+from products.models import Category, Product
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.kitchen = Product.objects.create(name="kids-kitchen-le-chef", price="45.99", category=cls.toys)
+        cls.kite = Product.objects.create(name="Kite", price="9.99", category=cls.toys)
+
+    def setUp(self):
+        autocomplete.invalidate()
+
+    def suggest(self, query):
+        return self.client.get(reverse("autocomplete"), {"q": query}).json()
+
+    def test_prefix_matches_any_word_of_the_name(self):
+        labels = [s["label"] for s in self.suggest("KIT")["suggestions"]]
+        self.assertEqual(labels, ["kids-kitchen-le-chef", "Kite"])
+        self.assertEqual([s["label"] for s in self.suggest("le ch")["suggestions"]], ["kids-kitchen-le-chef"])
+        self.assertEqual(self.suggest("")["suggestions"], [])
+
+    def test_categories_and_urls(self):
+        suggestion = self.suggest("toy")["suggestions"][0]
+        self.assertEqual(
+            suggestion, {"label": "Toys", "type": "category", "url": reverse("products_by_category", args=["toys"])}
+        )
+        url = self.suggest("kite")["suggestions"][0]["url"]
+        self.assertEqual(url, reverse("product_detail", args=["toys", self.kite.pk]))
+
+    def test_lookups_do_not_query_the_database(self):
+        self.suggest("k")
+        with self.assertNumQueries(0):
+            data = self.suggest("ki")
+        self.assertEqual(data["index"]["entries"], 3)
+        self.assertGreater(data["index"]["bytes"], 0)
+        self.assertGreaterEqual(data["index"]["age_seconds"], 0)
+
+    def test_index_refreshes_after_product_changes(self):
+        self.assertEqual(self.suggest("rocket")["suggestions"], [])
+        Product.objects.create(name="Rocket", price="3.00", category=self.toys)
+        self.assertEqual([s["label"] for s in self.suggest("rocket")["suggestions"]], ["Rocket"])
+        self.kite.delete()
+        self.assertEqual([s["label"] for s in self.suggest("kite")["suggestions"]], [])
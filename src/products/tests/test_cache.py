@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from btw_app.routers import ReplicaRouter
+from products.cache import BUMPED_PREFIX, bump_versions, cache_catalog_page
+from products.models import Category, Comment, Product
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "catalog-tests"}},
+    CATALOG_CACHE_TIMEOUT=60,
+)
+class CatalogPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.rattle = Product.objects.create(name="Blue Rattle", price="9.99", category=cls.toys)
+        cls.hat = Product.objects.create(name="Sun Hat", price="4.99", category=cls.outdoor)
+        cls.user = User.objects.create_user(username="tester", password="pass1234")
+        cls.detail_url = reverse("product_detail", args=["toys", cls.rattle.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_listing_is_served_from_cache(self):
+        first = self.client.get(reverse("products"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("products"))
+        self.assertEqual(first.content, second.content)
+        self.assertIsNotNone(self.client.get(reverse("products"), {"sort": "price"}).context)
+
+    def test_comment_invalidates_only_affected_pages(self):
+        outdoor_url = reverse("products_by_category", args=["outdoor"])
+        for url in (reverse("products"), outdoor_url, reverse("products_by_category", args=["toys"])):
+            self.client.get(url)
+
+        Comment.objects.create(product=self.rattle, guest_name="G", guest_email="g@example.com", rating=5)
+
+        with self.assertNumQueries(0):
+            self.client.get(outdoor_url)
+        resp = self.client.get(reverse("products_by_category", args=["toys"]))
+        self.assertEqual(resp.context["products"][0].rating_count, 1)
+        resp = self.client.get(reverse("products"))
+        self.assertIsNotNone(resp.context)
+
+    def test_anonymous_detail_is_cached_per_csrf_cookie(self):
+        self.client.get(self.detail_url)  # sets the csrf cookie, not cached yet
+        first = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(first.content, second.content)
+
+        other = self.client_class()
+        other.get(self.detail_url)
+        resp = other.get(self.detail_url)
+        self.assertIsNotNone(resp.context, "a page with another visitor's CSRF token was served")
+
+    def test_logged_in_pages_are_not_cached(self):
+        self.client.login(username="tester", password="pass1234")
+        self.client.get(self.detail_url)
+        resp = self.client.get(self.detail_url)
+        self.assertIsNotNone(resp.context)
+
+    def test_pages_with_flash_messages_are_not_cached(self):
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        payload = {"rating": 4, "guest_name": "G", "guest_email": "g@example.com"}
+        resp = self.client.post(self.detail_url, payload, follow=True)
+        self.assertEqual([str(m) for m in resp.context["messages"]], ["Thank you for your rating."])
+        self.assertEqual(resp.context["product"].rating_count, 1)
+
+    def test_product_update_invalidates_its_pages(self):
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        self.rattle.name = "Green Rattle"
+        self.rattle.save()
+        self.assertContains(self.client.get(self.detail_url), "Green Rattle")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "etag-tests"}},
+    CATALOG_CACHE_TIMEOUT=0,
+)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.rattle = Product.objects.create(name="Blue Rattle", price="9.99", category=cls.toys)
+        cls.list_url = reverse("products_by_category", args=["toys"])
+        cls.detail_url = reverse("product_detail", args=["toys", cls.rattle.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_revalidation_skips_database_and_templates(self):
+        first = self.client.get(self.list_url)
+        self.assertIn("ETag", first)
+
+        # the page cache is off, so only the validator stands between the request and a full render
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertIsNone(resp.context)
+
+        with self.assertNumQueries(2):
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH='"stale"')
+
+    def test_etag_changes_with_the_data(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        Comment.objects.create(product=self.rattle, guest_name="G", guest_email="g@example.com", rating=4)
+        resp = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_etag_depends_on_query_string_and_user(self):
+        etag = self.client.get(self.list_url)["ETag"]
+        self.assertNotEqual(self.client.get(self.list_url, {"sort": "price"})["ETag"], etag)
+        user = User.objects.create_user(username="tester", password="pass1234")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "replica-tests"}},
+    CATALOG_CACHE_TIMEOUT=60,
+    DATABASE_REPLICAS={"replica1": 1},
+    DATABASE_REPLICA_PIN_SECONDS=7,
+)
+class ReplicaLagTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        router = ReplicaRouter(replicas={"replica1": 1})
+        self.used = []
+
+        @cache_catalog_page(lambda request: ["catalog"])
+        def view(request):
+            self.used.append(router.db_for_read(Product))
+            return HttpResponse()
+
+        self.view = view
+        self.factory = RequestFactory()
+
+    def get(self, path):
+        self.view(self.factory.get(path))
+        return self.used.pop() if self.used else None
+
+    def test_pages_changed_by_a_recent_write_are_rendered_from_the_primary(self):
+        self.assertEqual(self.get("/"), "replica1")
+        bump_versions("catalog")
+        # a lagging replica would still show the old rows, cached under the new version
+        self.assertEqual(self.get("/"), "default")
+        self.assertIsNone(self.get("/"), "the page was not served from the cache")
+        self.assertEqual(self.get("/?page=2"), "default")
+
+        cache.delete(BUMPED_PREFIX + "catalog")  # DATABASE_REPLICA_PIN_SECONDS later
+        self.assertEqual(self.get("/?page=3"), "replica1")
+
+    def test_other_writes_leave_the_replicas_in_use(self):
+        bump_versions("category:toys")
+        self.assertEqual(self.get("/"), "replica1")
@@ -0,0 +1,131 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from products import catalog, related
+from products.models import Category, Product
+from products.search import get_search_engine
+
+CSV_HEADER = "sku,name,category,price,description,image\n"
+
+
+class CatalogImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.rattle = Product.objects.create(sku="T-1", name="rattle", price="9.99", category=cls.toys)
+        cls.horse = Product.objects.create(
+            sku="T-2", name="wooden-horse", description="Rocks", price="22.98", category=cls.toys
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, text):
+        path = self.directory / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def run_import(self, *args, **options):
+        out = StringIO()
+        call_command("import_catalog", *args, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        for fmt in ("csv", "jsonl"):
+            path = str(self.directory / f"catalog.{fmt}")
+            call_command("export_catalog", path, stderr=StringIO())
+            out = self.run_import(path)
+            self.assertIn("0 new and 0 changed product(s), 2 unchanged, 0 rejected", out)
+
+        out = StringIO()
+        call_command("export_catalog", format="jsonl", category=["toys"], stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[1], {**rows[1], "sku": "T-2", "category": "toys", "price": "22.98"})
+
+    def test_products_created_without_sku_round_trip(self):
+        ball = Product.objects.create(name="ball", price="3.00", category=self.toys)
+        self.assertEqual(ball.sku, f"BTW-{ball.pk:06d}")
+        ball.refresh_from_db()
+        self.assertEqual(ball.sku, f"BTW-{ball.pk:06d}")
+
+        path = str(self.directory / "catalog.csv")
+        call_command("export_catalog", path, stderr=StringIO())
+        out = self.run_import(path)
+        self.assertIn("0 new and 0 changed product(s), 3 unchanged, 0 rejected", out)
+
+    def test_upsert(self):
+        path = self.write(
+            "catalog.csv",
+            CSV_HEADER + "T-1,rattle,toys,12.50,,\nT-2,wooden-horse,toys,22.98,Rocks,\nO-1,sun-hat,outdoor,4.99,,\n",
+        )
+        out = self.run_import(path, batch_size=2)
+        self.assertIn("Imported 1 new and 1 changed product(s), 1 unchanged", out)
+        self.rattle.refresh_from_db()
+        self.assertEqual(str(self.rattle.price), "12.50")
+        self.assertEqual(Product.objects.get(sku="O-1").category, self.outdoor)
+
+    def test_dry_run_and_diff_write_nothing(self):
+        path = self.write("catalog.jsonl", '{"sku": "T-1", "name": "rattle", "category": "outdoor", "price": 9.99}\n')
+        out = self.run_import(path, dry_run=True)
+        self.assertIn("Would import 0 new and 1 changed product(s)", out)
+
+        out = self.run_import(path, diff=True)
+        self.assertIn(f"~ T-1 category: {self.toys.pk} -> {self.outdoor.pk}", out)
+        self.rattle.refresh_from_db()
+        self.assertEqual(self.rattle.category, self.toys)
+
+    def test_invalid_rows_are_reported(self):
+        path = self.write(
+            "catalog.jsonl",
+            '{"sku": "N-1", "name": "ok", "category": "toys", "price": "1.00"}\n'
+            '{"sku": "N-2", "name": "bad", "category": "nowhere", "price": "1.00"}\n'
+            '{"sku": "N-3", "name": "bad", "category": "toys", "price": "-1"}\n'
+            "[1, 2]\n",
+        )
+        err, out = StringIO(), StringIO()
+        with self.assertRaisesMessage(CommandError, "3 row(s) were rejected and nothing was imported"):
+            call_command("import_catalog", path, stdout=out, stderr=err)
+        self.assertIn("Line 2: category: unknown slug 'nowhere'", err.getvalue())
+        self.assertIn("Line 3: price:", err.getvalue())
+        self.assertIn("Line 4: not a JSON object", err.getvalue())
+        self.assertIn("Would import 1 new", out.getvalue())
+        # the valid rows are rolled back as well, the file can be fixed and imported again
+        self.assertFalse(Product.objects.filter(sku="N-1").exists())
+
+        out = self.run_import(path, partial=True)
+        self.assertIn("Imported 1 new and 0 changed product(s), 0 unchanged, 3 rejected", out)
+        self.assertTrue(Product.objects.filter(sku="N-1").exists())
+
+    def test_rejected_rows_keep_the_first_messages(self):
+        path = self.write("catalog.jsonl", "[1, 2]\n" * (catalog.ERRORS_SIZE + 5))
+        with open(path, encoding="utf-8") as file:
+            report = catalog.import_rows(catalog.read_rows(file, "jsonl"), write=False)
+        self.assertEqual(report.rejected, catalog.ERRORS_SIZE + 5)
+        self.assertEqual(report.errors[-1], (catalog.ERRORS_SIZE, "not a JSON object"))
+
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, f"{catalog.ERRORS_SIZE + 5} row(s) were rejected"):
+            call_command("import_catalog", path, stdout=StringIO(), stderr=err)
+        self.assertIn("... and 5 more.", err.getvalue())
+
+    def test_search_and_related_products_follow_the_import(self):
+        path = self.write("catalog.csv", CSV_HEADER + "T-3,squeaky-duck,toys,3.00,,\n")
+        self.run_import(path)
+        duck = Product.objects.get(sku="T-3")
+        self.assertEqual([p.pk for p in get_search_engine().search("squeaky")], [duck.pk])
+        rows = list(related.ranking(duck.category_id))
+        self.assertIn(duck, related.related_to(self.rattle.pk, rows))
+        self.assertIn(self.rattle, related.related_to(duck.pk, rows))
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            self.run_import(self.write("catalog.txt", ""))
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from products import feeds
+from products.models import Category, Comment, Product
+
+
+class ProductFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.rattle = Product.objects.create(sku="T-1", name="rattle", price="9.99", category=cls.toys)
+        # a rating updates the product as well
+        Comment.objects.create(product=cls.rattle, guest_name="G", guest_email="g@example.com", rating=4)
+        cls.horse = Product.objects.create(name="wooden, horse", description='Says "neigh"', price="22.98")
+
+    def get_feed(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_jsonl_feed(self):
+        response, body = self.get_feed("product_feed_jsonl")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.rattle.pk, self.horse.pk])
+        self.assertEqual(list(rows[0]), feeds.FEED_FIELDS)
+        self.assertEqual(rows[0]["url"], reverse("product_detail", args=["toys", self.rattle.pk]))
+        self.assertEqual((rows[0]["avg_rating"], rows[0]["rating_count"]), (4.0, 1))
+        self.assertEqual((rows[1]["category"], rows[1]["url"]), ("", ""))
+
+    def test_csv_feed(self):
+        response, body = self.get_feed("product_feed_csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(rows[1]["name"], "wooden, horse")
+        self.assertEqual(rows[1]["description"], 'Says "neigh"')
+        self.assertEqual(rows[0]["price"], "9.99")
+
+    def test_since(self):
+        Product.objects.filter(pk=self.rattle.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        _, body = self.get_feed("product_feed_jsonl", since=since)
+        self.assertEqual([json.loads(line)["id"] for line in body.splitlines()], [self.horse.pk])
+
+        # a naive timestamp is read in the current time zone
+        _, body = self.get_feed("product_feed_csv", since="2000-01-01T00:00:00")
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_invalid_since(self):
+        for since in ("yesterday", "2024-13-01T00:00:00"):
+            response = self.client.get(reverse("product_feed_jsonl"), {"since": since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_feed_is_streamed_in_blocks(self):
+        lines = feeds.jsonl_lines(feeds.feed_rows(Product.objects.all(), chunk_size=1))
+        blocks = list(feeds.blocks(lines, size=10))
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual(list(feeds.blocks(["a", "b"], size=10)), ["ab"])
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.fragments import STATS_HEADER
+from products.models import Category, Comment, Product
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "fragment-tests"}},
+    CATALOG_CACHE_TIMEOUT=0,
+)
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.products = [
+            Product.objects.create(name=f"Toy {i}", price="9.99", category=cls.toys, description="Fun")
+            for i in range(5)
+        ]
+        cls.list_url = reverse("products_by_category", args=["toys"])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listing_reuses_cached_cards(self):
+        self.assertEqual(self.client.get(self.list_url)[STATS_HEADER], "hits=0 misses=5 rate=0.00")
+        resp = self.client.get(self.list_url)
+        self.assertEqual(resp[STATS_HEADER], "hits=5 misses=0 rate=1.00")
+        self.assertContains(resp, "Toy 4")
+
+    def test_rating_change_refreshes_only_that_card(self):
+        self.client.get(self.list_url)
+        Comment.objects.create(product=self.products[0], guest_name="G", guest_email="g@example.com", rating=4)
+        resp = self.client.get(self.list_url)
+        self.assertEqual(resp[STATS_HEADER], "hits=4 misses=1 rate=0.80")
+        self.assertContains(resp, "<strong>4.0</strong>", html=True)
+
+    def test_product_save_refreshes_its_card(self):
+        self.client.get(self.list_url)
+        product = self.products[1]
+        product.name = "Renamed"
+        product.save()
+        self.assertContains(self.client.get(self.list_url), "Renamed")
+
+    def test_detail_counts_related_cards(self):
+        resp = self.client.get(reverse("product_detail", args=["toys", self.products[0].pk]))
+        self.assertEqual(resp[STATS_HEADER], "hits=0 misses=4 rate=0.00")
+
+    def test_star_rating(self):
+        html = Template("{% load catalog %}{% star_rating value %}").render(Context({"value": 3.7}))
+        self.assertEqual(html.count("&#9733;"), 3)
+        self.assertEqual(html.count("&#9734;"), 2)
@@ -0,0 +1,128 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from products import images
+from products.models import Category, Product
+
+
+def png_bytes(size=(640, 480), mode="RGBA"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 40, 40, 255) if mode == "RGBA" else (200, 40, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.toys = Category.objects.create(name="Toys", slug="toys")
+        default_storage.save("imgs/products/ball.png", ContentFile(png_bytes()))
+
+    def test_derivatives_are_generated_on_save(self):
+        product = Product.objects.create(name="Ball", price="5.00", category=self.toys, image="imgs/products/ball.png")
+        product.refresh_from_db()
+        self.assertEqual(len(product.image_hash), 16)
+        for name in images.derivative_names(product.image_hash):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(images.derivative_name(product.image_hash, "card", 2, "webp")) as file:
+            self.assertEqual(Image.open(file).size, (600, 460))
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        product = Product.objects.create(name="Ball", price="5.00", category=self.toys, image="imgs/products/ball.png")
+        image_hash, derivatives, _ = images.process_image(product.image.name, product.image_hash)
+        self.assertEqual(image_hash, product.image_hash)
+        self.assertIsNone(derivatives)
+
+    def test_broken_image_falls_back_to_original(self):
+        default_storage.save("imgs/products/broken.png", ContentFile(b"not an image"))
+        with self.assertLogs("products.signals", "ERROR"):
+            product = Product.objects.create(
+                name="X", price="1.00", category=self.toys, image="imgs/products/broken.png"
+            )
+        self.assertEqual(product.image_hash, "")
+        html = Template('{% load catalog %}{% product_picture product "card" %}').render(Context({"product": product}))
+        self.assertIn("broken.png", html)
+        self.assertNotIn("<picture>", html)
+
+    def test_picture_tag_emits_srcset(self):
+        product = Product.objects.create(name="Ball", price="5.00", category=self.toys, image="imgs/products/ball.png")
+        html = Template('{% load catalog %}{% product_picture product "card" %}').render(Context({"product": product}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f"{product.image_hash}/card-600x460.webp 600w", html)
+        self.assertIn(f'src="/media/imgs/derivatives/{product.image_hash}/card-300x230.jpeg"', html)
+        self.assertIn('sizes="300px"', html)
+
+    def run_command(self, **options):
+        out = StringIO()
+        options.setdefault("progress_file", Path(self.media_root) / "progress")
+        call_command("generate_images", workers=2, chunk_size=2, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_generate_images_command(self):
+        product = Product.objects.create(name="Ball", price="5.00", category=self.toys)
+        Product.objects.filter(pk=product.pk).update(image="imgs/products/ball.png")
+        self.assertIn("Generated derivatives for 1 image(s), 0 unchanged, 0 failed", self.run_command())
+        self.assertIn("images/s", self.run_command())
+        self.assertIn("for 0 image(s), 1 unchanged", self.run_command())
+        self.assertIn("for 1 image(s), 0 unchanged", self.run_command(force=True))
+
+    def test_force_replaces_stored_derivatives(self):
+        product = Product.objects.create(name="Ball", price="5.00", category=self.toys, image="imgs/products/ball.png")
+        product.refresh_from_db()
+        name = images.derivative_name(product.image_hash, "card", 1, "jpeg")
+        # as if the derivative was encoded with other options
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(b"stale"))
+
+        self.run_command()
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), b"stale")
+        self.assertIn("for 1 image(s), 0 unchanged", self.run_command(force=True))
+        with default_storage.open(name) as file:
+            self.assertEqual(Image.open(file).size, (300, 230))
+        self.assertEqual(
+            sorted(Path(self.media_root, name).parent.iterdir()),
+            sorted(Path(self.media_root, n) for n in images.derivative_names(product.image_hash)),
+        )
+
+    def test_generate_images_resumes_interrupted_run(self):
+        products = [Product.objects.create(name=f"P{i}", price="5.00", category=self.toys) for i in range(3)]
+        Product.objects.update(image="imgs/products/ball.png")
+        progress = Path(self.media_root) / "progress"
+        progress.write_text(f"{products[0].pk} {products[1].pk}\n")
+
+        out = self.run_command()
+        self.assertIn("Resuming, 2 image(s)", out)
+        self.assertIn("Generated derivatives for 1 image(s)", out)
+        self.assertFalse(progress.exists())
+
+    def test_generate_images_keeps_progress_of_failed_run(self):
+        default_storage.save("imgs/products/broken.png", ContentFile(b"not an image"))
+        good = Product.objects.create(name="Good", price="5.00", category=self.toys)
+        bad = Product.objects.create(name="Bad", price="5.00", category=self.toys)
+        Product.objects.filter(pk=good.pk).update(image="imgs/products/ball.png")
+        Product.objects.filter(pk=bad.pk).update(image="imgs/products/broken.png")
+
+        self.assertIn("1 failed", self.run_command())
+        self.assertEqual((Path(self.media_root) / "progress").read_text().split(), [str(good.pk)])
@@ -0,0 +1,120 @@
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from btw_app import metrics
+from btw_app.instrumentation import QueryRecorder
+from products.models import Category, Product
+
+
+def sample(text, line):
+    """The value of the sample ``line`` (name and labels) in the exposition ``text``."""
+    match = re.search(rf"^{re.escape(line)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        toys = Category.objects.create(name="Toys", slug="toys")
+        Product.objects.create(name="Rattle", price="9.99", category=toys)
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def scrape(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_requests_are_recorded_by_view(self):
+        self.client.get(reverse("products"))
+        self.client.get(reverse("products"))
+        self.client.get("/no-such-page/")
+        text = self.scrape()
+
+        self.assertEqual(sample(text, 'btw_http_requests_total{view="products",method="GET",status="200"}'), 2)
+        self.assertEqual(sample(text, 'btw_http_requests_total{view="unresolved",method="GET",status="404"}'), 1)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_count{view="products"}'), 2)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_bucket{view="products",le="+Inf"}'), 2)
+        self.assertGreater(sample(text, 'btw_db_queries_total{view="products"}'), 0)
+        self.assertGreater(sample(text, 'btw_template_render_duration_seconds_total{view="products"}'), 0)
+        self.assertGreater(sample(text, 'btw_http_response_size_bytes_sum{view="products"}'), 0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "metrics-tests"}},
+    )
+    def test_cache_hits_and_misses(self):
+        self.client.get(reverse("products"))
+        self.client.get(reverse("products"))
+        text = self.scrape()
+
+        self.assertEqual(sample(text, 'btw_cache_requests_total{view="products",cache="page",result="miss"}'), 1)
+        self.assertEqual(sample(text, 'btw_cache_requests_total{view="products",cache="page",result="hit"}'), 1)
+        self.assertEqual(sample(text, 'btw_cache_requests_total{view="products",cache="fragment",result="miss"}'), 1)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def record(self, view, duration):
+        request = RequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"view_name": view})()
+        recorder = QueryRecorder()
+        recorder.add("default", "SELECT 1", 0.002)
+        metrics.observe_request(request, metrics.HttpResponse("x" * 2000), recorder, duration)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for duration in (0.001, 0.005, 0.3, 20):
+            self.record("products", duration)
+        text = metrics.render(*metrics.merge([metrics.registry.snapshot()]))
+
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_bucket{view="products",le="0.005"}'), 2)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_bucket{view="products",le="0.5"}'), 3)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_bucket{view="products",le="10.0"}'), 3)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_bucket{view="products",le="+Inf"}'), 4)
+        self.assertAlmostEqual(sample(text, 'btw_http_request_duration_seconds_sum{view="products"}'), 20.306)
+        self.assertEqual(sample(text, 'btw_http_response_size_bytes_bucket{view="products",le="1024"}'), 0)
+        self.assertEqual(sample(text, 'btw_http_response_size_bytes_bucket{view="products",le="4096"}'), 4)
+
+    def test_processes_are_added_up(self):
+        # two workers, one of which exited and was folded into the archive
+        for pid in (101, 102):
+            metrics.registry.reset()
+            self.record("products", 0.01)
+            self.record("product_detail", 0.02)
+            metrics._write(self.directory / f"{pid}.json", metrics.registry.snapshot())
+        metrics.mark_process_dead(self.directory, 101)
+        self.assertEqual(sorted(path.name for path in self.directory.glob("*.json")), ["102.json", "archive.json"])
+
+        text = metrics.render(*metrics.collect(self.directory))
+        self.assertEqual(sample(text, 'btw_http_requests_total{view="products",method="GET",status="200"}'), 2)
+        self.assertEqual(sample(text, 'btw_db_queries_total{view="product_detail"}'), 2)
+        self.assertEqual(sample(text, 'btw_http_request_duration_seconds_count{view="product_detail"}'), 2)
+
+    def test_flushed_by_a_thread(self):
+        with override_settings(METRICS_DIR=str(self.directory), METRICS_FLUSH_SECONDS=0.01):
+            self.record("products", 0.01)
+            path = self.directory / f"{os.getpid()}.json"
+            deadline = time.monotonic() + 5
+            while not path.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(metrics._read(path)["counters"][0][2], 1)
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(metrics._labels([("view", 'a"b\\c')]), '{view="a\\"b\\\\c"}')
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from products import views
+from products.models import Category, Comment, Product
+from products.pagination import InvalidCursor, decode_cursor, encode_cursor, paginate
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.products = []
+        for i in range(7):
+            # duplicate names and prices so the id tie-breaker matters
+            cls.products.append(Product.objects.create(name=f"Product {i % 3}", price=f"{i % 4}.50", category=cls.toys))
+        cls.other = Product.objects.create(name="Sun Hat", price="4.99", category=cls.outdoor)
+        Comment.objects.create(product=cls.products[2], guest_name="G", guest_email="g@example.com", rating=5)
+        Comment.objects.create(product=cls.products[4], guest_name="G", guest_email="g@example.com", rating=3)
+
+    def walk(self, url, sort, page_size):
+        seen, cursor = [], None
+        with mock.patch.object(views, "PRODUCTS_PER_PAGE", page_size):
+            while True:
+                params = {"sort": sort}
+                if cursor:
+                    params["cursor"] = cursor
+                page = self.client.get(url, params).context["page"]
+                seen.extend(p.pk for p in page)
+                if not page.has_next:
+                    return seen
+                cursor = page.next_cursor
+
+    def test_forward_walk_matches_full_ordering_for_every_sort(self):
+        url = reverse("products_by_category", args=[self.toys.slug])
+        for sort, ordering in views.PRODUCT_SORTS.items():
+            with self.subTest(sort=sort):
+                seen = self.walk(url, sort, page_size=3)
+                products = Product.objects.filter(category=self.toys)
+                expected = list(products.order_by(*ordering).values_list("pk", flat=True))
+                self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        ordering = views.PRODUCT_SORTS["price"]
+        queryset = Product.objects.all()
+        first = paginate(queryset, ordering, page_size=3)
+        second = paginate(queryset, ordering, first.next_cursor, page_size=3)
+        back = paginate(queryset, ordering, second.previous_cursor, page_size=3)
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_category_filter_is_kept(self):
+        url = reverse("products_by_category", args=[self.outdoor.slug])
+        resp = self.client.get(url)
+        self.assertEqual([p.pk for p in resp.context["products"]], [self.other.pk])
+        self.assertFalse(resp.context["page"].has_other_pages)
+
+    def test_invalid_cursor_and_sort_fall_back_to_first_page(self):
+        resp = self.client.get(reverse("products"), {"sort": "bogus", "cursor": "not-a-cursor"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["sort"], views.DEFAULT_PRODUCT_SORT)
+        self.assertFalse(resp.context["page"].has_previous)
+
+    def test_cursor_round_trip_and_validation(self):
+        token = encode_cursor("n", ["Product 1", 3])
+        self.assertEqual(decode_cursor(token, ["name", "id"]), ("n", ["Product 1", 3]))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, ["-created_at", "-avg_rating", "-id"])
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("%%%", ["name", "id"])
+
+    def test_tampered_cursor_values_are_rejected(self):
+        # well-formed cursors whose values do not fit the sort columns
+        tampered = {
+            "price": ["abc", 1],
+            "newest": ["zzz", 1],
+            "rating": ["x", "y", "z"],
+            "name": ["a", "notint"],
+        }
+        for sort, values in tampered.items():
+            with self.subTest(sort=sort):
+                cursor = encode_cursor("n", values)
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor, views.PRODUCT_SORTS[sort], Product)
+                resp = self.client.get(reverse("products"), {"sort": sort, "cursor": cursor})
+                self.assertEqual(resp.status_code, 200)
+                self.assertFalse(resp.context["page"].has_previous)
+                resp = self.client.get(reverse("api_products"), {"sort": sort, "cursor": cursor})
+                self.assertEqual(resp.status_code, 400)
+
+    def test_tampered_review_cursor_is_rejected(self):
+        product = self.products[2]
+        cursor = encode_cursor("n", ["x", 1])
+        url = reverse("product_reviews", args=[self.toys.slug, product.pk])
+        self.assertEqual(self.client.get(url, {"cursor": cursor}).status_code, 400)
+        url = reverse("api_product_reviews", args=[product.pk])
+        self.assertEqual(self.client.get(url, {"cursor": cursor}).status_code, 400)
+        # a NULL or an id out of range of the column
+        for values in ([None, 1], ["2024-01-01T00:00:00+00:00", 2**70]):
+            with self.subTest(values=values):
+                self.assertEqual(self.client.get(url, {"cursor": encode_cursor("n", values)}).status_code, 400)
@@ -0,0 +1,37 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from products.management.commands.profile_startup import parse_importtime
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |       4200 | django.db
+Allowed Hosts: something else on stderr
+"""
+
+
+class ProfileStartupTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        self.assertEqual(parse_importtime(IMPORTTIME), [("_io", 120, 120), ("django.db", 1500, 4200)])
+
+    def test_reports_the_startup_breakdown(self):
+        out = StringIO()
+        call_command("profile_startup", url="", repeat=1, top=3, budget_ms=60_000, stdout=out)
+        output = out.getvalue()
+        self.assertIn("django.setup()", output)
+        self.assertNotIn("first request", output)
+        self.assertIn("products", output.split("AppConfig.ready():")[1])
+        self.assertIn("django", output.split("Import time by package")[1])
+        self.assertIn("Within the budget of 60000 ms.", output)
+
+    def test_fails_over_the_budget(self):
+        with self.assertRaisesMessage(CommandError, "over the budget of 1 ms"):
+            call_command("profile_startup", url="", repeat=1, top=1, budget_ms=1, stdout=StringIO())
+
+    def test_repeat_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            call_command("profile_startup", repeat=0, stdout=StringIO())
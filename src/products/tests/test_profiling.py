@@ -0,0 +1,111 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from btw_app import profiling
+from btw_app.profiling import profile_block, profiled
+from btw_app.utils import log_execution
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        profiling.clear()
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+
+    def test_disabled_calls_are_not_recorded(self):
+        @profiled
+        def add(a, b):
+            return a + b
+
+        profiling.disable()
+        self.assertEqual(add(1, 2), 3)
+        with profile_block("disabled.block"):
+            pass
+        self.assertEqual(profiling.recent(), [])
+
+    def test_calls_are_recorded(self):
+        @profiled
+        def add(a, b):
+            return a + b
+
+        self.assertEqual(add(1, 2), 3)
+        [record] = profiling.recent()
+        self.assertEqual(record.name, f"{__name__}.ProfilingTests.test_calls_are_recorded.<locals>.add")
+        self.assertTrue(record.ok)
+        self.assertGreater(record.duration_ns, 0)
+
+    def test_exceptions_propagate(self):
+        @profiled("profiling.fails")
+        def fail():
+            raise ValueError("50% broken")
+
+        with self.assertRaisesMessage(ValueError, "50% broken"):
+            fail()
+        [record] = profiling.recent("profiling.fails")
+        self.assertFalse(record.ok)
+        self.assertEqual(record.error, "ValueError: 50% broken")
+
+    def test_log_execution_no_longer_swallows_failures(self):
+        @log_execution
+        def test_something():
+            raise AssertionError("failed")
+
+        with self.assertRaises(AssertionError):
+            test_something()
+
+    def test_sampling(self):
+        @profiled(sample=3)
+        def work():
+            pass
+
+        for _ in range(9):
+            work()
+        self.assertEqual(len(profiling.recent()), 3)
+
+    def test_coroutine_functions(self):
+        @profiled
+        async def view(request):
+            return "response"
+
+        self.assertEqual(asyncio.run(view(None)), "response")
+        self.assertEqual(len(profiling.recent()), 1)
+
+    def test_block(self):
+        with profile_block("profiling.block"):
+            sum(range(1000))
+        self.assertEqual(profiling.recent()[0].name, "profiling.block")
+
+    def test_slow_calls_are_warnings_with_their_profile(self):
+        @profiled(slow_ms=0, capture="cprofile")
+        def slow():
+            return sorted(range(1000), reverse=True)
+
+        with self.assertLogs("btw_app.profiling", "WARNING") as logs:
+            slow()
+        [record] = profiling.recent()
+        self.assertTrue(record.slow)
+        self.assertIn("sorted", record.profile)
+        self.assertEqual(logs.records[0].timing["name"], record.name)
+
+    def test_fast_calls_keep_no_capture(self):
+        @profiled(slow_ms=60_000, capture="tracemalloc")
+        def fast():
+            return [0] * 10
+
+        fast()
+        self.assertEqual(profiling.recent()[0].profile, "")
+
+    def test_tracemalloc_capture(self):
+        @profiled(slow_ms=0, capture="tracemalloc")
+        def allocate():
+            return [bytes(1024) for _ in range(100)]
+
+        with self.assertLogs("btw_app.profiling", "WARNING"):
+            allocate()
+        self.assertRegex(profiling.recent()[0].profile, r"^peak \d+")
+        self.assertNotIn("tracemalloc.py", profiling.recent()[0].profile)
+
+    def test_unknown_capture(self):
+        with self.assertRaisesMessage(ValueError, "capture must be one of"):
+            profiled(capture="perf")(lambda: None)
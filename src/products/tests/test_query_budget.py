@@ -0,0 +1,103 @@
+import re
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from btw_app.instrumentation import (
+    QueryBudgetExceeded,
+    QueryBudgetMiddleware,
+    QueryBudgetTestMixin,
+    query_budget,
+    query_shape,
+)
+from products.models import Category, Product
+from products.views import product_detail
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        Product.objects.bulk_create(Product(name=f"toy-{i}", price="1.00", category=cls.toys) for i in range(8))
+
+    def run_view(self, view, method="get"):
+        request = getattr(RequestFactory(), method)("/")
+        middleware = QueryBudgetMiddleware(view)
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    def test_views_declare_budgets(self):
+        self.assertEqual(product_detail.query_budget.max_queries, 6)
+        self.assertEqual(product_detail.query_budget.for_method("POST").max_queries, 20)
+
+    def test_post_budget(self):
+        @query_budget(1, post=2)
+        def view(request):
+            Category.objects.count()
+            Product.objects.count()
+            return HttpResponse()
+
+        self.assertEqual(self.run_view(view, "post").status_code, 200)
+        with self.assertRaisesMessage(QueryBudgetExceeded, "2 queries, the budget is 1"):
+            self.run_view(view)
+
+    def test_over_budget_fails(self):
+        @query_budget(1)
+        def view(request):
+            Category.objects.count()
+            Product.objects.count()
+            return HttpResponse()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "2 queries, the budget is 1"):
+            self.run_view(view)
+
+    def test_n_plus_one_fails(self):
+        def view(request):
+            # the category of every product is loaded by a query of its own
+            return HttpResponse(", ".join(product.category.name for product in Product.objects.all()))
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "8 times (possible N+1)"):
+            self.run_view(view)
+
+    @override_settings(QUERY_BUDGETS="log")
+    def test_log_mode_only_warns(self):
+        @query_budget(0)
+        def view(request):
+            Product.objects.count()
+            return HttpResponse()
+
+        with self.assertLogs("btw_app.instrumentation", "WARNING"):
+            self.assertEqual(self.run_view(view).status_code, 200)
+
+    def test_in_lists_of_any_length_have_one_shape(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s)'),
+        )
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        resp = self.client.get(reverse("products"))
+        self.assertRegex(
+            resp["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        template_ms = float(re.search(r"tpl;dur=([\d.]+)", resp["Server-Timing"]).group(1))
+        self.assertGreater(template_ms, 0)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_off(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("products")))
+
+    def test_mixin_assertion(self):
+        with self.assertQueryBudget(max_queries=2):
+            list(Product.objects.select_related("category"))
+        with self.assertRaisesMessage(AssertionError, "possible N+1"):
+            with self.assertQueryBudget():
+                [product.category for product in Product.objects.all()]
+
+    def test_mixin_sees_the_queries_of_requests(self):
+        with self.assertQueryBudget() as recorder:
+            self.client.get(reverse("products"))
+        self.assertGreater(len(recorder.queries), 0)
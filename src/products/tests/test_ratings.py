@@ -0,0 +1,124 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from products.models import Category, Comment, Product
+from products.ratings import recompute_ratings
+
+User = get_user_model()
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Toys", slug="toys")
+        cls.product = Product.objects.create(name="Blue Rattle", price="9.99", category=cls.category)
+        cls.other = Product.objects.create(name="Red Rattle", price="5.00", category=cls.category)
+        cls.user = User.objects.create_user(username="tester", password="pass1234")
+
+    def assertAggregates(self, product, rating_sum, rating_count):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_sum, product.rating_count), (rating_sum, rating_count))
+        self.assertAlmostEqual(product.avg_rating, rating_sum / rating_count if rating_count else 0)
+
+    def test_create_update_and_delete_keep_aggregates_in_sync(self):
+        comment = Comment.objects.create(product=self.product, user=self.user, rating=4)
+        Comment.objects.create(product=self.product, guest_name="G", guest_email="g@example.com", rating=1)
+        self.assertAggregates(self.product, 5, 2)
+
+        comment.rating = 2
+        comment.save()
+        self.assertAggregates(self.product, 3, 2)
+
+        comment.delete()
+        self.assertAggregates(self.product, 1, 1)
+
+    def test_histogram_follows_rating_changes(self):
+        comment = Comment.objects.create(product=self.product, user=self.user, rating=4)
+        Comment.objects.create(product=self.product, guest_name="G", guest_email="g@example.com", rating=4)
+        comment.rating = 1
+        comment.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_histogram, [(5, 0, 0), (4, 1, 50), (3, 0, 0), (2, 0, 0), (1, 1, 50)])
+
+        comment.delete()
+        self.product.refresh_from_db()
+        self.assertEqual([count for _, count, _ in self.product.rating_histogram], [0, 1, 0, 0, 0])
+
+    def test_detail_page_renders_histogram(self):
+        Comment.objects.create(product=self.product, user=self.user, rating=5)
+        resp = self.client.get(f"/category/{self.category.slug}/{self.product.pk}/")
+        self.assertContains(resp, 'style="width: 100%"')
+
+    def test_update_of_instance_not_loaded_from_db(self):
+        comment = Comment.objects.create(product=self.product, user=self.user, rating=5)
+        stale = Comment(pk=comment.pk, product=self.product, user=self.user, rating=3, created_at=comment.created_at)
+        stale.save()
+        self.assertAggregates(self.product, 3, 1)
+
+    def test_moving_a_comment_to_another_product(self):
+        comment = Comment.objects.create(product=self.product, user=self.user, rating=5)
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.product = self.other
+        comment.save()
+        self.assertAggregates(self.product, 0, 0)
+        self.assertAggregates(self.other, 5, 1)
+
+    def test_queryset_delete_reverts_aggregates(self):
+        for rating in (1, 2, 3):
+            Comment.objects.create(product=self.product, guest_name="G", guest_email="g@example.com", rating=rating)
+        Comment.objects.filter(rating__gte=2).delete()
+        self.assertAggregates(self.product, 1, 1)
+
+    def test_listing_does_not_join_comments(self):
+        Comment.objects.create(product=self.product, user=self.user, rating=5)
+        with self.assertNumQueries(2):
+            resp = self.client.get("/", {"sort": "rating"})
+        self.assertEqual(resp.context["products"][0], self.product)
+
+    def test_rating_changes_move_updated_at(self):
+        # the feed's ?since= only sees products whose updated_at moved
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        self.product.refresh_from_db()
+        before = self.product.updated_at
+        Comment.objects.create(product=self.product, user=self.user, rating=4)
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at, before)
+
+        Product.objects.filter(pk=self.product.pk).update(rating_count=0, updated_at=before)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at, before)
+
+    def test_recompute_writes_page_by_page(self):
+        Comment.objects.create(product=self.product, user=self.user, rating=4)
+        Comment.objects.create(product=self.other, user=self.user, rating=2)
+        Product.objects.update(rating_sum=0, rating_count=0, avg_rating=0)
+
+        report = recompute_ratings(batch_size=1, write=False)
+        self.assertEqual(report.stale, 2)
+        self.assertEqual([pk for pk, _, _ in report.sample], [self.product.pk, self.other.pk])
+        self.assertEqual(recompute_ratings(batch_size=1).stale, 2)
+        self.assertAggregates(self.product, 4, 1)
+        self.assertAggregates(self.other, 2, 1)
+        self.assertEqual(recompute_ratings(batch_size=1).stale, 0)
+
+    def test_rebuild_ratings_verifies_and_repairs(self):
+        Comment.objects.create(product=self.product, user=self.user, rating=4)
+        Comment.objects.create(product=self.other, user=self.user, rating=2)
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=0, rating_count=0, avg_rating=0, ratings_4=0)
+        Product.objects.filter(pk=self.other.pk).update(ratings_2=0, ratings_3=1)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ratings", "--verify", stdout=StringIO())
+
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertAggregates(self.product, 4, 1)
+        self.assertEqual(self.product.ratings_4, 1)
+        self.other.refresh_from_db()
+        self.assertEqual((self.other.ratings_2, self.other.ratings_3), (1, 0))
+        call_command("rebuild_ratings", "--verify", stdout=StringIO())
@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products import related
+from products.models import Category, Comment, Product, RelatedRanking
+
+
+def related_ids(product):
+    product.refresh_from_db()
+    return [other.pk for other in related.related_to(product.pk, related.ranking(product.category_id))]
+
+
+class RelatedProductTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.products = [Product.objects.create(name=f"Toy {i:02}", price="9.99", category=cls.toys) for i in range(10)]
+
+    def rate(self, product, rating):
+        return Comment.objects.create(product=product, guest_name="G", guest_email="g@example.com", rating=rating)
+
+    def test_rows_follow_the_category_ranking(self):
+        first, second, *rest = self.products
+        self.assertEqual(related_ids(first), [p.pk for p in self.products[1:9]])
+        self.assertEqual(related_ids(rest[-1]), [p.pk for p in self.products[:8]])
+
+    def test_rating_moves_product_up(self):
+        last = self.products[-1]
+        self.rate(last, 5)
+        self.assertEqual(related_ids(self.products[0])[0], last.pk)
+        self.assertNotIn(last.pk, related_ids(last))
+        self.assertEqual(len(related_ids(last)), related.RELATED_LIMIT)
+
+    def test_moving_and_deleting_products(self):
+        moved = self.products[0]
+        moved.category = self.outdoor
+        moved.save()
+        self.assertEqual(related_ids(moved), [])
+        self.assertNotIn(moved.pk, related_ids(self.products[1]))
+
+        for product in self.products[4:]:
+            product.delete()
+        self.assertEqual(related_ids(self.products[1]), [self.products[2].pk, self.products[3].pk])
+
+    def test_bulk_delete_of_rated_products(self):
+        for product in self.products:
+            self.rate(product, 3)
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:5]]).delete()
+        self.assertFalse(RelatedRanking.objects.exclude(product__in=Product.objects.all()).exists())
+        self.assertEqual(related_ids(self.products[5]), [p.pk for p in self.products[6:]])
+
+    def test_sync_only_writes_changes(self):
+        self.assertEqual(related.sync_category(self.toys.pk), 0)
+        RelatedRanking.objects.filter(category=self.toys, rank=0).update(product=self.products[9])
+        self.assertEqual(related.sync_category(self.toys.pk), 1)
+        self.assertEqual(related_ids(self.products[0])[0], self.products[1].pk)
+
+    def test_rebuild_command(self):
+        RelatedRanking.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_related", stdout=out)
+        # one ranking of the category, not one per product
+        self.assertIn("9 row(s) changed", out.getvalue())
+        self.assertEqual(RelatedRanking.objects.count(), related.RELATED_LIMIT + 1)
+
+    def test_a_rating_costs_the_same_in_any_category_size(self):
+        def queries_of_a_rating():
+            with CaptureQueriesContext(connection) as queries:
+                self.rate(self.products[-1], 4)
+            return len(queries)
+
+        small = queries_of_a_rating()
+        Product.objects.bulk_create(Product(name=f"Extra {i}", price="1.00", category=self.toys) for i in range(200))
+        self.assertEqual(queries_of_a_rating(), small)
+
+    def test_detail_view_reads_ranked_rows(self):
+        self.rate(self.products[5], 4)
+        resp = self.client.get(reverse("product_detail", args=["toys", self.products[0].pk]))
+        self.assertEqual(resp.context["related_products"][0], self.products[5])
+        self.assertEqual(len(resp.context["related_products"]), related.RELATED_LIMIT)
@@ -0,0 +1,80 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from btw_app.routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, pin_to_primary, weighted_sequence
+from products.models import Comment, Product
+
+REPLICAS = {"replica1": 3, "replica2": 1}
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter(replicas=REPLICAS)
+
+    def test_weighted_round_robin(self):
+        reads = [self.router.db_for_read(Product) for _ in range(40)]
+        self.assertEqual(Counter(reads), {"replica1": 30, "replica2": 10})
+        # spread evenly, the lighter replica never gets two reads in a row
+        self.assertNotIn(("replica2", "replica2"), set(zip(reads, reads[1:])))
+
+    def test_weighted_sequence_skips_drained_replicas(self):
+        self.assertEqual(weighted_sequence({"replica1": 2, "replica2": 0}), ["replica1", "replica1"])
+        self.assertIsNone(ReplicaRouter(replicas={"replica1": 0}).db_for_read(Product))
+
+    def test_routed_apps(self):
+        self.assertIn(self.router.db_for_read(User), REPLICAS)
+        self.assertIn(self.router.db_for_read(Comment), REPLICAS)
+        self.assertIsNone(self.router.db_for_read(Session))
+        self.assertEqual(self.router.db_for_write(Product), "default")
+
+    def test_pinned_reads_use_the_primary(self):
+        with pin_to_primary():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+        self.assertIn(self.router.db_for_read(Product), REPLICAS)
+
+    def test_without_replicas_everything_uses_the_primary(self):
+        router = ReplicaRouter(replicas={})
+        self.assertIsNone(router.db_for_read(Product))
+        self.assertIsNone(router.db_for_write(Product))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica1", "products"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "products"))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, DATABASE_REPLICA_PIN_SECONDS=7)
+class ReplicaPinMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        router = ReplicaRouter(replicas=REPLICAS)
+        self.used = []
+
+        def view(request):
+            self.used.append(router.db_for_read(Product))
+            return HttpResponse()
+
+        self.middleware = ReplicaPinMiddleware(view)
+        self.factory = RequestFactory()
+
+    def test_reads_of_a_get_go_to_the_replicas(self):
+        response = self.middleware(self.factory.get("/"))
+        self.assertIn(self.used[0], REPLICAS)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_a_write_pins_the_visitor_to_the_primary(self):
+        response = self.middleware(self.factory.post("/"))
+        self.assertEqual(self.used, ["default"])
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 7)
+
+        request = self.factory.get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        self.middleware(request)
+        self.assertEqual(self.used, ["default", "default"])
+
+    @override_settings(DATABASE_REPLICAS={})
+    def test_nothing_is_pinned_without_replicas(self):
+        response = self.middleware(self.factory.post("/"))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
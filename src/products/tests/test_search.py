@@ -0,0 +1,99 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase
+from django.urls import reverse
+
+from products.models import Category, Product
+from products.search import (
+    FTS_TABLE,
+    BasicSearchEngine,
+    PostgresSearchEngine,
+    SQLiteFTSEngine,
+    get_search_engine,
+    reset_search_engines,
+)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys", slug="toys")
+        cls.outdoor = Category.objects.create(name="Outdoor", slug="outdoor")
+        cls.rattle = Product.objects.create(name="rattle-blue", price="11.00", category=cls.toys)
+        cls.horse = Product.objects.create(
+            name="wooden-horse", description="Rocks like a rattle", price="22.98", category=cls.toys
+        )
+        cls.hat = Product.objects.create(
+            name="sun-hat", description="Wooden buttons", price="4.99", category=cls.outdoor
+        )
+
+    def search(self, query, **filters):
+        return [p.pk for p in get_search_engine().search(query, **filters)]
+
+    def test_sqlite_uses_fts_engine(self):
+        self.assertIsInstance(get_search_engine(), SQLiteFTSEngine)
+
+    def test_engine_is_picked_again_when_the_database_changes(self):
+        self.addCleanup(reset_search_engines)
+        reset_search_engines()
+        # as if the migrations had not run yet
+        with mock.patch.object(connection.introspection, "table_names", return_value=[]):
+            self.assertIsInstance(get_search_engine(), BasicSearchEngine)
+        connection_created.send(sender=type(connection), connection=connection)
+        engine = get_search_engine()
+        self.assertIsInstance(engine, SQLiteFTSEngine)
+        # a working engine is kept for new connections
+        connection_created.send(sender=type(connection), connection=connection)
+        self.assertIs(get_search_engine(), engine)
+        setting_changed.send(sender=None, setting="DATABASES", value=None, enter=True)
+        self.assertIsNot(get_search_engine(), engine)
+
+    def test_name_hits_rank_before_description_hits(self):
+        self.assertEqual(self.search("rattle"), [self.rattle.pk, self.horse.pk])
+        self.assertEqual(self.search("wooden"), [self.horse.pk, self.hat.pk])
+
+    def test_prefix_matching_and_filters(self):
+        self.assertEqual(self.search("woo"), [self.horse.pk, self.hat.pk])
+        self.assertEqual(self.search("woo", category_id=self.outdoor.pk), [self.hat.pk])
+        self.assertEqual(self.search("woo", max_price="10"), [self.hat.pk])
+        self.assertEqual(self.search("woo", min_price="10"), [self.horse.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('rattle" OR "hat'), [])
+        self.assertEqual(self.search("NEAR(*"), [])
+
+    def test_postgres_tsquery_quotes_every_term(self):
+        self.assertEqual(PostgresSearchEngine.tsquery(["wooden", "ho"]), "'wooden' & 'ho':*")
+        self.assertEqual(PostgresSearchEngine.tsquery(["hat"], prefix=False), "'hat'")
+
+    def test_index_follows_product_changes(self):
+        self.rattle.name = "shaker-blue"
+        self.rattle.save()
+        self.assertEqual(self.search("shaker"), [self.rattle.pk])
+        self.assertEqual(self.search("rattle"), [self.horse.pk])
+        self.horse.delete()
+        self.assertEqual(self.search("rattle"), [])
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(self.search("hat"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("hat"), [self.hat.pk])
+
+    def test_basic_engine_matches_fts_results(self):
+        engine = BasicSearchEngine()
+        self.assertEqual([p.pk for p in engine.search("rattle")], [self.rattle.pk, self.horse.pk])
+        self.assertEqual([p.pk for p in engine.search("wooden", category_id=self.outdoor.pk)], [self.hat.pk])
+
+    def test_search_view(self):
+        resp = self.client.get(reverse("search"), {"q": "rattle", "category": "toys", "max_price": "20"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(list(resp.context["products"]), [self.rattle])
+        resp = self.client.get(reverse("search"), {"q": "rattle", "category": "unknown"})
+        self.assertEqual(list(resp.context["products"]), [])
@@ -0,0 +1,70 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from products.models import Category, Comment, Product, RelatedRanking
+from products.ratings import recompute_ratings
+
+
+def seed(**options):
+    out = StringIO()
+    call_command("seed_db", stdout=out, **options)
+    return out.getvalue()
+
+
+class SeedDbTests(TestCase):
+    def test_default_seeds_fixed_catalog_once(self):
+        seed()
+        self.assertEqual(Category.objects.count(), 4)
+        self.assertEqual(Product.objects.count(), 15)
+        self.assertEqual(Product.objects.get(name="pacifier-blue").category.slug, "boys")
+
+        out = seed()
+        self.assertIn("0 Products created successfully.", out)
+        self.assertEqual(Product.objects.count(), 15)
+
+    def test_generated_data(self):
+        out = seed(users=20, products=50, comments=2000, batch_size=300)
+        self.assertIn("2000 comments created", out)
+        self.assertIn("rows/s", out)
+        self.assertEqual(get_user_model().objects.count(), 20)
+        self.assertEqual(Product.objects.count(), 65)
+        self.assertEqual(Comment.objects.count(), 2000)
+        self.assertGreater(Comment.objects.filter(user__isnull=False).count(), 0)
+
+        # derived data is rebuilt, ratings are skewed towards the top
+        self.assertEqual(recompute_ratings(write=False).stale, 0)
+        self.assertGreater(Comment.objects.filter(rating=5).count(), Comment.objects.filter(rating=1).count())
+        self.assertTrue(RelatedRanking.objects.exists())
+
+    def test_skipped_rows_are_not_reported(self):
+        seed(users=5, products=5, comments=100, seed=3)
+        before = Comment.objects.count()
+        # the same comments of registered users are skipped, only the guest comments are added again
+        out = seed(users=5, products=5, comments=100, seed=3)
+        added = Comment.objects.count() - before
+        self.assertLess(added, 100)
+        self.assertIn(f"{added} comments created", out)
+        self.assertIn("0 users created", out)
+
+    def test_seeded_catalog_can_be_exported_and_imported(self):
+        seed(products=5)
+        self.assertFalse(Product.objects.filter(sku=None).exists())
+        exported = StringIO()
+        call_command("export_catalog", format="jsonl", stdout=exported)
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "catalog.jsonl"
+        path.write_text(exported.getvalue(), encoding="utf-8")
+        out = StringIO()
+        call_command("import_catalog", str(path), stdout=out, stderr=StringIO())
+        self.assertIn("0 new and 0 changed product(s), 20 unchanged, 0 rejected", out.getvalue())
+
+    def test_same_seed_generates_same_data(self):
+        seed(products=10, comments=200, seed=7)
+        first = list(Comment.objects.order_by("pk").values_list("product__name", "rating"))
+        Product.objects.all().delete()
+        seed(products=10, comments=200, seed=7)
+        self.assertEqual(list(Comment.objects.order_by("pk").values_list("product__name", "rating")), first)
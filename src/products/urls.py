@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
+
+
+def catalog_patterns(catalog_views):
+    """The catalog pages, served by ``catalog_views``: ``views`` or ``async_views``."""
+    return [
+        path("", catalog_views.product_list, name="products"),
+        path("feed/products.jsonl", catalog_views.product_feed, {"fmt": "jsonl"}, name="product_feed_jsonl"),
+        path("feed/products.csv", catalog_views.product_feed, {"fmt": "csv"}, name="product_feed_csv"),
+        path("category/<slug:category_slug>/", catalog_views.product_list, name="products_by_category"),
+        path("category/<slug:category_slug>/<int:pk>/", catalog_views.product_detail, name="product_detail"),
+        path(
+            "category/<slug:category_slug>/<int:pk>/reviews/",
+            catalog_views.product_reviews,
+            name="product_reviews",
+        ),
+    ]
+
 
 urlpatterns = [
-    path("", views.product_list, name="products"),
-    path("category/<slug:category_slug>/", views.product_list, name="products_by_category"),
-    path("category/<slug:category_slug>/<int:pk>/", views.product_detail, name="product_detail"),
+    *catalog_patterns(async_views if settings.ASYNC_VIEWS else views),
+    path("search/", views.search, name="search"),
+    path("autocomplete/", views.autocomplete_suggestions, name="autocomplete"),
+    path("api/products/", api.product_list, name="api_products"),
+    path("api/products/<int:pk>/", api.product_detail, name="api_product_detail"),
+    path("api/products/<int:pk>/reviews/", api.product_reviews, name="api_product_reviews"),
 ]
@@ -1,38 +1,96 @@
 from django.contrib import messages
-from django.db.models import Avg, Count
+from django.db import transaction
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+from django.utils.timezone import is_naive, make_aware
+from django.views.decorators.http import require_GET
 
-from .forms import CommentForm
+from btw_app.instrumentation import query_budget
+
+from . import autocomplete, feeds
+from .cache import cache_catalog_page, catalog_etag
+from .forms import CommentForm, SearchForm
 from .models import Category, Comment, Product
+from .pagination import InvalidCursor, paginate
+from .related import ranking, related_to
+from .search import get_search_engine
+
+PRODUCTS_PER_PAGE = 24
+
+# Each ordering ends on the primary key so the cursor position is unique, and
+# is backed by one of the composite indexes on Product.
+PRODUCT_SORTS = {
+    "name": ("name", "id"),
+    "price": ("price", "id"),
+    "rating": ("-avg_rating", "-rating_count", "-id"),
+    "newest": ("-created_at", "-id"),
+}
+DEFAULT_PRODUCT_SORT = "name"
+
+SEARCH_RESULTS_PER_PAGE = 24
+
+AUTOCOMPLETE_LIMIT = 8
+
+REVIEWS_PER_PAGE = 10
 
+# Backed by the (product, created_at) and (product, rating, created_at) indexes on Comment.
+REVIEW_SORTS = {
+    "newest": ("-created_at", "-id"),
+    "highest": ("-rating", "-created_at", "-id"),
+    "lowest": ("rating", "created_at", "id"),
+}
+DEFAULT_REVIEW_SORT = "newest"
 
+
+def _list_versions(request, category_slug=None):
+    return ["categories", f"category:{category_slug}" if category_slug else "catalog"]
+
+
+def _detail_versions(request, category_slug, pk):
+    # related products are drawn from the whole category
+    return [f"product:{pk}", f"category:{category_slug}"]
+
+
+@query_budget(6)
+@catalog_etag(_list_versions)
+@cache_catalog_page(_list_versions)
 def product_list(request, category_slug=None):
     categories = Category.objects.all()
-    products = Product.objects.select_related("category").annotate(
-        avg_rating=Avg("comments__rating"), total_ratings=Count("comments")
-    )
+    products = Product.objects.select_related("category")
     if category_slug:
         products = products.filter(category__slug=category_slug)
-    return render(request, "products.html", {"categories": categories, "products": products})
 
+    sort = request.GET.get("sort", DEFAULT_PRODUCT_SORT)
+    if sort not in PRODUCT_SORTS:
+        sort = DEFAULT_PRODUCT_SORT
 
-def product_detail(request, category_slug, pk):
-    product = get_object_or_404(
-        Product.objects.select_related("category").annotate(
-            avg_rating=Avg("comments__rating"), total_ratings=Count("comments")
-        ),
-        pk=pk,
-        category__slug=category_slug,
-    )
+    try:
+        page = paginate(products, PRODUCT_SORTS[sort], request.GET.get("cursor"), PRODUCTS_PER_PAGE)
+    except InvalidCursor:
+        page = paginate(products, PRODUCT_SORTS[sort], None, PRODUCTS_PER_PAGE)
 
-    related_products = (
-        Product.objects.filter(category=product.category)
-        .exclude(pk=product.pk)
-        .annotate(avg_rating=Avg("comments__rating"), total_ratings=Count("comments"))
-        .order_by("-avg_rating", "-total_ratings", "name")[:8]
+    return render(
+        request,
+        "products.html",
+        {
+            "categories": categories,
+            "products": page.object_list,
+            "page": page,
+            "sort": sort,
+            "sort_options": PRODUCT_SORTS.keys(),
+        },
     )
 
-    comments = product.comments.select_related("user").order_by("-created_at")
+
+# a comment writes the rating aggregates and the related products ranking as well
+@query_budget(6, post=20)
+@catalog_etag(_detail_versions)
+@cache_catalog_page(_detail_versions)
+def product_detail(request, category_slug, pk):
+    product = get_object_or_404(Product.objects.select_related("category"), pk=pk, category__slug=category_slug)
 
     if request.method == "POST":
         form = CommentForm(request.POST, initial={"user": request.user if request.user.is_authenticated else None})
@@ -40,21 +98,26 @@ def product_detail(request, category_slug, pk):
             rating = form.cleaned_data["rating"]
             text = form.cleaned_data.get("text", "")
 
-            if request.user.is_authenticated:
-                # Upsert: update existing comment or create a new one
-                comment, created = Comment.objects.get_or_create(
-                    product=product, user=request.user, defaults={"rating": rating, "text": text}
-                )
-                if not created:
-                    comment.rating = rating
-                    comment.text = text
+            # the comment and the product rating aggregates are written together
+            with transaction.atomic():
+                if request.user.is_authenticated:
+                    # Upsert: update existing comment or create a new one
+                    comment, created = Comment.objects.get_or_create(
+                        product=product, user=request.user, defaults={"rating": rating, "text": text}
+                    )
+                    if not created:
+                        comment.rating = rating
+                        comment.text = text
+                        comment.save()
+                else:
+                    # Guest: create a new comment (no uniqueness constraint)
+                    comment = form.save(commit=False)
+                    comment.product = product
                     comment.save()
+
+            if request.user.is_authenticated:
                 messages.success(request, "Your rating was {}.".format("submitted" if created else "updated"))
             else:
-                # Guest: create a new comment (no uniqueness constraint)
-                comment = form.save(commit=False)
-                comment.product = product
-                comment.save()
                 messages.success(request, "Thank you for your rating.")
 
             return redirect("product_detail", category_slug=category_slug, pk=product.pk)
@@ -67,8 +130,164 @@ def product_detail(request, category_slug, pk):
                 initial = {"rating": existing.rating, "text": existing.text}
         form = CommentForm(initial=initial)
 
+    # only a page that is shown needs them, a valid POST redirects
+    related_products = related_to(product.pk, ranking(product.category_id))
+    reviews = paginate(
+        product.comments.select_related("user"), REVIEW_SORTS[DEFAULT_REVIEW_SORT], page_size=REVIEWS_PER_PAGE
+    )
     return render(
         request,
         "product.html",
-        {"product": product, "comments": comments, "related_products": related_products, "form": form},
+        {
+            "product": product,
+            "comments": reviews.object_list,
+            "next_reviews_url": _reviews_url(product, DEFAULT_REVIEW_SORT, reviews.next_cursor),
+            "review_sort_options": REVIEW_SORTS.keys(),
+            "related_products": related_products,
+            "form": form,
+        },
+    )
+
+
+def _reviews_url(product, sort, cursor):
+    if not cursor:
+        return None
+    url = reverse("product_reviews", args=[product.category.slug, product.pk])
+    return f"{url}?{urlencode({'sort': sort, 'cursor': cursor})}"
+
+
+def review_data(comment):
+    return {
+        "id": comment.pk,
+        "author": comment.user.username if comment.user else (comment.guest_name or "Guest"),
+        "rating": comment.rating,
+        "text": comment.text,
+        "created_at": comment.created_at.isoformat(),
+    }
+
+
+def _reviews_versions(request, category_slug, pk):
+    return [f"product:{pk}"]
+
+
+@query_budget(4)
+@catalog_etag(_reviews_versions)
+@cache_catalog_page(_reviews_versions)
+def product_reviews(request, category_slug, pk):
+    """
+    Return one page of a product's reviews, as an HTML fragment for the detail
+    page or as JSON when requested with ``?format=json``.
+    """
+    product = get_object_or_404(Product.objects.select_related("category"), pk=pk, category__slug=category_slug)
+
+    sort = request.GET.get("sort", DEFAULT_REVIEW_SORT)
+    if sort not in REVIEW_SORTS:
+        sort = DEFAULT_REVIEW_SORT
+    try:
+        page = paginate(
+            product.comments.select_related("user"), REVIEW_SORTS[sort], request.GET.get("cursor"), REVIEWS_PER_PAGE
+        )
+    except InvalidCursor as err:
+        return JsonResponse({"error": str(err)}, status=400)
+    next_url = _reviews_url(product, sort, page.next_cursor)
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({"reviews": [review_data(c) for c in page], "next": next_url})
+    return render(request, "_reviews.html", {"reviews": page.object_list, "next_url": next_url})
+
+
+@query_budget(6)
+def search(request):
+    """Full text product search with optional category and price range filters."""
+    form = SearchForm(request.GET)
+    results, category, page = [], None, 1
+    if form.is_valid():
+        data = form.cleaned_data
+        page = data["page"] or 1
+        if data["category"]:
+            category = Category.objects.filter(slug=data["category"]).first()
+        if data["q"] and (category or not data["category"]):
+            results = get_search_engine().search(
+                data["q"],
+                category_id=category.pk if category else None,
+                min_price=data["min_price"],
+                max_price=data["max_price"],
+                # one extra row tells whether there is a next page
+                limit=SEARCH_RESULTS_PER_PAGE + 1,
+                offset=(page - 1) * SEARCH_RESULTS_PER_PAGE,
+            )
+
+    next_query = previous_query = None
+    params = request.GET.copy()
+    if len(results) > SEARCH_RESULTS_PER_PAGE:
+        params["page"] = page + 1
+        next_query = params.urlencode()
+    if page > 1:
+        params["page"] = page - 1
+        previous_query = params.urlencode()
+
+    return render(
+        request,
+        "search.html",
+        {
+            "form": form,
+            "products": results[:SEARCH_RESULTS_PER_PAGE],
+            "categories": Category.objects.all(),
+            "next_query": next_query,
+            "previous_query": previous_query,
+        },
+    )
+
+
+@query_budget(3)
+def autocomplete_suggestions(request):
+    """Type-ahead suggestions for product and category names, answered from the in-process prefix index."""
+    index = autocomplete.get_index()
+    query = request.GET.get("q", "")[:100]
+    return JsonResponse(
+        {
+            "query": query,
+            "suggestions": [
+                {"label": entry[3], "type": entry[0], "url": autocomplete.suggestion_url(entry)}
+                for entry in index.lookup(query, AUTOCOMPLETE_LIMIT)
+            ],
+            "index": {
+                "entries": len(index.entries),
+                "keys": len(index.keys),
+                "bytes": index.memory_footprint,
+                "age_seconds": round(index.age, 3),
+            },
+        }
     )
+
+
+def feed_products(request):
+    """The products of the feed, or ``None`` if ``?since=`` is not a timestamp."""
+    products = Product.objects.all()
+    if since := request.GET.get("since"):
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            since = None
+        if since is None:
+            return None
+        products = products.filter(updated_at__gte=make_aware(since) if is_naive(since) else since)
+    return products
+
+
+def feed_response(content, fmt):
+    response = StreamingHttpResponse(content, content_type=feeds.CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'inline; filename="products.{fmt}"'
+    return response
+
+
+@require_GET
+def product_feed(request, fmt):
+    """
+    Stream every product as JSON lines or CSV, optionally only those changed
+    since ``?since=<ISO 8601 timestamp>``. See ``products.feeds``.
+    """
+    products = feed_products(request)
+    if products is None:
+        return HttpResponseBadRequest("since must be an ISO 8601 timestamp.")
+    return feed_response(feeds.stream(products, fmt), fmt)